@@ -0,0 +1,103 @@
+"""
+Benchmark crawl chi tiết của cellphoneS / fpt / tgdd trên fixture phát lại qua server local (không gọi site thật).
+
+    python -m benchmarks.replay record --source cellphones --limit 30
+    python -m benchmarks.bench_crawl --source cellphones fpt tgdd --latency-ms 150 --jitter-ms 100 --error-rate 0.02
+"""
+import argparse
+import os
+import sys
+import time
+
+import pandas as pd
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from my_logger import init_logger, get_logger
+from crawlers.browser_profile import browser_rss_mb
+from crawlers.driver_lifecycle import get_lifecycle_stats
+from crawlers.page_archive import PageArchive
+from crawlers.shards import categories_by_key
+from benchmarks.replay import CRAWLERS, FIXTURE_DIR, ReplayServer, fixture_path, fixture_host, load_rows, local_url
+
+
+def percentile(values, pct):
+    """Phân vị theo nearest-rank"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, int(round(pct / 100 * len(ordered))))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def run_source(source, fixture_dir, latency_ms, jitter_ms, error_rate, seed, logger):
+    crawler = CRAWLERS[source]
+    fixture = load_rows(source, fixture_dir)
+    category = categories_by_key(crawler)[fixture["category"]]
+
+    server = ReplayServer(PageArchive(fixture_path(source, fixture_dir)), fixture_host(fixture["rows"]),
+                          latency_ms, jitter_ms, error_rate, seed)
+    base_url = server.start()
+    df_rows = pd.DataFrame([{**row, "url": local_url(base_url, row["url"])} for row in fixture["rows"]])
+
+    driver = crawler.setup_driver()
+    crawler.wait_policy.start()
+    page_times = []
+    peak_rss = 0.0
+    extracted = 0
+    started = time.perf_counter()
+    try:
+        for i in range(len(df_rows)):
+            page_started = time.perf_counter()
+            extracted += len(crawler.crawl_details(i, i + 1, df_rows, category, driver, logger))
+            page_times.append(time.perf_counter() - page_started)
+            peak_rss = max(peak_rss, browser_rss_mb(driver) or 0.0)
+    finally:
+        elapsed = time.perf_counter() - started
+        driver.quit()
+        server.stop()
+
+    lifecycle = get_lifecycle_stats(source)
+    return {
+        "source": source,
+        "pages": len(page_times),
+        "extracted": extracted,
+        "pages_per_s": len(page_times) / elapsed if elapsed else 0.0,
+        "p50_s": percentile(page_times, 50),
+        "p95_s": percentile(page_times, 95),
+        "peak_rss_mb": peak_rss,
+        "startup_s": lifecycle.startup_seconds / lifecycle.startups if lifecycle.startups else 0.0,
+        "recycles": sum(lifecycle.recycles.values()),
+        **server.stats,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark crawler trên fixture phát lại local")
+    parser.add_argument("--source", nargs="+", choices=sorted(CRAWLERS), default=sorted(CRAWLERS))
+    parser.add_argument("--fixtures", default=FIXTURE_DIR)
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--jitter-ms", type=float, default=0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0, help="Seed cho độ trễ/lỗi giả lập để các lần chạy so sánh được")
+    args = parser.parse_args()
+
+    # Không ghi các trang phát lại vào kho
+    os.environ["CRAWL_ARCHIVE"] = "false"
+    init_logger()
+    logger = get_logger()
+
+    results = [
+        run_source(source, args.fixtures, args.latency_ms, args.jitter_ms, args.error_rate, args.seed, logger)
+        for source in args.source
+    ]
+
+    print(f"{'source':<12}{'pages':>7}{'ok':>5}{'pages/s':>9}{'p50(s)':>8}{'p95(s)':>8}{'peak RSS(MB)':>14}{'start(s)':>10}{'recycle':>9}"
+          f"{'req':>7}{'404':>6}{'5xx':>6}")
+    for r in results:
+        print(f"{r['source']:<12}{r['pages']:>7}{r['extracted']:>5}{r['pages_per_s']:>9.2f}{r['p50_s']:>8.2f}"
+              f"{r['p95_s']:>8.2f}{r['peak_rss_mb']:>14.1f}{r['startup_s']:>10.1f}{r['recycles']:>9}{r['requests']:>7}{r['not_found']:>6}{r['injected_errors']:>6}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+So sánh thời gian tải trang và RSS trình duyệt khi bật / tắt chặn tài nguyên.
+
+    python -m benchmarks.bench_resource_blocking --source tgdd --pages recorded/tgdd --runs 3
+    python -m benchmarks.bench_resource_blocking --source fpt --urls https://fptshop.com.vn/dien-thoai/iphone-16-pro-max
+"""
+import argparse
+import functools
+import os
+import statistics
+import sys
+import threading
+import time
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from crawlers import cellphoneS, fpt, tgdd
+from crawlers.browser_profile import browser_rss_mb
+
+SETUP_DRIVERS = {
+    "cellphones": cellphoneS.setup_driver,
+    "fpt": fpt.setup_driver,
+    "tgdd": tgdd.setup_driver,
+}
+
+
+def serve_directory(directory):
+    """Phục vụ các trang đã ghi lại từ thư mục local, trả về (server, base_url)"""
+    handler = functools.partial(SimpleHTTPRequestHandler, directory=directory)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def recorded_urls(directory, base_url):
+    urls = []
+    for root, _, files in os.walk(directory):
+        for filename in sorted(files):
+            if filename.endswith(".html"):
+                relative = os.path.relpath(os.path.join(root, filename), directory)
+                urls.append(f"{base_url}/{relative.replace(os.sep, '/')}")
+    return urls
+
+
+def measure(source, urls, blocking, runs):
+    os.environ["CRAWL_BLOCK_RESOURCES"] = source if blocking else "none"
+    driver = SETUP_DRIVERS[source]()
+    load_times = []
+    peak_rss = 0.0
+    try:
+        for _ in range(runs):
+            for url in urls:
+                started = time.perf_counter()
+                driver.get(url)
+                load_times.append(time.perf_counter() - started)
+                rss = browser_rss_mb(driver) or 0.0
+                peak_rss = max(peak_rss, rss)
+    finally:
+        driver.quit()
+
+    return {
+        "blocking": blocking,
+        "pages": len(load_times),
+        "mean_load_s": statistics.mean(load_times) if load_times else 0.0,
+        "median_load_s": statistics.median(load_times) if load_times else 0.0,
+        "peak_rss_mb": peak_rss,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark chặn tài nguyên trình duyệt")
+    parser.add_argument("--source", choices=sorted(SETUP_DRIVERS), required=True)
+    parser.add_argument("--pages", help="Thư mục chứa các trang .html đã ghi lại")
+    parser.add_argument("--urls", nargs="*", default=[], help="Danh sách URL thật (nếu không dùng --pages)")
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    server = None
+    urls = list(args.urls)
+    if args.pages:
+        server, base_url = serve_directory(args.pages)
+        urls += recorded_urls(args.pages, base_url)
+    if not urls:
+        parser.error("Cần --pages hoặc --urls")
+
+    try:
+        results = [measure(args.source, urls, blocking, args.runs) for blocking in (False, True)]
+    finally:
+        if server:
+            server.shutdown()
+
+    print(f"{'blocking':<10}{'pages':>8}{'mean(s)':>10}{'median(s)':>11}{'peak RSS(MB)':>14}")
+    for r in results:
+        print(f"{str(r['blocking']):<10}{r['pages']:>8}{r['mean_load_s']:>10.2f}{r['median_load_s']:>11.2f}{r['peak_rss_mb']:>14.1f}")
+
+    base, blocked = results
+    if base["mean_load_s"]:
+        print(f"Tải trang nhanh hơn: {(1 - blocked['mean_load_s'] / base['mean_load_s']) * 100:.1f}%")
+    if base["peak_rss_mb"]:
+        print(f"RSS giảm: {(1 - blocked['peak_rss_mb'] / base['peak_rss_mb']) * 100:.1f}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+"""
+Ghi lại trang thật thành fixture rồi phát lại qua HTTP server local (có giả lập độ trễ và lỗi).
+
+    python -m benchmarks.replay record --source tgdd --category phone --limit 20
+    python -m benchmarks.replay serve --source tgdd --latency-ms 150 --error-rate 0.05
+
+Fixture của mỗi nguồn là một kho trang (crawlers.page_archive) ở benchmarks/fixtures/<source>/
+kèm rows.json (danh mục + danh sách sản phẩm đã ghi).
+"""
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from my_logger import init_logger, get_logger
+from crawlers import cellphoneS, fpt, tgdd
+from crawlers.page_archive import PageArchive, archive_driver_page
+from crawlers.shards import categories_by_key
+
+FIXTURE_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+
+CRAWLERS = {
+    "cellphones": cellphoneS,
+    "fpt": fpt,
+    "tgdd": tgdd,
+}
+
+ABSOLUTE_URL = re.compile(r"(?<![\w/])(https?:)?//([a-z0-9.-]+\.[a-z]{2,})(?=[/\"'?#\s])", re.IGNORECASE)
+
+
+def fixture_path(source, fixture_dir=FIXTURE_DIR):
+    return os.path.join(fixture_dir, source)
+
+
+def record(source, category_key=None, limit=20, fixture_dir=FIXTURE_DIR, logger=None):
+    """Chạy bước lấy danh sách + crawl chi tiết của nguồn trên site thật, lưu mọi trang tải về làm fixture"""
+    logger = logger or get_logger()
+    crawler = CRAWLERS[source]
+    categories = categories_by_key(crawler)
+    category_key = category_key or next(iter(categories))
+    category = categories[category_key]
+
+    path = fixture_path(source, fixture_dir)
+    os.environ["CRAWL_ARCHIVE"] = "true"
+    os.environ["CRAWL_ARCHIVE_DIR"] = path
+
+    driver = crawler.setup_driver()
+    try:
+        df_products, _ = crawler.discover_products(category, driver, logger)
+        archive_driver_page(driver, category["url"], source, "listing", logger)
+        df_products = df_products.head(limit).reset_index(drop=True)
+        records = crawler.crawl_details(0, len(df_products), df_products, category, driver, logger)
+    finally:
+        driver.quit()
+
+    with open(os.path.join(path, "rows.json"), "w", encoding="utf-8") as f:
+        json.dump({"category": category_key, "rows": df_products.to_dict("records")}, f, ensure_ascii=False, indent=2)
+    logger.info(f"Đã ghi {len(df_products)} sản phẩm ({len(records)} trích xuất được) của {source}/{category_key} vào {path}")
+
+
+def load_rows(source, fixture_dir=FIXTURE_DIR):
+    with open(os.path.join(fixture_path(source, fixture_dir), "rows.json"), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def fixture_host(rows):
+    return urlsplit(rows[0]["url"]).netloc if rows else None
+
+
+def local_url(base_url, url):
+    """https://host/path?q -> http://127.0.0.1:port/host/path?q"""
+    parts = urlsplit(url)
+    query = f"?{parts.query}" if parts.query else ""
+    return f"{base_url}/{parts.netloc}{parts.path or '/'}{query}"
+
+
+def rewrite_links(html, base_url):
+    """Trỏ mọi URL tuyệt đối trong trang về server local để trình duyệt không gọi ra site thật"""
+    return ABSOLUTE_URL.sub(lambda m: f"{base_url}/{m.group(2)}", html)
+
+
+class ReplayServer:
+    """
+    HTTP server phát lại fixture: /<host>/<path>?<query> trả về trang đã ghi của https://<host>/<path>?<query>.
+    Link tương đối (/<path>) được tìm theo default_host. latency_ms / jitter_ms thêm độ trễ mỗi request,
+    error_rate là xác suất trả về 503.
+    """
+
+    def __init__(self, archive, default_host=None, latency_ms=0, jitter_ms=0, error_rate=0.0, seed=None):
+        self.archive = archive
+        self.default_host = default_host
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.stats = {"requests": 0, "served": 0, "not_found": 0, "injected_errors": 0}
+        self._lock = threading.Lock()
+        self.server = None
+        self.base_url = None
+
+    def lookup(self, path):
+        host_and_path = path.lstrip("/")
+        if self.default_host and "." not in host_and_path.split("/", 1)[0]:
+            host_and_path = f"{self.default_host}/{host_and_path}"
+        candidates = [f"https://{host_and_path}", f"http://{host_and_path}"]
+        candidates += [candidate.rstrip("/") for candidate in candidates if candidate.endswith("/")]
+        for url in candidates:
+            html = self.archive.latest(url)
+            if html is not None:
+                return html
+        return None
+
+    def _count(self, key):
+        with self._lock:
+            self.stats[key] += 1
+
+    def handle(self, handler):
+        self._count("requests")
+        with self._lock:
+            delay = self.latency_ms + (self.random.uniform(0, self.jitter_ms) if self.jitter_ms else 0)
+            fail = self.random.random() < self.error_rate
+        if delay:
+            time.sleep(delay / 1000)
+
+        if fail:
+            self._count("injected_errors")
+            handler.send_error(503, "Injected error")
+            return
+
+        html = self.lookup(handler.path)
+        if html is None:
+            self._count("not_found")
+            handler.send_error(404)
+            return
+
+        body = rewrite_links(html, self.base_url).encode("utf-8")
+        self._count("served")
+        handler.send_response(200)
+        handler.send_header("Content-Type", "text/html; charset=utf-8")
+        handler.send_header("Content-Length", str(len(body)))
+        handler.end_headers()
+        handler.wfile.write(body)
+
+    def start(self):
+        replay = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                replay.handle(self)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.base_url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self.base_url
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ghi / phát lại trang của các nguồn crawl")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    record_parser = subparsers.add_parser("record", help="Ghi trang thật thành fixture")
+    record_parser.add_argument("--source", choices=sorted(CRAWLERS), required=True)
+    record_parser.add_argument("--category", help="Khóa danh mục (vd: phone), mặc định danh mục đầu tiên")
+    record_parser.add_argument("--limit", type=int, default=20)
+    record_parser.add_argument("--fixtures", default=FIXTURE_DIR)
+
+    serve_parser = subparsers.add_parser("serve", help="Phát lại fixture qua HTTP server local")
+    serve_parser.add_argument("--source", choices=sorted(CRAWLERS), required=True)
+    serve_parser.add_argument("--fixtures", default=FIXTURE_DIR)
+    serve_parser.add_argument("--latency-ms", type=float, default=0)
+    serve_parser.add_argument("--jitter-ms", type=float, default=0)
+    serve_parser.add_argument("--error-rate", type=float, default=0.0)
+
+    args = parser.parse_args()
+    init_logger()
+    if args.command == "record":
+        record(args.source, args.category, args.limit, args.fixtures)
+        return
+
+    rows = load_rows(args.source, args.fixtures)["rows"]
+    server = ReplayServer(PageArchive(fixture_path(args.source, args.fixtures)), fixture_host(rows),
+                          args.latency_ms, args.jitter_ms, args.error_rate)
+    base_url = server.start()
+    for row in rows:
+        print(local_url(base_url, row["url"]))
+    print(f"Đang phát lại fixture {args.source} tại {base_url} (Ctrl+C để dừng)")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
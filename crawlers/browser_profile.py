@@ -0,0 +1,78 @@
+import os
+
+import psutil
+
+# Loại tài nguyên crawler không cần: ảnh gallery, font, video
+BLOCKED_RESOURCE_PATTERNS = [
+    "*.jpg", "*.jpeg", "*.png", "*.gif", "*.webp", "*.avif", "*.svg", "*.ico",
+    "*.woff", "*.woff2", "*.ttf", "*.otf", "*.eot",
+    "*.mp4", "*.webm", "*.m3u8",
+]
+
+# Tracker / quảng cáo của bên thứ ba dùng chung cho mọi nguồn
+BLOCKED_THIRD_PARTY_DOMAINS = [
+    "google-analytics.com", "googletagmanager.com", "doubleclick.net", "googlesyndication.com",
+    "facebook.net", "facebook.com", "connect.facebook.net", "tiktok.com", "analytics.tiktok.com",
+    "hotjar.com", "clarity.ms", "criteo.com", "criteo.net", "zalo.me", "sp.zalo.me",
+]
+
+# Cấu hình riêng theo nguồn: bật/tắt chặn và thêm domain cần chặn
+PROFILES = {
+    "cellphones": {"block_resources": True, "extra_domains": []},
+    "fpt": {"block_resources": True, "extra_domains": []},
+    "tgdd": {"block_resources": True, "extra_domains": []},
+}
+
+
+def is_blocking_enabled(source):
+    """
+    CRAWL_BLOCK_RESOURCES: 'all' / 'none' hoặc danh sách nguồn cách nhau bởi dấu phẩy.
+    Không đặt biến thì theo PROFILES.
+    """
+    setting = os.getenv("CRAWL_BLOCK_RESOURCES")
+    if setting is None:
+        return PROFILES.get(source, {}).get("block_resources", False)
+    setting = setting.strip().lower()
+    if setting in ("all", "1", "true"):
+        return True
+    if setting in ("none", "0", "false", ""):
+        return False
+    return source in [s.strip() for s in setting.split(",")]
+
+
+def get_blocked_urls(source):
+    domains = BLOCKED_THIRD_PARTY_DOMAINS + PROFILES.get(source, {}).get("extra_domains", [])
+    return BLOCKED_RESOURCE_PATTERNS + [f"*{domain}*" for domain in domains]
+
+
+def apply_profile(driver, source, logger=None, enabled=None):
+    """Chặn tài nguyên không cần thiết qua CDP (Network.setBlockedURLs)"""
+    enabled = is_blocking_enabled(source) if enabled is None else enabled
+    if not enabled:
+        return driver
+    try:
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": get_blocked_urls(source)})
+        if logger:
+            logger.info(f"Đã bật chặn tài nguyên cho trình duyệt nguồn {source}")
+    except Exception as e:
+        if logger:
+            logger.warning(f"Không bật được chặn tài nguyên cho nguồn {source}: {e}")
+    return driver
+
+
+def browser_rss_mb(driver):
+    """Tổng RSS (MB) của chromedriver và toàn bộ tiến trình Chrome con"""
+    try:
+        root = psutil.Process(driver.service.process.pid)
+        processes = [root] + root.children(recursive=True)
+    except Exception:
+        return None
+
+    total = 0
+    for process in processes:
+        try:
+            total += process.memory_info().rss
+        except psutil.Error:
+            continue
+    return total / (1024 * 1024)
@@ -13,12 +13,35 @@ from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.chrome.service import Service
 from webdriver_manager.chrome import ChromeDriverManager
 from selenium.common.exceptions import TimeoutException
-from bs4 import BeautifulSoup, Tag
+from bs4 import BeautifulSoup
 import json
-from .filter_cellphoneS import crawl_needs_filter
+from .filter_cellphoneS import harvest_needs_filter
+from .listing_discovery import extract_listing_cards
+from .driver_pool import crawl_range
+from .wait_policy import get_wait_policy
+from .browser_profile import apply_profile
+from .crawl_state import CrawlStateStore, split_fresh_products, record_crawl_results, write_category_output
+from .price_refresh import refresh_category_prices
+from .checkpoint import SourceCheckpoint, prepare_category, crawl_with_checkpoint
+from .page_archive import archive_driver_page, archive_page
+from .rate_limit import throttled_get, report_limits
+from .driver_lifecycle import ManagedDriver, report_lifecycle
+from .record_writer import streaming, stream_record
+from .variant_groups import crawl_with_variant_groups
+from .retry_queue import retry_pending
+from .time_budget import TimeBudget, prioritize, keep_unfinished
+from .pipeline import pipelined
+from .extraction_paths import get_path_stats, report_path_stats
+from .cellphoneS_html import (
+    extract_product_from_html, extract_prices_from_html, get_extract_mode, parse_ld_json_brand, clean_value,
+    extract_specifications, parse_price, nuxt_default_price, extract_nuxt_features, parse_faq_data,
+)
 from my_logger import get_logger
 
-def setup_driver():
+wait_policy = get_wait_policy("cellphones")
+path_stats = get_path_stats("cellphones")
+
+def launch_driver():
     options = Options()
     is_github_actions = os.getenv('GITHUB_ACTIONS') == 'true'
 
@@ -60,24 +83,30 @@ def setup_driver():
 
         driver = webdriver.Chrome(options=options)
 
-    return driver
+    return apply_profile(driver, "cellphones")
+
+
+def setup_driver():
+    """Trình duyệt tự tạo lại sau CRAWL_RECYCLE_PAGES trang hoặc khi vượt ngưỡng RSS"""
+    return ManagedDriver(launch_driver, "cellphones")
 
 def crawl_product_list(driver, logger, category_url):
     logger.info(f"Truy cập trang danh mục: {category_url}")
     driver.get(category_url)
+    return expand_product_list(driver, logger)
+
+def expand_product_list(driver, logger):
+    """Click "Xem thêm" trên trang danh mục đang mở tới khi hết sản phẩm, trả về list (name, url)"""
     stable_count = 0
     prev_count = 0
 
     while True:
         try:
-            view_more_button = WebDriverWait(driver, 10).until(
-                EC.element_to_be_clickable((By.CSS_SELECTOR, "div.cps-block-content_btn-showmore a"))
+            view_more_button = wait_policy.until(
+                driver, EC.element_to_be_clickable((By.CSS_SELECTOR, "div.cps-block-content_btn-showmore a")), 10
             )
             driver.execute_script("arguments[0].click();", view_more_button)
-            time.sleep(2)
-
-            items = driver.find_elements(By.CSS_SELECTOR, "div.product-info-container.product-item")
-            current_count = len(items)
+            current_count = wait_policy.after_load_more(driver, "div.product-info-container.product-item", prev_count)
             print(f"Số sản phẩm hiện tại: {current_count}")
 
             if current_count == prev_count:
@@ -85,7 +114,8 @@ def crawl_product_list(driver, logger, category_url):
             else:
                 stable_count = 0
 
-            if stable_count >= 3:
+            # Chờ theo sự kiện đã đợi đủ timeout mới trả về số cũ nên chỉ cần 1 lần ổn định
+            if stable_count >= (3 if wait_policy.strategy == "fixed" else 1):
                 print("Số lượng sản phẩm ổn định, dừng tải thêm")
                 break
 
@@ -95,18 +125,7 @@ def crawl_product_list(driver, logger, category_url):
             logger.warning(f"Không còn nút xem thêm hoặc lỗi xảy ra: {e}")
             break
 
-    items = driver.find_elements(By.CSS_SELECTOR, "div.product-info-container.product-item")
-    
-    products = []
-    for i, item in enumerate(items):
-        try:
-            product_url = item.find_element(By.TAG_NAME, "a").get_attribute("href")
-            product_name = item.find_element(By.CSS_SELECTOR, "div.product__name h3").text.strip()
-            products.append({"name": product_name, "url": product_url})
-            logger.debug(f"Thêm sản phẩm {i}: {product_name} - {product_url}")
-        except Exception as e:
-            logger.debug(f"Bỏ qua sản phẩm do lỗi: {e}")
-            continue
+    products = extract_listing_cards(driver, "cellphones")
     logger.info(f"Tổng sản phẩm thu thập được: {len(products)}")
     return products
 
@@ -117,13 +136,9 @@ def get_brand(driver):
         tags = driver.find_elements(By.XPATH, '//script[@type="application/ld+json"]')
         for tag in tags:
             try:
-                data = json.loads(tag.get_attribute("innerHTML"))
-                if isinstance(data, dict) and data.get("@type") == "Product":
-                    return data.get("brand", {}).get("name", "").strip()
-                if isinstance(data, list):
-                    for item in data:
-                        if item.get("@type") == "Product":
-                            return item.get("brand", {}).get("name", "").strip()
+                brand = parse_ld_json_brand(json.loads(tag.get_attribute("innerHTML")))
+                if brand is not None:
+                    return brand
             except:
                 continue
     except:
@@ -136,55 +151,37 @@ def get_nuxt_data(driver):
     except:
         return None
 
-def clean_value(raw_value):
-    if not isinstance(raw_value, str): return raw_value
-    raw_value = re.sub(r"\(Path: x=\d+, y=\d+\)", "", raw_value).strip()
-    soup = BeautifulSoup(raw_value, "html.parser")
-    links = [a.get_text(strip=True) for a in soup.find_all("a")]
-    text = soup.get_text("\n").strip().split("\n")
-    if len(links) > 1: return links
-    return text if len(text) > 1 else text[0] if text else ""
-
-def extract_specifications(nuxt_data):
-    try:
-        specs = nuxt_data["state"]["product"]["productData"]["specification"]["full_by_group"]
-        return {item["label"]: clean_value(item["value"]) for group in specs for item in group["value"]}
-    except:
-        return {}
-
-def parse_price(price_text):
-    cleaned = re.sub(r"[^\d]", "", price_text)
-    return int(cleaned) if cleaned.isdigit() else None
-
-def scrape_prices(driver, nuxt_data):
+def scrape_variant_prices(driver, timeout=5):
     prices = []
-    try:
-        WebDriverWait(driver, 5).until(EC.presence_of_element_located((By.CLASS_NAME, "box-product-variants")))
-        items = driver.find_elements(By.CSS_SELECTOR, "ul.list-variants > li")
-        for item in items:
-            try:
-                name = item.find_element(By.CSS_SELECTOR, "strong.item-variant-name").text.strip()
-                price = parse_price(item.find_element(By.CSS_SELECTOR, "span.item-variant-price").text.strip())
-                if name and price:
-                    prices.append({"color": name, "price": price})
-            except:
-                continue
-    except:
+    wait_policy.until(driver, EC.presence_of_element_located((By.CLASS_NAME, "box-product-variants")), timeout)
+    items = driver.find_elements(By.CSS_SELECTOR, "ul.list-variants > li")
+    for item in items:
         try:
-            price = nuxt_data["state"]["product"]["productData"]["filterable"]["special_price"]
-            prices.append({"color": "default", "price": price})
+            name = item.find_element(By.CSS_SELECTOR, "strong.item-variant-name").text.strip()
+            price = parse_price(item.find_element(By.CSS_SELECTOR, "span.item-variant-price").text.strip())
+            if name and price:
+                prices.append({"color": name, "price": price})
         except:
-            return []
+            continue
     return prices
 
-def scrape_features(driver, nuxt_data, logger=None):
+def scrape_prices(driver, nuxt_data, category=None):
+    # Bảng giá theo biến thể luôn thử trước (__NUXT__ chỉ có một giá mặc định); danh mục ít khi có
+    # khung biến thể thì chỉ chờ probe ngắn
+    prices, _ = path_stats.run_paths(category, "prices", [
+        ("variants", 5, lambda timeout: scrape_variant_prices(driver, timeout)),
+        ("nuxt", 0, lambda timeout: nuxt_default_price(nuxt_data)),
+    ])
+    return prices or []
+
+def scrape_features(driver, nuxt_data, logger=None, category=None):
     features = []
 
     # --- Phần 1: Lấy từ DOM ---
+    found = False
     try:
-        WebDriverWait(driver, 15).until(
-            EC.presence_of_element_located((By.ID, "v2Gallery"))
-        )
+        wait_policy.until(driver, EC.presence_of_element_located((By.ID, "v2Gallery")), path_stats.timeout(category, "features", "v2Gallery", 15))
+        found = True
         v2_gallery = driver.find_element(By.ID, "v2Gallery")
         desktop_div = v2_gallery.find_element(By.CSS_SELECTOR, "div.desktop")
         li_elements = desktop_div.find_elements(By.CSS_SELECTOR, "ul > li")
@@ -198,42 +195,17 @@ def scrape_features(driver, nuxt_data, logger=None):
 
     except Exception as e:
         pass
+    path_stats.record(category, "features", "v2Gallery", found)
 
     # --- Phần 2: Lấy từ nuxt_data ---
-    try:
-        if nuxt_data and "data" in nuxt_data and nuxt_data["data"]:
-            html_content = nuxt_data["data"][0].get("pageInfo", {}).get("content", "")
-            if html_content:
-                soup = BeautifulSoup(html_content, "html.parser")
-
-                content_source = soup.find("blockquote")
-                if not content_source and soup.body:
-                    for child in soup.body.descendants:
-                        if isinstance(child, Tag) and child.name == "p":
-                            content_source = child
-                            break
-
-                if content_source:
-                    raw_text = content_source.get_text(separator=" ").strip()
-                    clean_text = ' '.join(raw_text.split())
-
-                    # Tách thành câu
-                    sentences = re.split(r'(?<=[.!?])\s+', clean_text)
-                    for sentence in sentences:
-                        if sentence.strip():
-                            features.append(sentence.strip())
-    except Exception as e:
-        pass
+    features.extend(extract_nuxt_features(nuxt_data))
 
     return features
 
-
-def scrape_faq_answers(driver):
+def scrape_faq_answers(driver, category=None):
     answers = []
     try:
-        WebDriverWait(driver, 5).until(
-            EC.presence_of_element_located((By.CLASS_NAME, "block-breadcrumbs"))
-        )
+        wait_policy.until(driver, EC.presence_of_element_located((By.CLASS_NAME, "block-breadcrumbs")), path_stats.timeout(category, "faq", "breadcrumbs", 5))
 
         scripts = driver.find_elements(By.CSS_SELECTOR, 'script[type="application/ld+json"]')
         for script in scripts:
@@ -241,92 +213,169 @@ def scrape_faq_answers(driver):
                 data = json.loads(script.get_attribute('innerText'))
 
                 if data.get('@type') == 'FAQPage' and 'mainEntity' in data:
-                    for item in data['mainEntity']:
-                        answer_html = item.get('acceptedAnswer', [{}])[0].get('text', '')
-                        raw_text = BeautifulSoup(answer_html, 'html.parser').get_text(separator=" ").strip()
-                        answer_text = ' '.join(raw_text.split()) 
-                        if answer_text:
-                            answers.append(answer_text)
+                    answers = parse_faq_data(data)
                     break
             except Exception:
                 continue
+        path_stats.record(category, "faq", "breadcrumbs", True)
 
     except Exception:
-        pass
+        path_stats.record(category, "faq", "breadcrumbs", False)
 
     return answers
 
-def get_image_urls(driver):
+def get_image_urls(driver, category=None):
     try:
-        WebDriverWait(driver, 10).until(EC.presence_of_all_elements_located((By.CSS_SELECTOR, "div.swiper-slide a.spotlight")))
+        wait_policy.until(
+            driver, EC.presence_of_all_elements_located((By.CSS_SELECTOR, "div.swiper-slide a.spotlight")),
+            path_stats.timeout(category, "images", "spotlight", 10)
+        )
+        path_stats.record(category, "images", "spotlight", True)
         return [a.get_attribute("href") for a in driver.find_elements(By.CSS_SELECTOR, "div.swiper-slide a.spotlight") if a.get_attribute("href").startswith("https://")]
     except:
+        path_stats.record(category, "images", "spotlight", False)
         return []
     
+def open_product_page(driver, row, logger):
+    """Mở trang sản phẩm, trả về False nếu lỗi (sản phẩm lỗi được crawl lại ở lượt retry cuối danh mục)"""
+    try:
+        throttled_get(driver, row["url"])
+        wait_policy.until(driver, EC.presence_of_element_located((By.TAG_NAME, "body")), 20)
+        return True
+    except TimeoutException as te:
+        # Bộ giới hạn theo domain tự giãn nhịp request
+        logger.warning(f"Timeout khi truy cập sản phẩm {row['name']} ({row['url']}): {te}")
+    except Exception as e:
+        logger.warning(f"Lỗi khác khi truy cập sản phẩm {row['name']} ({row['url']}): {e}")
+    return False
+
+def scrape_with_selenium(driver, category=None):
+    """Các trường chi tiết lấy trực tiếp trên trang đang mở bằng các hàm Selenium"""
+    nuxt_data = get_nuxt_data(driver)
+    return {
+        "brand": get_brand(driver),
+        "specifications": extract_specifications(nuxt_data) if nuxt_data else {},
+        "prices": scrape_prices(driver, nuxt_data, category),
+        "features": scrape_features(driver, nuxt_data, category=category),
+        "faq_answers": scrape_faq_answers(driver, category),
+        "image_links": get_image_urls(driver, category),
+    }
+
+def build_record(row, category, extracted, logger):
+    features, faq_answers = extracted["features"], extracted["faq_answers"]
+    result = {
+        "name": row["name"],
+        "url": row["url"],
+        "category": category,
+        "brand": extracted["brand"],
+        "specifications": extracted["specifications"],
+        "prices": extracted["prices"],
+        "image_links": extracted["image_links"],
+        "features": features + faq_answers if (features or faq_answers) else []
+    }
+    stream_record("cellphones", result)
+    # Kiểm tra thiếu mục nào
+    missing_fields = []
+    if not result["brand"]:
+        missing_fields.append("brand")
+    if not result["specifications"]:
+        missing_fields.append("specifications")
+    if not result["prices"]:
+        missing_fields.append("prices")
+    if not result["image_links"]:
+        missing_fields.append("images")
+    if not features:
+        missing_fields.append("features")
+    if missing_fields:
+        logger.warning(f"Thiếu {', '.join(missing_fields)} ở sản phẩm: {row['name']}")
+    logger.info(f"Đã thu thập chi tiết sản phẩm {row['name']}")
+    return result
+
 def crawl_selected_range(start, end, df_input, category, driver, logger):
-    results = []
+    """
+    Crawl chi tiết các dòng [start, end). Chế độ html chạy pipeline: trình duyệt chụp page_source rồi mở
+    trang kế tiếp trong khi pool luồng parse / làm sạch HTML của trang trước; trang không đọc được state Nuxt
+    được mở lại và lấy bằng Selenium sau khi pipeline xong. Kết quả giữ đúng thứ tự df_input.
+    """
     logger.info(f"Bắt đầu lấy dữ liệu chi tiết sản phẩm từ {start} đến {end} cho danh mục: {category}")
-    
-    for index, row in df_input.iloc[start:end].iterrows():
-        logger.info(f"Thu thập dữ liệu sản phẩm {index}: {row['name']}")
+    rows = df_input.iloc[start:end].to_dict("records")
+    opened = set()
+
+    def capture(position):
+        row = rows[position]
+        logger.info(f"Thu thập dữ liệu sản phẩm {start + position}: {row['name']}")
+        if not open_product_page(driver, row, logger):
+            return None
+        opened.add(position)
         try:
-            driver.get(row["url"])
-            WebDriverWait(driver, 20).until(EC.presence_of_element_located((By.TAG_NAME, "body")))
-        except TimeoutException as te:
-            logger.warning(f"Timeout khi truy cập sản phẩm {row['name']} ({row['url']}): {te}")
-            time.sleep(2)  # Nghỉ một chút tránh bị block
-            continue
+            html = driver.page_source
+            archive_page(row["url"], "cellphones", "product", html, logger)
+            # Chỉ hỏi thêm window.__NUXT__ qua driver khi HTML không chứa state
+            nuxt_data = None if "window.__NUXT__" in html else get_nuxt_data(driver)
+            return {"html": html, "nuxt_data": nuxt_data}
         except Exception as e:
-            logger.warning(f"Lỗi khác khi truy cập sản phẩm {row['name']} ({row['url']}): {e}")
-            time.sleep(2)
-            continue
+            logger.error(f"Lỗi khi chụp trang sản phẩm {row['name']}: {e}")
+            return None
 
+    def parse(position, snapshot):
+        row = rows[position]
         try:
-            # Các hàm lấy thông tin chi tiết
-            brand_name = get_brand(driver)
-            nuxt_data = get_nuxt_data(driver)
-            specifications = extract_specifications(nuxt_data) if nuxt_data else {}
-            prices = scrape_prices(driver, nuxt_data)
-            features = scrape_features(driver, nuxt_data)
-            faq_answers = scrape_faq_answers(driver)
-            image_links = get_image_urls(driver)
-
-            result = {
-                "name": row["name"],
-                "url": row["url"],
-                "category": category,
-                "brand": brand_name,
-                "specifications": specifications,
-                "prices": prices,
-                "image_links": image_links,
-                "features": features + faq_answers if (features or faq_answers) else []
-            }
-            results.append(result)
-            # Kiểm tra thiếu mục nào
-            missing_fields = []
-            if not brand_name:
-                missing_fields.append("brand")
-            if not specifications:
-                missing_fields.append("specifications")
-            if not prices:
-                missing_fields.append("prices")
-            if not image_links:
-                missing_fields.append("images")
-            if not features:
-                missing_fields.append("features")
-            if missing_fields:
-                logger.warning(f"Thiếu {', '.join(missing_fields)} ở sản phẩm: {row['name']}")
+            extracted = extract_product_from_html(snapshot["html"])
+            if extracted is None and snapshot["nuxt_data"]:
+                extracted = extract_product_from_html(snapshot["html"], nuxt_data=snapshot["nuxt_data"])
+            return build_record(row, category, extracted, logger) if extracted is not None else None
         except Exception as e:
             logger.error(f"Lỗi khi xử lý dữ liệu sản phẩm {row['name']}: {e}")
-            time.sleep(2)
+            return None
+
+    positions = list(range(len(rows)))
+    if get_extract_mode() == "html":
+        results = pipelined(positions, capture, parse)
+        fallback = [position for position in opened if results[position] is None]
+    else:
+        results = [None] * len(rows)
+        fallback = positions
+
+    for position in sorted(fallback):
+        row = rows[position]
+        if get_extract_mode() == "html":
+            logger.info(f"Không đọc được __NUXT__, dùng Selenium cho sản phẩm {row['name']}")
+        else:
+            logger.info(f"Thu thập dữ liệu sản phẩm {start + position}: {row['name']}")
+        if not open_product_page(driver, row, logger):
             continue
-        finally:
-            logger.info(f"Đã thu thập chi tiết sản phẩm {row['name']}")
+        try:
+            archive_driver_page(driver, row["url"], "cellphones", logger=logger)
+            results[position] = build_record(row, category, scrape_with_selenium(driver, category), logger)
+        except Exception as e:
+            logger.error(f"Lỗi khi xử lý dữ liệu sản phẩm {row['name']}: {e}")
 
+    results = [result for result in results if result is not None]
     logger.info(f"Hoàn tất crawl chi tiết {len(results)} sản phẩm cho danh mục {category}")
     return results
 
+def crawl_prices_range(start, end, rows, driver, logger):
+    """Chế độ --prices-only: chỉ lấy giá biến thể (hoặc special_price) cho các sản phẩm đã có"""
+    updates = []
+    for row in rows[start:end]:
+        try:
+            throttled_get(driver, row["url"])
+            wait_policy.until(driver, EC.presence_of_element_located((By.TAG_NAME, "body")), 20)
+            html = driver.page_source
+            archive_page(row["url"], "cellphones", "product", html, logger)
+            prices = extract_prices_from_html(html)
+            if not prices:
+                prices = scrape_prices(driver, get_nuxt_data(driver))
+            updates.append({"url": row["url"], "prices": prices})
+        except Exception as e:
+            logger.warning(f"Lỗi khi lấy giá sản phẩm {row['name']} ({row['url']}): {e}")
+            continue
+    return updates
+
 # ======= main =======
+# Chỉ các trường mà thiếu nghĩa là trang tải lỗi; features / image_links trống hợp lệ ở nhiều sản phẩm
+REQUIRED_FIELDS = ["brand", "specifications", "prices"]
+
 categories = [
     {"name": "điện thoại", "url": "https://cellphones.com.vn/mobile.html", "name_file": "phone", "max_needs": 8},
     {"name": "máy tính bảng", "url": "https://cellphones.com.vn/tablet.html", "name_file": "tablet", "max_needs": 6},
@@ -335,35 +384,176 @@ categories = [
     {"name": "pc", "url": "https://cellphones.com.vn/may-tinh-de-ban.html", "name_file": "pc", "max_needs": 4}
 ]
 
-def crawl():
+def category_key(category):
+    return category["name_file"]
+
+
+def output_path(category):
+    return f"data/raw/cellphones/{category['name_file']}.csv"
+
+
+def discover_products(category, driver, logger):
+    """Danh sách sản phẩm (name, url) của một danh mục, kèm nhu cầu sử dụng trong dữ liệu phụ"""
+    logger.info(f"Thu thập sản phẩm và nhu cầu sử dụng cho danh mục: {category['name']}")
+    products, filter_records = harvest_needs_filter(
+        category["url"], driver, category["max_needs"], lambda: expand_product_list(driver, logger), setup_driver, logger
+    )
+    df_products = pd.DataFrame(products).drop_duplicates(subset=["url"], keep="last").reset_index(drop=True)
+    return df_products, {"filter": filter_records}
+
+
+def uses_driver_pool():
+    return True
+
+
+def crawl_details(start, end, df_to_crawl, category, driver, logger):
+    """Crawl chi tiết các sản phẩm [start, end) của df_to_crawl, trả về list bản ghi"""
+    return crawl_selected_range(start, end, df_to_crawl, category["name"], driver, logger)
+
+
+def build_output(df_products, records, extra):
+    # Cột needs của bản ghi dùng lại được tính lại từ df_filter
+    df_filter = pd.DataFrame(extra["filter"])
+    df_detailed = pd.DataFrame(records).drop(columns=["needs"], errors="ignore")
+
+    if not df_filter.empty:
+        df_detailed = pd.merge(df_detailed, df_filter[["url", "needs"]], on="url", how="left")
+    else:
+        df_detailed["needs"] = None
+    return df_detailed
+
+
+def reextract(row, category, archive):
+    """Trích xuất lại bản ghi từ HTML đã lưu trong kho (không tải lại trang), None nếu không đủ dữ liệu"""
+    html = archive.latest(row["url"])
+    extracted = extract_product_from_html(html) if html else None
+    if extracted is None:
+        return None
+
+    features, faq_answers = extracted["features"], extracted["faq_answers"]
+    return {
+        "brand": extracted["brand"],
+        "specifications": extracted["specifications"],
+        "prices": extracted["prices"],
+        "image_links": extracted["image_links"],
+        "features": features + faq_answers if (features or faq_answers) else [],
+    }
+
+
+def crawl(resume=False):
     logger = get_logger()
     logger.info("Khởi tạo trình duyệt và bắt đầu quá trình crawl")
     driver = setup_driver()
+    wait_policy.start()
+    store = CrawlStateStore()
+    run_checkpoint = SourceCheckpoint("cellphones")
+    budget = TimeBudget("cellphones")
+    run_checkpoint.start(resume)
 
     for category in categories:
         logger.info(f"Xử lý danh mục: {category['name']}")
+        key = category_key(category)
+        if resume and run_checkpoint.is_completed(key):
+            logger.info(f"Danh mục {category['name']} đã hoàn thành ở lần chạy trước, bỏ qua")
+            continue
+
+        path = output_path(category)
+        if not budget.start_category():
+            logger.info(f"Hết thời gian crawl, bỏ qua danh mục {category['name']}, giữ dữ liệu cũ")
+            continue
+
+        category_checkpoint = run_checkpoint.category(key)
+
+        def discover():
+            df_products, extra = discover_products(category, driver, logger)
+            df_to_crawl, reused = split_fresh_products(store, df_products, path, logger)
+            if budget.active:
+                # Có hạn chót: URL mới trước, rồi giá cũ nhất, cuối cùng sản phẩm lỗi / thiếu trường lần trước
+                df_to_crawl = prioritize(store, df_to_crawl)
+            return df_products, df_to_crawl, reused, extra
+
+        df_products, df_to_crawl, reused, extra = prepare_category(category_checkpoint, resume, discover, logger)
+
+        with streaming("cellphones", key, append=resume, logger=logger) as writer:
+            def crawl_rows(df_rows):
+                return crawl_range(
+                    0, len(df_rows),
+                    lambda s, e, worker_driver: crawl_details(s, e, df_rows, category, worker_driver, logger),
+                    setup_driver, driver, logger
+                )
+
+            def on_records(df_rows, rows_records):
+                record_crawl_results(store, "cellphones", key, df_rows, rows_records, REQUIRED_FIELDS, logger)
+
+            # Mỗi nhóm biến thể màu / dung lượng chỉ crawl một trang đại diện (có checkpoint), sau đó nhân bản ghi.
+            # Bản ghi đầy đủ nằm trong chunk checkpoint và file stream, ở đây chỉ giữ bản tóm tắt
+            summaries = crawl_with_variant_groups(
+                "cellphones", df_to_crawl,
+                lambda df_representatives: crawl_with_checkpoint(
+                    category_checkpoint,
+                    len(df_representatives),
+                    lambda start, end: crawl_range(
+                        start, end,
+                        lambda s, e, worker_driver: crawl_details(s, e, df_representatives, category, worker_driver, logger),
+                        setup_driver, driver, logger
+                    ),
+                    logger,
+                    on_chunk=lambda start, end, records: record_crawl_results(
+                        store, "cellphones", key, df_representatives.iloc[start:end], records, REQUIRED_FIELDS, logger
+                    ),
+                    budget=budget
+                ),
+                crawl_rows,
+                on_records,
+                logger,
+                budget=budget
+            )
+            summaries = retry_pending(df_to_crawl, summaries, REQUIRED_FIELDS, crawl_rows, logger, budget=budget, on_records=on_records)
+
+            if budget.exhausted:
+                reused = keep_unfinished(df_products, reused, summaries, path, logger)
+            writer.close()
+            write_category_output(
+                path, df_products, reused, category_checkpoint.chunk_paths() + [writer.path],
+                build_output, extra, REQUIRED_FIELDS, logger
+            )
 
-        logger.info(f"Thu thập nhu cầu sử dụng cho danh mục: {category['name']}")
+        # Hết thời gian giữa chừng thì giữ checkpoint để --resume crawl tiếp phần còn lại
+        if not budget.exhausted:
+            run_checkpoint.mark_completed(key)
+        logger.info(f"Hoàn thành lưu dữ liệu danh mục {category['name']} vào {path}")
 
-        filter_products = crawl_needs_filter(category["url"], driver, category["max_needs"])
-        df_filter = pd.DataFrame(filter_products)
+    driver.quit()
+    store.close()
+    wait_policy.report(logger)
+    report_limits(logger)
+    report_lifecycle(logger)
+    report_path_stats(logger)
+    budget.report(logger)
+    logger.info("Đóng trình duyệt, kết thúc chương trình")
 
-        products = crawl_product_list(driver, logger, category["url"])
-        df_products = pd.DataFrame(products).drop_duplicates(subset=["url"], keep="last").reset_index(drop=True)
-        detailed = crawl_selected_range(0, len(df_products), df_products, category["name"], driver, logger)
-        df_detailed = pd.DataFrame(detailed)
 
-        if not df_filter.empty:
-            df_detailed = pd.merge(df_detailed, df_filter[["url", "needs"]], on="url", how="left")
-        else:
-            df_detailed["needs"] = None
+def crawl_prices():
+    logger = get_logger()
+    logger.info("Khởi tạo trình duyệt và bắt đầu cập nhật giá CellphoneS")
+    driver = setup_driver()
+    wait_policy.start()
+    store = CrawlStateStore()
 
-        output_path = f"data/raw/cellphones/{category['name_file']}.csv"
-        df_detailed.to_csv(output_path, index=False)
-        logger.info(f"Hoàn thành lưu dữ liệu danh mục {category['name']} vào {output_path}")
+    for category in categories:
+        refresh_category_prices(
+            "cellphones", category["name_file"], f"data/raw/cellphones/{category['name_file']}.csv",
+            lambda start, end, rows, worker_driver: crawl_prices_range(start, end, rows, worker_driver, logger),
+            setup_driver, driver, store, logger
+        )
 
     driver.quit()
-    logger.info("Đóng trình duyệt, kết thúc chương trình")
+    store.close()
+    wait_policy.report(logger)
+    report_limits(logger)
+    report_lifecycle(logger)
+    report_path_stats(logger)
+    logger.info("Hoàn tất cập nhật giá CellphoneS")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,250 @@
+import json
+import os
+import re
+
+import quickjs
+from bs4 import BeautifulSoup, Tag
+from lxml import html as lxml_html
+
+NUXT_PREFIX = re.compile(r"^\s*window\.__NUXT__\s*=\s*")
+
+
+def get_nuxt_js_limits(time_limit=2.0, memory_mb=64.0):
+    """
+    (giây, MB) tối đa khi chạy script __NUXT__ bằng quickjs, cấu hình qua CELLPHONES_NUXT_JS_TIME_LIMIT_S /
+    CELLPHONES_NUXT_JS_MEMORY_MB: script lặp vô hạn hoặc quá lớn bị ngắt thay vì treo worker
+    """
+    limits = []
+    for name, default in (("CELLPHONES_NUXT_JS_TIME_LIMIT_S", time_limit), ("CELLPHONES_NUXT_JS_MEMORY_MB", memory_mb)):
+        try:
+            limits.append(max(0.1, float(os.getenv(name, default))))
+        except ValueError:
+            limits.append(default)
+    return tuple(limits)
+
+
+def get_extract_mode():
+    """Chế độ trích xuất trang chi tiết CellphoneS: 'html' (mặc định) hoặc 'selenium'"""
+    return os.getenv("CELLPHONES_EXTRACT_MODE", "html").lower()
+
+
+def _has_class(*classes):
+    return " and ".join(f"contains(concat(' ', normalize-space(@class), ' '), ' {c} ')" for c in classes)
+
+
+def _text(element, separator=""):
+    return separator.join(element.xpath(".//text()"))
+
+
+def parse_ld_json_brand(data):
+    if isinstance(data, dict) and data.get("@type") == "Product":
+        return data.get("brand", {}).get("name", "").strip()
+    if isinstance(data, list):
+        for item in data:
+            if item.get("@type") == "Product":
+                return item.get("brand", {}).get("name", "").strip()
+    return None
+
+
+# Parser cho clean_value: 'lxml' (nhanh) hoặc 'html.parser' (BeautifulSoup như cũ)
+CLEAN_VALUE_PARSER = os.getenv("CELLPHONES_HTML_PARSER", "lxml")
+
+
+def clean_value(raw_value, parser=None):
+    if not isinstance(raw_value, str): return raw_value
+    raw_value = re.sub(r"\(Path: x=\d+, y=\d+\)", "", raw_value).strip()
+    if (parser or CLEAN_VALUE_PARSER) == "lxml":
+        fragment = lxml_html.fragment_fromstring(raw_value, create_parent="div")
+        links = [a.text_content().strip() for a in fragment.iter("a")]
+        text = "\n".join(fragment.xpath(".//text()")).strip().split("\n")
+    else:
+        soup = BeautifulSoup(raw_value, "html.parser")
+        links = [a.get_text(strip=True) for a in soup.find_all("a")]
+        text = soup.get_text("\n").strip().split("\n")
+    if len(links) > 1: return links
+    return text if len(text) > 1 else text[0] if text else ""
+
+
+def extract_specifications(nuxt_data):
+    try:
+        specs = nuxt_data["state"]["product"]["productData"]["specification"]["full_by_group"]
+        return {item["label"]: clean_value(item["value"]) for group in specs for item in group["value"]}
+    except:
+        return {}
+
+
+def parse_price(price_text):
+    cleaned = re.sub(r"[^\d]", "", price_text)
+    return int(cleaned) if cleaned.isdigit() else None
+
+
+def nuxt_default_price(nuxt_data):
+    try:
+        price = nuxt_data["state"]["product"]["productData"]["filterable"]["special_price"]
+        return [{"color": "default", "price": price}]
+    except:
+        return []
+
+
+def extract_nuxt_features(nuxt_data):
+    features = []
+    try:
+        if nuxt_data and "data" in nuxt_data and nuxt_data["data"]:
+            html_content = nuxt_data["data"][0].get("pageInfo", {}).get("content", "")
+            if html_content:
+                soup = BeautifulSoup(html_content, "html.parser")
+
+                content_source = soup.find("blockquote")
+                if not content_source and soup.body:
+                    for child in soup.body.descendants:
+                        if isinstance(child, Tag) and child.name == "p":
+                            content_source = child
+                            break
+
+                if content_source:
+                    raw_text = content_source.get_text(separator=" ").strip()
+                    clean_text = ' '.join(raw_text.split())
+
+                    # Tách thành câu
+                    sentences = re.split(r'(?<=[.!?])\s+', clean_text)
+                    for sentence in sentences:
+                        if sentence.strip():
+                            features.append(sentence.strip())
+    except Exception as e:
+        pass
+
+    return features
+
+
+def parse_faq_data(data):
+    answers = []
+    for item in data['mainEntity']:
+        answer_html = item.get('acceptedAnswer', [{}])[0].get('text', '')
+        raw_text = BeautifulSoup(answer_html, 'html.parser').get_text(separator=" ").strip()
+        answer_text = ' '.join(raw_text.split()) 
+        if answer_text:
+            answers.append(answer_text)
+    return answers
+
+
+def parse_nuxt_state(tree):
+    """
+    Đọc window.__NUXT__ từ thẻ <script> trong HTML.
+    Nuxt 2 thường serialize dạng IIFE `(function(a,b,...){return {...}}(...))` nên
+    cần chạy biểu thức bằng quickjs rồi JSON.stringify lại; dạng JSON thuần thì parse trực tiếp.
+    quickjs chạy với giới hạn thời gian / bộ nhớ; vượt giới hạn (JSException) coi như không parse được nên trả về
+    None để nơi gọi dùng fallback Selenium.
+    """
+    for script in tree.xpath("//script[not(@src)]"):
+        text = script.text or ""
+        if not NUXT_PREFIX.match(text):
+            continue
+
+        expression = NUXT_PREFIX.sub("", text, count=1).strip().rstrip(";")
+        if expression.startswith("{"):
+            try:
+                return json.loads(expression)
+            except ValueError:
+                pass
+
+        try:
+            time_limit, memory_mb = get_nuxt_js_limits()
+            context = quickjs.Context()
+            context.set_time_limit(time_limit)
+            context.set_memory_limit(int(memory_mb * 1024 * 1024))
+            context.eval("var window = {};")
+            context.eval(f"window.__NUXT__ = {expression};")
+            return json.loads(context.eval("JSON.stringify(window.__NUXT__)"))
+        except Exception:
+            return None
+    return None
+
+
+def parse_ld_json(tree):
+    payloads = []
+    for script in tree.xpath('//script[@type="application/ld+json"]'):
+        try:
+            payloads.append(json.loads(script.text or ""))
+        except ValueError:
+            continue
+    return payloads
+
+
+def parse_brand(ld_json):
+    for data in ld_json:
+        brand = parse_ld_json_brand(data)
+        if brand is not None:
+            return brand
+    return None
+
+
+def parse_faq(ld_json):
+    for data in ld_json:
+        if isinstance(data, dict) and data.get('@type') == 'FAQPage' and 'mainEntity' in data:
+            return parse_faq_data(data)
+    return []
+
+
+def parse_prices(tree, nuxt_data):
+    prices = []
+    for item in tree.xpath(f"//ul[{_has_class('list-variants')}]/li"):
+        name_elems = item.xpath(f".//strong[{_has_class('item-variant-name')}]")
+        price_elems = item.xpath(f".//span[{_has_class('item-variant-price')}]")
+        if not name_elems or not price_elems:
+            continue
+        name = _text(name_elems[0]).strip()
+        price = parse_price(_text(price_elems[0]).strip())
+        if name and price:
+            prices.append({"color": name, "price": price})
+    return prices or nuxt_default_price(nuxt_data)
+
+
+def parse_gallery_features(tree):
+    features = []
+    for li in tree.xpath(f'//*[@id="v2Gallery"]//div[{_has_class("desktop")}]//ul/li'):
+        text = ' '.join(_text(li, " ").split())
+        if text:
+            features.append(text)
+    return features
+
+
+def parse_image_urls(tree, ld_json):
+    links = tree.xpath(f"//div[{_has_class('swiper-slide')}]//a[{_has_class('spotlight')}]/@href")
+    links = [link for link in links if link.startswith("https://")]
+    if links:
+        return links
+
+    # Gallery chưa render thì lấy ảnh khai báo trong ld+json Product
+    for data in ld_json:
+        if isinstance(data, dict) and data.get("@type") == "Product":
+            images = data.get("image", [])
+            images = [images] if isinstance(images, str) else images
+            return [link for link in images if isinstance(link, str) and link.startswith("https://")]
+    return []
+
+
+def extract_product_from_html(html, nuxt_data=None):
+    """
+    Snapshot extractor: parse page_source một lần thành cây lxml rồi chạy mọi extractor trên cây đó.
+    Trả về None nếu không có state Nuxt (cả trong HTML lẫn nuxt_data truyền vào).
+    """
+    tree = lxml_html.fromstring(html)
+    nuxt_data = parse_nuxt_state(tree) or nuxt_data
+    if not nuxt_data:
+        return None
+
+    ld_json = parse_ld_json(tree)
+    return {
+        "brand": parse_brand(ld_json),
+        "specifications": extract_specifications(nuxt_data),
+        "prices": parse_prices(tree, nuxt_data),
+        "features": parse_gallery_features(tree) + extract_nuxt_features(nuxt_data),
+        "faq_answers": parse_faq(ld_json),
+        "image_links": parse_image_urls(tree, ld_json),
+    }
+
+
+def extract_prices_from_html(html, nuxt_data=None):
+    """Chỉ lấy giá: danh sách biến thể trong HTML, không có thì special_price trong state Nuxt"""
+    tree = lxml_html.fromstring(html)
+    return parse_prices(tree, parse_nuxt_state(tree) or nuxt_data)
@@ -0,0 +1,196 @@
+import glob
+import json
+import os
+import shutil
+
+import pandas as pd
+
+from .variant_groups import is_enabled as group_variants_enabled
+
+CHECKPOINT_DIR = "data/checkpoints"
+
+
+def get_chunk_size(default=50):
+    """Số sản phẩm mỗi chunk được ghi xuống đĩa, cấu hình qua CRAWL_CHECKPOINT_CHUNK"""
+    try:
+        return max(1, int(os.getenv("CRAWL_CHECKPOINT_CHUNK", default)))
+    except ValueError:
+        return default
+
+
+def _write_json(path, data):
+    # Ghi ra file tạm rồi os.replace để không bao giờ để lại file hỏng khi bị kill giữa chừng
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, default=str)
+    os.replace(tmp_path, path)
+
+
+def _read_json(path, default=None):
+    if not os.path.exists(path):
+        return default
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def write_jsonl(path, records):
+    """Ghi list bản ghi ra file JSONL (qua file tạm để không để lại file dở dang)"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        for record in records:
+            f.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+    os.replace(tmp_path, path)
+
+
+def read_jsonl(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+class SourceCheckpoint:
+    """Theo dõi các danh mục đã crawl xong của một nguồn trong lần chạy gần nhất"""
+
+    def __init__(self, source, base_dir=CHECKPOINT_DIR):
+        self.source = source
+        self.dir = os.path.join(base_dir, source)
+        self.path = os.path.join(self.dir, "run.json")
+        os.makedirs(self.dir, exist_ok=True)
+
+    def start(self, resume):
+        """Bắt đầu lần chạy mới (xóa checkpoint cũ) hoặc tiếp tục lần chạy trước"""
+        if not resume:
+            shutil.rmtree(self.dir, ignore_errors=True)
+            os.makedirs(self.dir, exist_ok=True)
+            _write_json(self.path, {"completed_categories": []})
+
+    def completed_categories(self):
+        return _read_json(self.path, {"completed_categories": []})["completed_categories"]
+
+    def is_completed(self, category):
+        return category in self.completed_categories()
+
+    def mark_completed(self, category):
+        completed = self.completed_categories()
+        if category not in completed:
+            completed.append(category)
+        _write_json(self.path, {"completed_categories": completed})
+        CategoryCheckpoint(self.source, category, os.path.dirname(self.dir)).clear()
+
+    def category(self, category):
+        return CategoryCheckpoint(self.source, category, os.path.dirname(self.dir))
+
+
+class CategoryCheckpoint:
+    """
+    Checkpoint của một danh mục: danh sách sản phẩm cần crawl, các chunk bản ghi đã xong (JSONL)
+    và cursor = vị trí sản phẩm tiếp theo cần crawl.
+    """
+
+    def __init__(self, source, category, base_dir=CHECKPOINT_DIR):
+        self.dir = os.path.join(base_dir, source, category)
+        self.products_path = os.path.join(self.dir, "products.json")
+        self.cursor_path = os.path.join(self.dir, "cursor.json")
+
+    def has_products(self):
+        return os.path.exists(self.products_path)
+
+    def save_products(self, data):
+        """Lưu danh sách sản phẩm (và dữ liệu phụ như needs, bản ghi dùng lại) để resume không phải duyệt lại listing"""
+        shutil.rmtree(self.dir, ignore_errors=True)
+        os.makedirs(self.dir, exist_ok=True)
+        _write_json(self.products_path, data)
+        _write_json(self.cursor_path, {"position": 0})
+
+    def load_products(self):
+        return _read_json(self.products_path)
+
+    @property
+    def cursor(self):
+        return _read_json(self.cursor_path, {"position": 0})["position"]
+
+    def append_chunk(self, start, end, records):
+        write_jsonl(os.path.join(self.dir, f"chunk_{start:06d}_{end:06d}.jsonl"), records)
+        _write_json(self.cursor_path, {"position": end})
+
+    def chunk_paths(self):
+        return sorted(glob.glob(os.path.join(self.dir, "chunk_*.jsonl")))
+
+    def iter_completed_records(self):
+        """Đọc lần lượt bản ghi đã hoàn thành theo từng chunk, không nạp hết vào bộ nhớ"""
+        for chunk_path in self.chunk_paths():
+            yield from read_jsonl(chunk_path)
+
+    def clear(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+
+def crawl_with_checkpoint(checkpoint, total, crawl_range, logger, on_chunk=None, chunk_size=None, budget=None):
+    """
+    Crawl [cursor, total) theo từng chunk, ghi mỗi chunk xuống đĩa ngay khi xong.
+    crawl_range(start, end) trả về list bản ghi; trả về iterator đọc lại từ đĩa mọi bản ghi đã hoàn thành
+    (kể cả từ lần chạy trước), chỉ giữ trong bộ nhớ một chunk mỗi lúc.
+    Có budget (TimeBudget) thì chunk cuối được thu nhỏ / dừng hẳn khi không còn kịp trước hạn chót.
+    """
+    chunk_size = chunk_size or get_chunk_size()
+    start = checkpoint.cursor
+    if start:
+        logger.info(f"Tiếp tục từ sản phẩm {start}/{total} theo checkpoint")
+
+    chunk_start = start
+    while chunk_start < total:
+        chunk_end = min(chunk_start + chunk_size, total)
+        if budget is not None:
+            chunk_end = chunk_start + budget.affordable(chunk_end - chunk_start)
+            if chunk_end == chunk_start:
+                logger.info(f"Hết thời gian crawl, dừng ở sản phẩm {chunk_start}/{total}")
+                break
+            records = budget.timed(chunk_end - chunk_start, lambda: crawl_range(chunk_start, chunk_end))
+        else:
+            records = crawl_range(chunk_start, chunk_end)
+        checkpoint.append_chunk(chunk_start, chunk_end, records)
+        if on_chunk:
+            on_chunk(chunk_start, chunk_end, records)
+        logger.info(f"Đã lưu checkpoint {chunk_end}/{total}")
+        chunk_start = chunk_end
+
+    return checkpoint.iter_completed_records()
+
+
+def checkpoint_settings():
+    """
+    Cấu hình quyết định cursor trỏ vào đâu: khi gom biến thể, cursor đánh số trên danh sách trang đại diện
+    chứ không phải df_to_crawl, nên resume với cấu hình khác sẽ bắt đầu sai dòng
+    """
+    return {"group_variants": group_variants_enabled()}
+
+
+def prepare_category(checkpoint, resume, discover, logger):
+    """
+    Lấy (df_products, df_to_crawl, reused, extra) của một danh mục.
+    Khi resume và đã có checkpoint thì đọc lại từ đĩa, ngược lại gọi discover() rồi lưu kết quả.
+    Checkpoint tạo với cấu hình khác (checkpoint_settings) bị bỏ và duyệt lại danh mục từ đầu.
+    """
+    settings = checkpoint_settings()
+    saved = checkpoint.load_products() if resume and checkpoint.has_products() else None
+    if saved is not None and saved.get("settings") != settings:
+        logger.warning(
+            f"Checkpoint được tạo với cấu hình {saved.get('settings')}, khác cấu hình hiện tại {settings}; "
+            f"bỏ checkpoint và duyệt lại danh mục"
+        )
+        saved = None
+    if saved is not None:
+        logger.info(f"Dùng lại danh sách {len(saved['listing'])} sản phẩm từ checkpoint, bỏ qua bước duyệt danh mục")
+        df_products = pd.DataFrame(saved["listing"], columns=saved["columns"])
+        df_to_crawl = pd.DataFrame(saved["to_crawl"], columns=saved["columns"])
+        return df_products, df_to_crawl, saved["reused"], saved["extra"]
+
+    df_products, df_to_crawl, reused, extra = discover()
+    checkpoint.save_products({
+        "columns": list(df_products.columns),
+        "listing": df_products.to_dict("records"),
+        "to_crawl": df_to_crawl.to_dict("records"),
+        "reused": reused,
+        "extra": extra,
+        "settings": settings,
+    })
+    return df_products, df_to_crawl, reused, extra
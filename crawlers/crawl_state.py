@@ -0,0 +1,286 @@
+import datetime
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+
+import pandas as pd
+
+from .record_writer import iter_records
+
+STATE_PATH = "data/crawl_state.sqlite"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS products (
+    url TEXT PRIMARY KEY,
+    source TEXT NOT NULL,
+    category TEXT NOT NULL,
+    status TEXT NOT NULL,
+    payload_hash TEXT,
+    last_fetched_at TEXT,
+    changed_at TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_products_category ON products (category, changed_at);
+CREATE TABLE IF NOT EXISTS processed (
+    category TEXT PRIMARY KEY,
+    processed_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS uploads (
+    collection TEXT NOT NULL,
+    doc_id TEXT NOT NULL,
+    content_hash TEXT NOT NULL,
+    uploaded_at TEXT NOT NULL,
+    PRIMARY KEY (collection, doc_id)
+);
+"""
+
+STATUS_OK = "ok"
+STATUS_INCOMPLETE = "incomplete"
+STATUS_FAILED = "failed"
+
+
+def now_iso():
+    return datetime.datetime.now().isoformat(timespec="microseconds")
+
+
+def payload_hash(payload):
+    """Hash ổn định của bản ghi đã trích xuất (không phụ thuộc thứ tự key)"""
+    text = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def get_ttl_hours():
+    """
+    Sản phẩm đã crawl thành công trong CRAWL_STATE_TTL_HOURS giờ gần nhất sẽ không crawl lại.
+    Mặc định 24h dành cho các lần chạy lại thủ công trong ngày (crawl lại sau lỗi, chạy thêm nguồn, ...);
+    lịch crawl hằng tuần luôn quá TTL nên mọi sản phẩm được tải lại để cập nhật giá. Đặt 0 để tắt.
+    """
+    try:
+        return float(os.getenv("CRAWL_STATE_TTL_HOURS", "24"))
+    except ValueError:
+        return 24.0
+
+
+class CrawlStateStore:
+    """Lưu trạng thái crawl theo URL sản phẩm trong SQLite để bỏ qua sản phẩm không đổi"""
+
+    def __init__(self, path=STATE_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        # Nhiều tiến trình crawl (mỗi nguồn một tiến trình) ghi chung file: WAL + chờ khóa thay vì lỗi ngay
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+    # ===== Giai đoạn crawl =====
+    def get(self, url):
+        row = self.conn.execute(
+            "SELECT status, payload_hash, last_fetched_at, changed_at FROM products WHERE url = ?", (url,)
+        ).fetchone()
+        if row is None:
+            return None
+        return dict(zip(("status", "payload_hash", "last_fetched_at", "changed_at"), row))
+
+    def is_fresh(self, url, ttl_hours=None):
+        ttl_hours = get_ttl_hours() if ttl_hours is None else ttl_hours
+        state = self.get(url)
+        if not ttl_hours or not state or state["status"] != STATUS_OK or not state["last_fetched_at"]:
+            return False
+        fetched_at = datetime.datetime.fromisoformat(state["last_fetched_at"])
+        return datetime.datetime.now() - fetched_at < datetime.timedelta(hours=ttl_hours)
+
+    def record(self, url, source, category, status, payload=None):
+        """Ghi kết quả fetch của một sản phẩm, trả về True nếu nội dung thay đổi so với lần trước"""
+        timestamp = now_iso()
+        with self._lock:
+            previous = self.get(url)
+            new_hash = payload_hash(payload) if payload is not None else (previous or {}).get("payload_hash")
+            changed = previous is None or (payload is not None and previous["payload_hash"] != new_hash)
+            changed_at = timestamp if changed else previous["changed_at"]
+            self.conn.execute(
+                """
+                INSERT INTO products (url, source, category, status, payload_hash, last_fetched_at, changed_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(url) DO UPDATE SET
+                    source = excluded.source, category = excluded.category, status = excluded.status,
+                    payload_hash = excluded.payload_hash, last_fetched_at = excluded.last_fetched_at,
+                    changed_at = excluded.changed_at
+                """,
+                (url, source, category, status, new_hash, timestamp, changed_at)
+            )
+            self.conn.commit()
+        return changed
+
+    def mark_changed(self, url, source, category):
+        """Đánh dấu sản phẩm vừa thay đổi mà không cần hash lại toàn bộ bản ghi (vd: chỉ cập nhật giá)"""
+        timestamp = now_iso()
+        with self._lock:
+            self.conn.execute(
+                """
+                INSERT INTO products (url, source, category, status, last_fetched_at, changed_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT(url) DO UPDATE SET changed_at = excluded.changed_at
+                """,
+                (url, source, category, STATUS_OK, timestamp, timestamp)
+            )
+            self.conn.commit()
+
+    # ===== Giai đoạn xử lý =====
+    def category_changed(self, category):
+        """Danh mục có sản phẩm (của bất kỳ nguồn nào) thay đổi kể từ lần xử lý trước không"""
+        row = self.conn.execute("SELECT processed_at FROM processed WHERE category = ?", (category,)).fetchone()
+        if row is None:
+            return True
+        changed = self.conn.execute(
+            "SELECT 1 FROM products WHERE category = ? AND changed_at > ? LIMIT 1", (category, row[0])
+        ).fetchone()
+        return changed is not None
+
+    def mark_processed(self, category):
+        with self._lock:
+            self.conn.execute(
+                "INSERT INTO processed (category, processed_at) VALUES (?, ?) "
+                "ON CONFLICT(category) DO UPDATE SET processed_at = excluded.processed_at",
+                (category, now_iso())
+            )
+            self.conn.commit()
+
+    # ===== Giai đoạn upload =====
+    def upload_changed(self, collection, doc_id, data):
+        row = self.conn.execute(
+            "SELECT content_hash FROM uploads WHERE collection = ? AND doc_id = ?", (collection, doc_id)
+        ).fetchone()
+        return row is None or row[0] != payload_hash(data)
+
+    def mark_uploaded(self, collection, doc_id, data):
+        with self._lock:
+            self.conn.execute(
+                "INSERT INTO uploads (collection, doc_id, content_hash, uploaded_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(collection, doc_id) DO UPDATE SET "
+                "content_hash = excluded.content_hash, uploaded_at = excluded.uploaded_at",
+                (collection, doc_id, payload_hash(data), now_iso())
+            )
+            self.conn.commit()
+
+
+def split_fresh_products(store, df_products, output_path, logger):
+    """
+    Tách danh sách sản phẩm thành (cần crawl, bản ghi cũ dùng lại).
+    Sản phẩm còn "tươi" trong state store và có sẵn trong CSV cũ thì không crawl lại.
+    """
+    if df_products.empty or not os.path.exists(output_path):
+        return df_products, []
+
+    df_previous = pd.read_csv(output_path, encoding="utf-8")
+    if "url" not in df_previous.columns:
+        return df_products, []
+    previous_by_url = {row["url"]: row for row in df_previous.to_dict("records")}
+
+    fresh_mask = df_products["url"].map(lambda url: url in previous_by_url and store.is_fresh(url))
+    reused = [previous_by_url[url] for url in df_products.loc[fresh_mask, "url"]]
+    if reused:
+        logger.info(f"Bỏ qua {len(reused)}/{len(df_products)} sản phẩm đã crawl gần đây, dùng lại dữ liệu trong {output_path}")
+    return df_products[~fresh_mask].reset_index(drop=True), reused
+
+
+def record_crawl_results(store, source, category, df_products, records, required_fields, logger):
+    """Cập nhật state store sau khi crawl một danh mục; sản phẩm không có kết quả được đánh dấu failed"""
+    crawled_urls = set()
+    changed_count = 0
+    for record in records:
+        crawled_urls.add(record["url"])
+        missing = [field for field in required_fields if not record.get(field)]
+        status = STATUS_INCOMPLETE if missing else STATUS_OK
+        if store.record(record["url"], source, category, status, record):
+            changed_count += 1
+
+    failed_urls = [url for url in df_products["url"] if url not in crawled_urls] if not df_products.empty else []
+    for url in failed_urls:
+        store.record(url, source, category, STATUS_FAILED)
+
+    logger.info(
+        f"[{source}/{category}] State store: {changed_count} sản phẩm thay đổi, "
+        f"{len(records) - changed_count} không đổi, {len(failed_urls)} lỗi"
+    )
+
+
+def get_output_chunk_size(default=200):
+    """Số dòng CSV dựng và ghi mỗi lần từ file bản ghi, cấu hình qua CRAWL_OUTPUT_CHUNK"""
+    try:
+        return max(1, int(os.getenv("CRAWL_OUTPUT_CHUNK", default)))
+    except ValueError:
+        return default
+
+
+def write_category_output(output_path, df_products, reused, record_paths, build_output, extra, required_fields,
+                          logger, chunk_size=None):
+    """
+    Ghi CSV của danh mục theo thứ tự df_products từ các file bản ghi (chunk checkpoint, file stream JSONL / Parquet)
+    cộng bản ghi dùng lại, dựng từng đoạn chunk_size dòng qua build_output nên bộ nhớ không tăng theo số sản phẩm.
+    Một URL có nhiều bản ghi (retry, resume) thì giữ bản thiếu ít trường bắt buộc hơn, bằng nhau thì bản ghi sau.
+    Ghi ra file tạm rồi os.replace để CSV cũ còn nguyên nếu bị dừng giữa chừng; trả về số dòng đã ghi.
+    """
+    chunk_size = chunk_size or get_output_chunk_size()
+    urls = list(df_products["url"]) if not df_products.empty else []
+    wanted = set(urls)
+    reused_by_url = {row["url"]: row for row in reused}
+    columns = {}
+
+    # Bảng tạm SQLite trên đĩa (không giữ bản ghi trong bộ nhớ), khóa theo URL
+    conn = sqlite3.connect("")
+    try:
+        conn.execute("CREATE TABLE records (url TEXT PRIMARY KEY, missing INTEGER NOT NULL, data TEXT NOT NULL)")
+        for record in iter_records(record_paths):
+            if record.get("url") not in wanted:
+                continue
+            columns.update(dict.fromkeys(record))
+            conn.execute(
+                """
+                INSERT INTO records (url, missing, data) VALUES (?, ?, ?)
+                ON CONFLICT(url) DO UPDATE SET missing = excluded.missing, data = excluded.data
+                WHERE excluded.missing <= records.missing
+                """,
+                (record["url"], sum(not record.get(field) for field in required_fields),
+                 json.dumps(record, ensure_ascii=False, default=str))
+            )
+        for row in reused:
+            columns.update(dict.fromkeys(row))
+
+        os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+        tmp_path = f"{output_path}.tmp"
+        if not columns:
+            pd.DataFrame().to_csv(tmp_path, index=False)
+            os.replace(tmp_path, output_path)
+            return 0
+
+        # Cột cố định cho mọi đoạn: dựng thử một bản ghi rỗng đủ mọi cột
+        output_columns = list(build_output(df_products, [dict.fromkeys(columns)], extra).columns)
+        written = 0
+        for start in range(0, len(urls), chunk_size):
+            chunk_urls = urls[start:start + chunk_size]
+            placeholders = ", ".join("?" for _ in chunk_urls)
+            found = {
+                url: json.loads(data)
+                for url, data in conn.execute(f"SELECT url, data FROM records WHERE url IN ({placeholders})", chunk_urls)
+            }
+            chunk = [found.get(url) or reused_by_url.get(url) for url in chunk_urls]
+            chunk = [{**dict.fromkeys(columns), **record} for record in chunk if record is not None]
+            if not chunk:
+                continue
+            df = build_output(df_products, chunk, extra).reindex(columns=output_columns)
+            df.to_csv(tmp_path, mode="a" if written else "w", header=not written, index=False)
+            written += len(df)
+
+        if not written:
+            pd.DataFrame(columns=output_columns).to_csv(tmp_path, index=False)
+        os.replace(tmp_path, output_path)
+    finally:
+        conn.close()
+    logger.info(f"Đã ghi {written}/{len(urls)} sản phẩm vào {output_path}")
+    return written
@@ -0,0 +1,200 @@
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from my_logger import get_logger
+from .browser_profile import browser_rss_mb
+
+# Lỗi cho thấy renderer / trình duyệt đã chết, phiên hiện tại không dùng tiếp được
+CRASH_PATTERN = re.compile(
+    r"tab crashed|session deleted|invalid session id|chrome not reachable|disconnected|target window already closed",
+    re.IGNORECASE,
+)
+
+
+def _env_number(name, default, cast=int):
+    try:
+        return max(0, cast(os.getenv(name, default)))
+    except ValueError:
+        return default
+
+
+def get_recycle_pages(default=300):
+    """Số trang tối đa của một trình duyệt trước khi tạo lại, CRAWL_RECYCLE_PAGES (0 = không giới hạn)"""
+    return _env_number("CRAWL_RECYCLE_PAGES", default)
+
+
+def get_max_rss_mb(default=1500):
+    """Ngưỡng RSS (MB) của chromedriver + Chrome để tạo lại trình duyệt, CRAWL_MAX_BROWSER_RSS_MB (0 = tắt)"""
+    return _env_number("CRAWL_MAX_BROWSER_RSS_MB", default, float)
+
+
+def get_prewarm_ratio(default=0.9):
+    """Đạt tỷ lệ này của ngưỡng trang / RSS thì bắt đầu khởi động sẵn trình duyệt thay thế"""
+    return min(1.0, _env_number("CRAWL_PREWARM_RATIO", default, float))
+
+
+class LifecycleStats:
+    """Chi phí khởi động / tái tạo trình duyệt của một nguồn"""
+
+    def __init__(self, source):
+        self.source = source
+        self.startups = 0
+        self.startup_seconds = 0.0
+        self.recycles = {"pages": 0, "rss": 0, "crash": 0}
+        self.recycle_wait_seconds = 0.0
+        self.pages = 0
+        self.peak_rss_mb = 0.0
+        self._lock = threading.Lock()
+
+    def add_startup(self, seconds):
+        with self._lock:
+            self.startups += 1
+            self.startup_seconds += seconds
+
+    def add_recycle(self, reason, wait_seconds):
+        with self._lock:
+            self.recycles[reason] += 1
+            self.recycle_wait_seconds += wait_seconds
+
+    def add_page(self, rss_mb):
+        with self._lock:
+            self.pages += 1
+            if rss_mb:
+                self.peak_rss_mb = max(self.peak_rss_mb, rss_mb)
+
+    def summary(self):
+        with self._lock:
+            average = self.startup_seconds / self.startups if self.startups else 0.0
+            recycles = ", ".join(f"{reason}: {count}" for reason, count in self.recycles.items())
+            return (f"[{self.source}] Trình duyệt: {self.startups} lần khởi động (TB {average:.1f}s), "
+                    f"tái tạo ({recycles}), chờ tái tạo {self.recycle_wait_seconds:.1f}s, "
+                    f"{self.pages} trang, RSS cao nhất {self.peak_rss_mb:.0f}MB")
+
+
+_stats = {}
+_stats_lock = threading.Lock()
+
+
+def get_lifecycle_stats(source):
+    with _stats_lock:
+        if source not in _stats:
+            _stats[source] = LifecycleStats(source)
+        return _stats[source]
+
+
+def report_lifecycle(logger):
+    with _stats_lock:
+        stats = list(_stats.values())
+    for source_stats in stats:
+        logger.info(source_stats.summary())
+
+
+class ManagedDriver:
+    """
+    Bọc trình duyệt tạo bởi launch_driver(): mọi thuộc tính / phương thức được chuyển cho trình duyệt hiện tại.
+    Trước mỗi driver.get, trình duyệt được tạo lại khi đã tải đủ CRAWL_RECYCLE_PAGES trang, RSS vượt
+    CRAWL_MAX_BROWSER_RSS_MB hoặc lần trước renderer bị crash. Trình duyệt thay thế được khởi động sẵn
+    ở luồng nền khi gần tới ngưỡng, trình duyệt cũ được đóng ở luồng nền.
+    """
+
+    def __init__(self, launch_driver, source, logger=None, recycle_pages=None, max_rss_mb=None, prewarm_ratio=None):
+        self._launch_driver = launch_driver
+        self._source = source
+        self._logger = logger or get_logger()
+        self._recycle_pages = get_recycle_pages() if recycle_pages is None else recycle_pages
+        self._max_rss_mb = get_max_rss_mb() if max_rss_mb is None else max_rss_mb
+        self._prewarm_ratio = get_prewarm_ratio() if prewarm_ratio is None else prewarm_ratio
+        self._stats = get_lifecycle_stats(source)
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"prewarm-{source}")
+        self._next = None
+        self._pages = 0
+        self._crashed = False
+        self._driver = self._launch()
+
+    def _launch(self):
+        started = time.perf_counter()
+        driver = self._launch_driver()
+        self._stats.add_startup(time.perf_counter() - started)
+        return driver
+
+    def __getattr__(self, name):
+        # Chỉ được gọi với thuộc tính không có trên ManagedDriver
+        if name == "_driver":
+            raise AttributeError(name)
+        return getattr(self._driver, name)
+
+    # ===== Tái tạo trình duyệt =====
+    def _recycle_reason(self, rss_mb):
+        if self._crashed:
+            return "crash"
+        if self._recycle_pages and self._pages >= self._recycle_pages:
+            return "pages"
+        if self._max_rss_mb and rss_mb and rss_mb >= self._max_rss_mb:
+            return "rss"
+        return None
+
+    def _should_prewarm(self, rss_mb):
+        if self._next is not None:
+            return False
+        near_pages = self._recycle_pages and self._pages >= self._recycle_pages * self._prewarm_ratio
+        near_rss = self._max_rss_mb and rss_mb and rss_mb >= self._max_rss_mb * self._prewarm_ratio
+        return bool(near_pages or near_rss)
+
+    def _take_next(self):
+        if self._next is None:
+            return self._launch()
+        future, self._next = self._next, None
+        try:
+            return future.result()
+        except Exception as e:
+            self._logger.warning(f"[{self._source}] Khởi động sẵn trình duyệt lỗi ({e}), khởi động lại")
+            return self._launch()
+
+    def _quit_in_background(self, driver):
+        def quit_driver():
+            try:
+                driver.quit()
+            except Exception as e:
+                self._logger.debug(f"Lỗi khi đóng trình duyệt cũ: {e}")
+        threading.Thread(target=quit_driver, daemon=True).start()
+
+    def recycle(self, reason):
+        started = time.perf_counter()
+        old_driver, self._driver = self._driver, self._take_next()
+        waited = time.perf_counter() - started
+        self._stats.add_recycle(reason, waited)
+        self._logger.info(f"[{self._source}] Tạo lại trình duyệt ({reason}) sau {self._pages} trang, chờ {waited:.1f}s")
+        self._pages = 0
+        self._crashed = False
+        self._quit_in_background(old_driver)
+
+    def get(self, url):
+        rss_mb = browser_rss_mb(self._driver) if self._max_rss_mb else None
+        reason = self._recycle_reason(rss_mb)
+        if reason:
+            self.recycle(reason)
+        elif self._should_prewarm(rss_mb):
+            self._next = self._executor.submit(self._launch)
+
+        try:
+            self._driver.get(url)
+        except Exception as e:
+            if CRASH_PATTERN.search(str(e)):
+                self._crashed = True
+            raise
+        finally:
+            self._pages += 1
+            self._stats.add_page(rss_mb)
+
+    def quit(self):
+        if self._next is not None:
+            try:
+                self._next.result().quit()
+            except Exception as e:
+                self._logger.debug(f"Lỗi khi đóng trình duyệt khởi động sẵn: {e}")
+            self._next = None
+        self._executor.shutdown(wait=False)
+        self._driver.quit()
@@ -0,0 +1,107 @@
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from my_logger import get_logger
+
+
+def get_pool_size(default=1):
+    """Số trình duyệt chạy song song, cấu hình qua biến môi trường CRAWL_WORKERS"""
+    try:
+        return max(1, int(os.getenv("CRAWL_WORKERS", default)))
+    except ValueError:
+        return default
+
+
+def _quit_driver(driver, logger):
+    if driver is None:
+        return
+    try:
+        driver.quit()
+    except Exception as e:
+        logger.debug(f"Lỗi khi đóng trình duyệt: {e}")
+
+
+def crawl_with_pool(total, crawl_range, setup_driver, num_workers=None, chunk_size=1, logger=None, attempts=2,
+                    on_failed=None):
+    """
+    Chia [0, total) thành các đoạn chunk_size rồi chia cho num_workers trình duyệt.
+    crawl_range(start, end, driver) trả về list bản ghi của đoạn đó.
+    Đoạn lỗi được đưa lại vào hàng đợi (trình duyệt mới) tối đa attempts lần; vẫn lỗi thì on_failed(start, end)
+    được gọi và sản phẩm của đoạn không có bản ghi, để lượt retry_pending cuối danh mục crawl lại.
+    Kết quả được gộp lại theo đúng thứ tự ban đầu.
+    """
+    logger = logger or get_logger()
+    num_workers = num_workers or get_pool_size()
+    num_workers = max(1, min(num_workers, total)) if total else 1
+
+    chunks = queue.Queue()
+    for start in range(0, total, chunk_size):
+        chunks.put((start, min(start + chunk_size, total), 1))
+
+    results = {}
+    failed_chunks = []
+    lock = threading.Lock()
+
+    def worker(worker_id):
+        driver = None
+        while True:
+            try:
+                start, end, attempt = chunks.get_nowait()
+            except queue.Empty:
+                break
+
+            try:
+                if driver is None:
+                    driver = setup_driver()
+                records = crawl_range(start, end, driver)
+                with lock:
+                    results[start] = list(records) if records is not None else []
+            except Exception as e:
+                # Lỗi của một worker không ảnh hưởng các worker khác: tạo lại trình duyệt rồi đi tiếp
+                logger.error(f"[worker {worker_id}] Lỗi khi crawl đoạn {start}-{end} (lần {attempt}/{attempts}): {e}")
+                _quit_driver(driver, logger)
+                driver = None
+                if attempt < attempts:
+                    # Đưa lại trước khi lấy đoạn tiếp theo nên luôn còn ít nhất worker này xử lý
+                    chunks.put((start, end, attempt + 1))
+                else:
+                    with lock:
+                        failed_chunks.append((start, end))
+
+        _quit_driver(driver, logger)
+        logger.info(f"[worker {worker_id}] Kết thúc")
+
+    logger.info(f"Crawl {total} sản phẩm với {num_workers} trình duyệt song song")
+    with ThreadPoolExecutor(max_workers=num_workers) as executor:
+        for future in [executor.submit(worker, i) for i in range(num_workers)]:
+            future.result()
+
+    if failed_chunks:
+        logger.warning(f"Có {len(failed_chunks)} đoạn vẫn lỗi sau {attempts} lần, chờ lượt retry: {sorted(failed_chunks)}")
+        for start, end in sorted(failed_chunks):
+            if on_failed:
+                on_failed(start, end)
+
+    merged = []
+    for start in sorted(results):
+        merged.extend(results[start])
+    return merged
+
+
+def crawl_range(start, end, crawl_range_fn, setup_driver, driver, logger=None, use_pool=True, on_failed=None):
+    """
+    Crawl đoạn [start, end): dùng pool trình duyệt nếu CRAWL_WORKERS > 1, ngược lại dùng driver chính.
+    crawl_range_fn(start, end, driver) trả về list bản ghi; on_failed(start, end) nhận đoạn (vị trí tuyệt đối)
+    mà pool vẫn không crawl được.
+    """
+    if use_pool and get_pool_size() > 1:
+        return crawl_with_pool(
+            end - start,
+            lambda chunk_start, chunk_end, worker_driver: crawl_range_fn(start + chunk_start, start + chunk_end, worker_driver),
+            setup_driver,
+            logger=logger,
+            on_failed=(lambda chunk_start, chunk_end: on_failed(start + chunk_start, start + chunk_end)) if on_failed else None
+        )
+    return crawl_range_fn(start, end, driver)
@@ -0,0 +1,127 @@
+import json
+import os
+import random
+import threading
+
+STATS_DIR = "data/state"
+# Mỗi lần ghi nhận, số liệu cũ giảm theo hệ số này để thống kê theo kịp khi site đổi cấu trúc
+DECAY = 0.99
+MIN_SAMPLES = 10
+# Đường trích xuất có tỷ lệ trúng dưới ngưỡng này chỉ được chờ trong thời gian probe ngắn
+SHORT_PROBE_BELOW = 0.3
+
+
+def get_probe_timeout(default=1.0):
+    """Thời gian chờ (giây) khi thử một đường trích xuất ít khi có, cấu hình qua CRAWL_PROBE_TIMEOUT_S"""
+    try:
+        return max(0.0, float(os.getenv("CRAWL_PROBE_TIMEOUT_S", default)))
+    except ValueError:
+        return default
+
+
+def get_explore_rate(default=0.05):
+    """Tỷ lệ trang chờ đủ timeout mặc định ở mọi đường để thống kê không bị khóa cứng, CRAWL_PATH_EXPLORE"""
+    try:
+        return min(1.0, max(0.0, float(os.getenv("CRAWL_PATH_EXPLORE", default))))
+    except ValueError:
+        return default
+
+
+class PathStats:
+    """
+    Tỷ lệ trúng của từng đường trích xuất theo (danh mục, extractor, path) của một nguồn,
+    lưu ở data/state/extraction_paths_<source>.json để dùng lại ở các lần chạy sau.
+    """
+
+    def __init__(self, source, path=None):
+        self.source = source
+        self.path = path or os.path.join(STATS_DIR, f"extraction_paths_{source}.json")
+        self.stats = {}
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, encoding="utf-8") as f:
+                    self.stats = json.load(f)
+            except (OSError, ValueError):
+                self.stats = {}
+        self._lock = threading.Lock()
+
+    def _entry(self, category, extractor, path):
+        return self.stats.setdefault(f"{category or 'all'}|{extractor}", {}).setdefault(path, [0.0, 0.0])
+
+    def record(self, category, extractor, path, hit):
+        with self._lock:
+            entry = self._entry(category, extractor, path)
+            entry[0] = entry[0] * DECAY + (1.0 if hit else 0.0)
+            entry[1] = entry[1] * DECAY + 1.0
+
+    def hit_rate(self, category, extractor, path):
+        """(tỷ lệ trúng, số mẫu đã giảm dần); chưa có mẫu thì tỷ lệ là None. Chỉ đọc, không tạo mục mới"""
+        with self._lock:
+            hits, total = self.stats.get(f"{category or 'all'}|{extractor}", {}).get(path, (0.0, 0.0))
+        return (hits / total if total else None), total
+
+    def timeout(self, category, extractor, path, full_timeout):
+        """Chờ đủ full_timeout với đường hay trúng (hoặc chưa đủ mẫu), ngược lại chỉ probe ngắn"""
+        rate, samples = self.hit_rate(category, extractor, path)
+        if samples < MIN_SAMPLES or rate >= SHORT_PROBE_BELOW or random.random() < get_explore_rate():
+            return full_timeout
+        return min(full_timeout, get_probe_timeout())
+
+    def run_paths(self, category, extractor, paths):
+        """
+        paths: list (tên, timeout mặc định, fn(timeout) -> kết quả), đường tốt nhất trước. Thử lần lượt theo
+        thứ tự đó, đường đầu tiên trả về kết quả khác rỗng thắng. Trả về (kết quả, tên đường) hoặc (None, None).
+        Thứ tự cố định vì các đường sau là bản dự phòng kém hơn (vd: giá mặc định thay cho bảng giá theo
+        biến thể); thống kê chỉ dùng để rút ngắn timeout của đường ít khi trúng.
+        """
+        for name, full_timeout, fn in paths:
+            try:
+                result = fn(self.timeout(category, extractor, name, full_timeout))
+            except Exception:
+                result = None
+            self.record(category, extractor, name, bool(result))
+            if result:
+                return result, name
+        return None, None
+
+    def save(self):
+        with self._lock:
+            data = json.dumps(self.stats, ensure_ascii=False, indent=2)
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(data)
+        os.replace(tmp_path, self.path)
+
+    def summary(self):
+        with self._lock:
+            items = sorted(self.stats.items())
+        lines = []
+        for key, paths in items:
+            rates = ", ".join(f"{path}: {hits / total:.0%}" for path, (hits, total) in paths.items() if total)
+            lines.append(f"[{self.source}] Tỷ lệ trúng {key}: {rates}")
+        return lines
+
+
+_path_stats = {}
+_path_stats_lock = threading.Lock()
+
+
+def get_path_stats(source):
+    with _path_stats_lock:
+        if source not in _path_stats:
+            _path_stats[source] = PathStats(source)
+        return _path_stats[source]
+
+
+def report_path_stats(logger):
+    """Ghi log tỷ lệ trúng và lưu thống kê xuống đĩa cho lần chạy sau"""
+    with _path_stats_lock:
+        stats = list(_path_stats.values())
+    for source_stats in stats:
+        for line in source_stats.summary():
+            logger.info(line)
+        try:
+            source_stats.save()
+        except OSError as e:
+            logger.warning(f"Không lưu được thống kê đường trích xuất {source_stats.source}: {e}")
@@ -1,104 +1,103 @@
 import time
-import pandas as pd
 from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from collections import defaultdict
 from my_logger import get_logger
+from .wait_policy import get_wait_policy
+from .listing_discovery import discover_listing, discover_listings, extract_listing_cards
+
+wait_policy = get_wait_policy("cellphones")
+
 def crawl_products_on_current_page(driver, logger, category, max_products=None):
     while True:
         try:
-            view_more = WebDriverWait(driver, 5).until(
-                EC.element_to_be_clickable((By.CSS_SELECTOR, "a.btn-show-more"))
-            )
+            view_more = wait_policy.until(driver, EC.element_to_be_clickable((By.CSS_SELECTOR, "a.btn-show-more")), 5)
             driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", view_more)
-            time.sleep(1)
+            previous_count = len(driver.find_elements(By.CSS_SELECTOR, "div.product-item"))
             driver.execute_script("arguments[0].click();", view_more)
-            time.sleep(2)
+            wait_policy.after_load_more(driver, "div.product-item", previous_count)
         except:
             break
 
     product_data = []
     try:
-        products = WebDriverWait(driver, 10).until(
-            EC.presence_of_all_elements_located((By.CSS_SELECTOR, "div.product-item"))
-        )
-        logger.info(f"Tổng số sản phẩm cho nhu cầu {category}: {len(products)}")
-        for product in products:
-            try:
-                url = product.find_element(By.CSS_SELECTOR, "a").get_attribute("href")
-                name = product.find_element(By.CSS_SELECTOR, "div.product__name h3").text.strip()
-
-                if name and url:
-                    product_data.append({"name": name, "url": url})
-            except Exception as e:
-                print("Lỗi khi lấy sản phẩm:", e)
-                continue
-
-            if max_products and len(product_data) >= max_products:
-                break
-
+        wait_policy.until(driver, EC.presence_of_element_located((By.CSS_SELECTOR, "div.product-item")), 10)
+        product_data = extract_listing_cards(driver, "cellphones", limit=max_products, item="div.product-item")
+        logger.info(f"Tổng số sản phẩm cho nhu cầu {category}: {len(product_data)}")
     except Exception as e:
         print("Lỗi khi lấy danh sách sản phẩm:", e)
 
     return product_data
 
-def crawl_needs_filter(url, driver, max_needs=5):
-    logger = get_logger()
-    try:
-        driver.get(url)
-        time.sleep(3)
-
-        # Lấy danh mục
-        category_wrapper = WebDriverWait(driver, 10).until(
-            EC.presence_of_element_located((By.CSS_SELECTOR, "div.categories-content-wrapper.is-flex"))
-        )
-        category_links = category_wrapper.find_elements(By.CSS_SELECTOR, "a")
-
-        categories = []
-        for link in category_links[:max_needs]:  # bỏ enumerate nếu không dùng index
-            url = link.get_attribute("href")
-            name = link.text.strip()
-            if url and url != "javascript:void(0)":
-                categories.append({"url": url, "name": name})
-                logger.info(f"Đã thêm nhu cầu {name}")
-
-        # Dict để tránh trùng sản phẩm
-        product_map = defaultdict(lambda: {"name": "", "url": "", "needs": set()})
-
-        for category in categories:
-            logger.info(f"Đang thu thập dữ liệu cho nhu cầu {category['name']}")
-            try:
-                driver.get(category["url"])
-                time.sleep(3)
-
-                products = crawl_products_on_current_page(driver, logger, category['name'])
-
-                for product in products:
-                    key = (product["name"], product["url"])
-                    product_map[key]["name"] = product["name"]
-                    product_map[key]["url"] = product["url"]
-                    product_map[key]["needs"].add(category["name"])  # add nhu cầu
-
-                logger.info(f"Đã thu thập dữ liệu {len(products)} sản phẩm từ {category['name']}")
-
-            except Exception as e:
-                logger.info(f"Lỗi khi crawl {category['name']}: {e}")
-                continue
-
-        # Chuyển về list và ghi file
-        final_products = []
-        for data in product_map.values():
-            final_products.append({
-                "name": data["name"],
-                "url": data["url"],
-                "needs": list(data["needs"])
-            })
-
-        df = pd.DataFrame(final_products)
-        return df
+def read_need_links(driver, logger, max_needs=5):
+    """Link các nhu cầu sử dụng trên trang danh mục đang mở"""
+    category_wrapper = wait_policy.until(
+        driver, EC.presence_of_element_located((By.CSS_SELECTOR, "div.categories-content-wrapper.is-flex")), 10
+    )
+    needs = []
+    for link in category_wrapper.find_elements(By.CSS_SELECTOR, "a")[:max_needs]:
+        url = link.get_attribute("href")
+        name = link.text.strip()
+        if url and url != "javascript:void(0)":
+            needs.append({"url": url, "name": name})
+            logger.info(f"Đã thêm nhu cầu {name}")
+    return needs
+
+
+def need_membership(products, needs, need_products):
+    """
+    Gắn nhu cầu cho từng sản phẩm của danh mục: mỗi sản phẩm giữ một bitmask (bit i = nhu cầu thứ i)
+    thay cho dict name/url/set. Sản phẩm chỉ có ở trang nhu cầu mà không có trong danh mục bị bỏ qua
+    (bước ghép cũng chỉ giữ sản phẩm của danh mục).
+    Trả về list {url, needs} của các sản phẩm có ít nhất một nhu cầu.
+    """
+    position = {product["url"]: i for i, product in enumerate(products)}
+    masks = [0] * len(products)
+    for bit, urls in enumerate(need_products):
+        for url in urls:
+            i = position.get(url)
+            if i is not None:
+                masks[i] |= 1 << bit
+
+    return [
+        {"url": products[i]["url"], "needs": [need["name"] for bit, need in enumerate(needs) if mask >> bit & 1]}
+        for i, mask in enumerate(masks) if mask
+    ]
+
+
+def harvest_needs_filter(category_url, driver, max_needs, expand_listing, setup_driver=None, logger=None):
+    """
+    Một lượt duy nhất trên trang danh mục: mở trang một lần để lấy link nhu cầu và danh sách sản phẩm
+    (phân trang HTTP hoặc expand_listing() click "Xem thêm" trên chính trang đang mở),
+    sau đó lấy các trang nhu cầu song song (HTTP, lỗi thì click trên pool trình duyệt).
+    Trả về (products, list {url, needs}).
+    """
+    logger = logger or get_logger()
+    logger.info(f"Truy cập trang danh mục: {category_url}")
+    driver.get(category_url)
+    wait_policy.after_navigation(driver)
 
+    try:
+        needs = read_need_links(driver, logger, max_needs)
     except Exception as e:
-        print(f"Lỗi nghiêm trọng: {e}")
-
+        logger.warning(f"Không lấy được danh sách nhu cầu của {category_url}: {e}")
+        needs = []
+
+    products = discover_listing("cellphones", category_url, expand_listing, logger)
+
+    def click_need(url, worker_driver):
+        name = next(need["name"] for need in needs if need["url"] == url)
+        worker_driver.get(url)
+        wait_policy.after_navigation(worker_driver)
+        return crawl_products_on_current_page(worker_driver, logger, name)
+
+    need_listings = discover_listings(
+        "cellphones", [need["url"] for need in needs], click_need, driver, setup_driver, logger
+    )
+    for need, need_products in zip(needs, need_listings):
+        logger.info(f"Đã thu thập dữ liệu {len(need_products)} sản phẩm từ {need['name']}")
+
+    filter_records = need_membership(products, needs, [{p["url"] for p in listing} for listing in need_listings])
+    logger.info(f"{len(filter_records)}/{len(products)} sản phẩm có nhu cầu sử dụng")
+    return products, filter_records
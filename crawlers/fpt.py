@@ -9,9 +9,36 @@ import pandas as pd
 import time
 import json
 import os
+import random
+import threading
+from collections import Counter
 from my_logger import get_logger
-
-def setup_driver():
+from .driver_pool import crawl_range
+from .wait_policy import get_wait_policy
+from .browser_profile import apply_profile
+from .crawl_state import CrawlStateStore, split_fresh_products, record_crawl_results, write_category_output
+from .price_refresh import refresh_category_prices
+from .fpt_nextdata import extract_variant_prices
+from .checkpoint import SourceCheckpoint, prepare_category, crawl_with_checkpoint
+from .listing_discovery import discover_listing, extract_listing_cards, LISTING_SOURCES
+from .page_archive import archive_driver_page
+from .rate_limit import throttled_get, report_limits
+from .driver_lifecycle import ManagedDriver, report_lifecycle
+from .record_writer import streaming, stream_record
+from .variant_groups import crawl_with_variant_groups
+from .extraction_paths import get_path_stats, report_path_stats
+from .retry_queue import retry_pending
+from .time_budget import TimeBudget, prioritize, keep_unfinished
+
+wait_policy = get_wait_policy("fpt")
+path_stats = get_path_stats("fpt")
+
+price_path_stats = Counter()
+price_path_lock = threading.Lock()
+
+PRODUCT_CARD_SELECTOR = LISTING_SOURCES["fpt"]["item"]
+
+def launch_driver():
     options = Options()
     options.add_argument('--headless')
     options.add_argument('--no-sandbox')
@@ -23,18 +50,25 @@ def setup_driver():
 
     driver = webdriver.Chrome(options=options)
 
-    return driver
+    return apply_profile(driver, "fpt")
+
+
+def setup_driver():
+    """Trình duyệt tự tạo lại sau CRAWL_RECYCLE_PAGES trang hoặc khi vượt ngưỡng RSS"""
+    return ManagedDriver(launch_driver, "fpt")
 
 def crawl_products_on_current_page(driver, logger, max_products=None):
     while True:
         try:
-            view_more_button = WebDriverWait(driver, 10).until(
-                EC.element_to_be_clickable((By.CSS_SELECTOR, "button.Button_root__LQsbl.Button_btnSmall__aXxTy.Button_whitePrimary__nkoMI.Button_btnIconRight__4VSUO.border.border-iconDividerOnWhite.px-4.py-2"))
+            view_more_button = wait_policy.until(
+                driver,
+                EC.element_to_be_clickable((By.CSS_SELECTOR, "button.Button_root__LQsbl.Button_btnSmall__aXxTy.Button_whitePrimary__nkoMI.Button_btnIconRight__4VSUO.border.border-iconDividerOnWhite.px-4.py-2")),
+                10
             )
             driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", view_more_button)
-            time.sleep(1)
+            previous_count = len(driver.find_elements(By.CSS_SELECTOR, PRODUCT_CARD_SELECTOR))
             driver.execute_script("arguments[0].click();", view_more_button)
-            time.sleep(2)
+            wait_policy.after_load_more(driver, PRODUCT_CARD_SELECTOR, previous_count)
             show_more_btn_text = view_more_button.text.strip()
             print(f"Còn: {show_more_btn_text}")
         except Exception as e:
@@ -43,50 +77,40 @@ def crawl_products_on_current_page(driver, logger, max_products=None):
 
     product_data = []
     try:
-        container = WebDriverWait(driver, 10).until(
-            EC.presence_of_element_located((By.CSS_SELECTOR, "div.grid.grid-cols-2.gap-2.md\\:grid-cols-4"))
+        wait_policy.until(
+            driver, EC.presence_of_element_located((By.CSS_SELECTOR, LISTING_SOURCES["fpt"]["container"])), 10
         )
-        products = container.find_elements(By.CSS_SELECTOR, "div.group.flex.h-full.flex-col.justify-between.ProductCard_brandCard__VQQT8.ProductCard_cardDefault__km9c5")
-        logger.info(f"Tổng số sản phẩm trong danh sách {len(products)}")
-        for product in products:
-            try:
-                url_element = product.find_element(By.CSS_SELECTOR, "a")
-                url = url_element.get_attribute("href")
-                name_element = product.find_element(By.CSS_SELECTOR, "h3.ProductCard_cardTitle__HlwIo")
-                name = name_element.text.strip()
-                if url and name:
-                    product_data.append({
-                        "name": name,
-                        "url": url,
-                    })
-            except Exception as e:
-                logger.error(f"Lỗi khi lấy thông tin sản phẩm: {str(e)}")
-                continue
-
-            if max_products and len(product_data) >= max_products:
-                break
+        product_data = extract_listing_cards(driver, "fpt", limit=max_products)
+        logger.info(f"Tổng số sản phẩm trong danh sách {len(product_data)}")
     except Exception as e:
         logger.error(f"Lỗi khi lấy danh sách sản phẩm: {str(e)}")
 
     return product_data
 
-def get_colors_and_prices(driver, logger):
+PRICE_SELECTOR = "span.text-black-opacity-100.h4-bold"
+
+def get_colors_and_prices(driver, logger, category=None):
     prices = []
     try:
-        color_buttons = WebDriverWait(driver, 10).until(
-            EC.presence_of_all_elements_located((By.CSS_SELECTOR, "button.Selection_button__vX7ZX.Selection_horizontalContainer__r4oCB"))
+        # Sản phẩm không có nút chọn màu thì không phải chờ đủ 10s nếu danh mục hiếm khi có nút
+        color_buttons = wait_policy.until(
+            driver, EC.presence_of_all_elements_located((By.CSS_SELECTOR, "button.Selection_button__vX7ZX.Selection_horizontalContainer__r4oCB")),
+            path_stats.timeout(category, "prices", "color_buttons", 10)
         )
+        path_stats.record(category, "prices", "color_buttons", True)
 
         for btn in color_buttons:
             try:
                 color_name = btn.text.strip()
+                previous_price = "".join(e.text.strip() for e in driver.find_elements(By.CSS_SELECTOR, PRICE_SELECTOR)[:1])
                 driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", btn)
-                time.sleep(1)
                 btn.click()
-                time.sleep(4)
+                # Chờ giá đổi khỏi giá của màu trước (hoặc nút được chọn nếu hai màu cùng giá),
+                # DOM yên lặng chưa chắc giá đã render lại
+                wait_policy.after_select(driver, btn, PRICE_SELECTOR, previous_price, fixed=5)
 
-                price_element = WebDriverWait(driver, 10).until(
-                    EC.visibility_of_element_located((By.CSS_SELECTOR, "span.text-black-opacity-100.h4-bold"))
+                price_element = wait_policy.until(
+                    driver, EC.visibility_of_element_located((By.CSS_SELECTOR, PRICE_SELECTOR)), 10
                 )
                 price_text = price_element.text.replace(".", "").replace("₫", "").strip()
                 price = int(price_text) if price_text.isdigit() else None
@@ -100,24 +124,65 @@ def get_colors_and_prices(driver, logger):
                 logger.error(f"Không lấy được giá cho màu {btn.text.strip()}: {str(e)}")
                 continue
     except Exception as e:
+        path_stats.record(category, "prices", "color_buttons", False)
         print(f"Không tìm thấy màu hoặc giá")
     return prices
 
+def get_prices(driver, logger, product_name="", category=None):
+    """
+    Ưu tiên đọc giá mọi màu từ dữ liệu Next.js nhúng trong trang (không cần click),
+    không có thì dùng cách click từng nút màu. Trả về (prices, path) với path là 'embedded' hoặc 'click'.
+    """
+    prices = []
+    try:
+        prices = extract_variant_prices(driver.page_source, driver.current_url)
+    except Exception as e:
+        logger.debug(f"Không đọc được dữ liệu Next.js: {e}")
+
+    path = "embedded"
+    if prices and random.random() < get_verify_rate():
+        # Kiểm chứng ngẫu nhiên với cách click để phát hiện khi cấu trúc dữ liệu nhúng thay đổi
+        clicked = get_colors_and_prices(driver, logger, category)
+        if sorted(p["price"] for p in clicked) != sorted(p["price"] for p in prices):
+            logger.warning(f"Giá nhúng khác giá click ở sản phẩm {product_name}: {prices} / {clicked}, dùng giá click")
+            prices, path = clicked, "click"
+    elif not prices:
+        prices, path = get_colors_and_prices(driver, logger, category), "click"
+
+    with price_path_lock:
+        price_path_stats[path] += 1
+    logger.info(f"Lấy giá sản phẩm {product_name} bằng cách: {path}")
+    return prices, path
+
+def get_verify_rate():
+    try:
+        return float(os.getenv("FPT_PRICE_VERIFY_RATE", "0.05"))
+    except ValueError:
+        return 0.05
+
+def report_price_paths(logger):
+    with price_path_lock:
+        summary = ", ".join(f"{path}: {count}" for path, count in price_path_stats.items())
+        price_path_stats.clear()
+    if summary:
+        logger.info(f"Thống kê cách lấy giá FPT: {summary}")
+
 def get_specifications(driver, logger):
     specs = {}
     try:
         # Click the "Xem cấu hình chi tiết" button to open the modal
-        spec_button = WebDriverWait(driver, 10).until(
-            EC.element_to_be_clickable((By.CSS_SELECTOR, "button.Button_root__LQsbl.Button_btnMedium___hdAA.Button_redSecondary___XGMX.h-8.w-\\[182px\\]"))
+        spec_button = wait_policy.until(
+            driver,
+            EC.element_to_be_clickable((By.CSS_SELECTOR, "button.Button_root__LQsbl.Button_btnMedium___hdAA.Button_redSecondary___XGMX.h-8.w-\\[182px\\]")),
+            10
         )
         driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", spec_button)
-        time.sleep(3)
         spec_button.click()
 
 
         # Wait for modal to load
-        modal_rows = WebDriverWait(driver, 10).until(
-            EC.presence_of_all_elements_located((By.CSS_SELECTOR, "div.flex.gap-2.border-b.border-dashed.border-b-iconDividerOnWhite.py-1\\.5"))
+        modal_rows = wait_policy.until(
+            driver, EC.presence_of_all_elements_located((By.CSS_SELECTOR, "div.flex.gap-2.border-b.border-dashed.border-b-iconDividerOnWhite.py-1\\.5")), 10
         )
 
         for row in modal_rows:
@@ -147,8 +212,7 @@ def get_specifications(driver, logger):
 def scrape_faq_answers(driver):
     answers = []
     try:
-        wait = WebDriverWait(driver, 10)
-        script_tags = wait.until(EC.presence_of_all_elements_located((By.CSS_SELECTOR, 'script[type="application/ld+json"]')))
+        script_tags = wait_policy.until(driver, EC.presence_of_all_elements_located((By.CSS_SELECTOR, 'script[type="application/ld+json"]')), 10)
 
         scripts = driver.find_elements(By.CSS_SELECTOR, 'script[type="application/ld+json"]')
         for i, tag in enumerate(script_tags):
@@ -260,7 +324,79 @@ def extract_brand(product_name, category):
         return "Unknown"
 
 
+def crawl_selected_range(start, end, products, category_name, driver, logger):
+    all_data = []
+
+    for index, product in enumerate(products[start:end], start):
+        logger.info(f"Thu thập dữ liệu sản phẩm ({index + 1}/{len(products)}): {product['name']}")
+        product_url = product["url"]
+
+        try:
+            throttled_get(driver, product_url)
+            wait_policy.after_navigation(driver)
+        except TimeoutException as te:
+            logger.warning(f"Timeout khi truy cập sản phẩm: {product_url}: {te}")
+            continue
+        except WebDriverException as wde:
+            logger.warning(f"Lỗi trình duyệt khi mở sản phẩm: {product_url}: {wde}")
+            continue
+        except Exception as e:
+            logger.warning(f"Lỗi không xác định khi mở sản phẩm: {product_url}: {e}")
+            continue
+
+        archive_driver_page(driver, product_url, "fpt", logger=logger)
+        try:
+            prices, _ = get_prices(driver, logger, product["name"], category_name)
+            specs = get_specifications(driver, logger)
+            brand = extract_brand(product["name"], category_name)
+
+            data_entry = {
+                "name": product["name"],
+                "url": product_url,
+                "brand": brand,
+                "prices": prices,
+                "specifications": specs,
+            }
+            all_data.append(data_entry)
+            stream_record("fpt", data_entry)
+
+            # Kiểm tra thiếu mục nào
+            missing_fields = []
+            if not prices:
+                missing_fields.append("prices")
+            if not specs:
+                missing_fields.append("specifications")
+            if not brand:
+                missing_fields.append("brand")
+
+            if missing_fields:
+                logger.warning(f"Thiếu {', '.join(missing_fields)} ở sản phẩm: {product['name']}")
+
+        except Exception as e:
+            logger.error(f"Lỗi khi xử lý dữ liệu sản phẩm {product['name']}: {e}")
+            continue
+
+        finally:
+            logger.info(f"Đã thu thập chi tiết sản phẩm {product['name']}")
+
+    return all_data
+
+def crawl_prices_range(start, end, products, driver, logger):
+    """Chế độ --prices-only: chỉ lấy giá theo màu cho các sản phẩm đã có"""
+    updates = []
+    for product in products[start:end]:
+        try:
+            throttled_get(driver, product["url"])
+            wait_policy.after_navigation(driver)
+        except Exception as e:
+            logger.warning(f"Lỗi khi mở sản phẩm: {product['url']}: {e}")
+            continue
+        archive_driver_page(driver, product["url"], "fpt", logger=logger)
+        prices, _ = get_prices(driver, logger, product["name"])
+        updates.append({"url": product["url"], "prices": prices})
+    return updates
 
+REQUIRED_FIELDS = ["prices", "specifications", "brand"]
 
 categories = [
     # {"name": "điện thoại", "url": "https://fptshop.com.vn/dien-thoai", "name_file": "phone.csv"},
@@ -270,28 +406,88 @@ categories = [
     # {"name": "pc", "url": "https://fptshop.com.vn/may-tinh-de-ban", "name_file": "pc.csv"}
 ]
 
-def crawl():
-    output_dir = "data/raw/fpt/"
-    os.makedirs(output_dir, exist_ok=True)
+def category_key(category):
+    return category["name_file"].replace(".csv", "")
+
+def output_path(category):
+    return os.path.join("data/raw/fpt/", category["name_file"])
+
+def discover_products(category, driver, logger):
+    """Danh sách sản phẩm (name, url) của một danh mục, trả về (df_products, dữ liệu phụ)"""
+    def click_discover():
+        logger.info(f"Truy cập trang danh mục: {category['name']} - URL: {category['url']}")
+        driver.get(category["url"])
+        wait_policy.after_navigation(driver)
+        return crawl_products_on_current_page(driver, logger)
+
+    products = discover_listing("fpt", category["url"], click_discover, logger)
+    return pd.DataFrame(products, columns=["name", "url"]), {}
+
+def uses_driver_pool():
+    return True
+
+def crawl_details(start, end, df_to_crawl, category, driver, logger):
+    """Crawl chi tiết các sản phẩm [start, end) của df_to_crawl, trả về list bản ghi"""
+    return crawl_selected_range(start, end, df_to_crawl.to_dict("records"), category["name"], driver, logger)
+
+def build_output(df_products, records, extra):
+    return pd.DataFrame(records)
+
+def reextract(row, category, archive):
+    """
+    Trích xuất lại brand và giá (từ dữ liệu Next.js nhúng) từ HTML đã lưu trong kho.
+    Thông số kỹ thuật chỉ hiện sau khi click nên không trích xuất lại được từ HTML.
+    """
+    html = archive.latest(row["url"])
+    if html is None:
+        return None
+    result = {"brand": extract_brand(row["name"], category["name"])}
+    prices = extract_variant_prices(html, row["url"])
+    if prices:
+        result["prices"] = prices
+    return result
+
+def crawl(resume=False):
+    os.makedirs("data/raw/fpt/", exist_ok=True)
     logger = get_logger()
     logger.info("Khởi tạo trình duyệt và bắt đầu quá trình thu thập")
     driver = setup_driver()
+    wait_policy.start()
+    store = CrawlStateStore()
+    run_checkpoint = SourceCheckpoint("fpt")
+    budget = TimeBudget("fpt")
+    run_checkpoint.start(resume)
 
     try:
         for category in categories:
             category_name = category["name"]
-            url = category['url']
-            filename = category['name_file']
 
-            if not url or not filename:
+            if not category['url'] or not category['name_file']:
                 logger.info(f"Không tìm thấy URL hoặc tên file cho danh mục {category_name}")
                 continue
 
-            logger.info(f"Truy cập trang danh mục: {category_name} - URL: {url}")
+            key = category_key(category)
+            if resume and run_checkpoint.is_completed(key):
+                logger.info(f"Danh mục {category_name} đã hoàn thành ở lần chạy trước, bỏ qua")
+                continue
+
+            out_path = output_path(category)
+            if not budget.start_category():
+                logger.info(f"Hết thời gian crawl, bỏ qua danh mục {category_name}, giữ dữ liệu cũ")
+                continue
+
+            category_checkpoint = run_checkpoint.category(key)
+
+            def discover():
+                df_products, extra = discover_products(category, driver, logger)
+                df_to_crawl, reused = split_fresh_products(store, df_products, out_path, logger)
+                if budget.active:
+                    # Có hạn chót: URL mới trước, rồi giá cũ nhất, cuối cùng sản phẩm lỗi / thiếu trường lần trước
+                    df_to_crawl = prioritize(store, df_to_crawl)
+                return df_products, df_to_crawl, reused, extra
 
             try:
-                driver.get(url)
-                time.sleep(3)
+                df_products, df_to_crawl, reused, extra = prepare_category(category_checkpoint, resume, discover, logger)
             except TimeoutException as te:
                 logger.warning(f"Timeout khi truy cập trang danh mục {category_name}: {te}")
                 continue
@@ -302,62 +498,53 @@ def crawl():
                 logger.warning(f"Lỗi không xác định khi mở trang danh mục {category_name}: {e}")
                 continue
 
-            products = crawl_products_on_current_page(driver, logger)
-            all_data = []
-
-            for index, product in enumerate(products):
-                logger.info(f"Thu thập dữ liệu sản phẩm ({index + 1}/{len(products)}): {product['name']}")
-                product_url = product["url"]
-
-                try:
-                    driver.get(product_url)
-                    time.sleep(3)
-                except TimeoutException as te:
-                    logger.warning(f"Timeout khi truy cập sản phẩm: {product_url}: {te}")
-                    continue
-                except WebDriverException as wde:
-                    logger.warning(f"Lỗi trình duyệt khi mở sản phẩm: {product_url}: {wde}")
-                    continue
-                except Exception as e:
-                    logger.warning(f"Lỗi không xác định khi mở sản phẩm: {product_url}: {e}")
-                    continue
-
-                try:
-                    prices = get_colors_and_prices(driver, logger)
-                    specs = get_specifications(driver, logger)
-                    brand = extract_brand(product["name"], category_name)
-
-                    data_entry = {
-                        "name": product["name"],
-                        "url": product_url,
-                        "brand": brand,
-                        "prices": prices,
-                        "specifications": specs,
-                    }
-                    all_data.append(data_entry)
-
-                    # Kiểm tra thiếu mục nào
-                    missing_fields = []
-                    if not prices:
-                        missing_fields.append("prices")
-                    if not specs:
-                        missing_fields.append("specifications")
-                    if not brand:
-                        missing_fields.append("brand")
-
-                    if missing_fields:
-                        logger.warning(f"Thiếu {', '.join(missing_fields)} ở sản phẩm: {product['name']}")
-
-                except Exception as e:
-                    logger.error(f"Lỗi khi xử lý dữ liệu sản phẩm {product['name']}: {e}")
-                    continue
-
-                finally:
-                    logger.info(f"Đã thu thập chi tiết sản phẩm {product['name']}")
-
-            out_path = os.path.join(output_dir, filename)
-            df = pd.DataFrame(all_data)
-            df.to_csv(out_path, index=False)
+            with streaming("fpt", key, append=resume, logger=logger) as writer:
+                def crawl_rows(df_rows):
+                    return crawl_range(
+                        0, len(df_rows),
+                        lambda s, e, worker_driver: crawl_details(s, e, df_rows, category, worker_driver, logger),
+                        setup_driver, driver, logger
+                    )
+
+                def on_records(df_rows, rows_records):
+                    record_crawl_results(store, "fpt", key, df_rows, rows_records, REQUIRED_FIELDS, logger)
+
+                # Mỗi nhóm biến thể màu / dung lượng chỉ crawl một trang đại diện (có checkpoint), sau đó nhân bản ghi.
+                # Bản ghi đầy đủ nằm trong chunk checkpoint và file stream, ở đây chỉ giữ bản tóm tắt
+                summaries = crawl_with_variant_groups(
+                    "fpt", df_to_crawl,
+                    lambda df_representatives: crawl_with_checkpoint(
+                        category_checkpoint,
+                        len(df_representatives),
+                        lambda start, end: crawl_range(
+                            start, end,
+                            lambda s, e, worker_driver: crawl_details(s, e, df_representatives, category, worker_driver, logger),
+                            setup_driver, driver, logger
+                        ),
+                        logger,
+                        on_chunk=lambda start, end, records: record_crawl_results(
+                            store, "fpt", key, df_representatives.iloc[start:end], records, REQUIRED_FIELDS, logger
+                        ),
+                        budget=budget
+                    ),
+                    crawl_rows,
+                    on_records,
+                    logger,
+                    budget=budget
+                )
+                summaries = retry_pending(df_to_crawl, summaries, REQUIRED_FIELDS, crawl_rows, logger, budget=budget, on_records=on_records)
+
+                if budget.exhausted:
+                    reused = keep_unfinished(df_products, reused, summaries, out_path, logger)
+                writer.close()
+                write_category_output(
+                    out_path, df_products, reused, category_checkpoint.chunk_paths() + [writer.path],
+                    build_output, extra, REQUIRED_FIELDS, logger
+                )
+
+            # Hết thời gian giữa chừng thì giữ checkpoint để --resume crawl tiếp phần còn lại
+            if not budget.exhausted:
+                run_checkpoint.mark_completed(key)
             logger.info(f"Đã lưu dữ liệu danh mục {category_name} vào {out_path}")
 
     except Exception as e:
@@ -365,4 +552,36 @@ def crawl():
 
     finally:
         driver.quit()
+        store.close()
+        wait_policy.report(logger)
+        report_price_paths(logger)
+        report_limits(logger)
+        report_lifecycle(logger)
+        report_path_stats(logger)
+        budget.report(logger)
+
+def crawl_prices():
+    output_dir = "data/raw/fpt/"
+    logger = get_logger()
+    logger.info("Khởi tạo trình duyệt và bắt đầu cập nhật giá FPT")
+    driver = setup_driver()
+    wait_policy.start()
+    store = CrawlStateStore()
 
+    try:
+        for category in categories:
+            refresh_category_prices(
+                "fpt", category["name_file"].replace(".csv", ""), os.path.join(output_dir, category["name_file"]),
+                lambda start, end, rows, worker_driver: crawl_prices_range(start, end, rows, worker_driver, logger),
+                setup_driver, driver, store, logger
+            )
+    except Exception as e:
+        logger.error(f"Lỗi tổng quát trong quá trình cập nhật giá: {str(e)}")
+    finally:
+        driver.quit()
+        store.close()
+        wait_policy.report(logger)
+        report_price_paths(logger)
+        report_limits(logger)
+        report_lifecycle(logger)
+        report_path_stats(logger)
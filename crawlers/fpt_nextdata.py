@@ -0,0 +1,163 @@
+import json
+import re
+from collections import deque
+from urllib.parse import urlsplit
+
+from lxml import html as lxml_html
+
+# Key thường gặp cho giá bán hiện tại (ưu tiên theo thứ tự) và tên màu trong dữ liệu sản phẩm.
+# Chỉ nhận key màu thật sự: list có name / value (sản phẩm liên quan, thông số, ...) không phải list biến thể.
+PRICE_KEYS = ["currentPrice", "finalPrice", "priceAfterDiscount", "sellingPrice", "price"]
+COLOR_KEYS = ["colorName", "color", "colour", "colorDisplayName"]
+# Key định danh sản phẩm theo slug / URL: node nào có key này trỏ tới slug của trang là node của chính sản phẩm
+IDENTITY_KEYS = ["slug", "url", "urlPath", "canonical", "link"]
+
+FLIGHT_LINE = re.compile(r"^[0-9a-zA-Z]+:(.*)$")
+
+
+def _flight_chunks(tree):
+    """Các đoạn RSC payload `self.__next_f.push([1, "..."])` của Next.js App Router"""
+    chunks = []
+    for script in tree.xpath("//script[not(@src)]"):
+        text = script.text or ""
+        for match in re.finditer(r"self\.__next_f\.push\(\[1,\s*(\".*?(?<!\\)\")\]\)", text, re.DOTALL):
+            try:
+                chunks.append(json.loads(match.group(1)))
+            except ValueError:
+                continue
+    return chunks
+
+
+def extract_next_payloads(html):
+    """Trả về list các object JSON nhúng trong trang Next.js (__NEXT_DATA__ hoặc RSC flight data)"""
+    tree = lxml_html.fromstring(html)
+    payloads = []
+
+    for script in tree.xpath('//script[@id="__NEXT_DATA__"]'):
+        try:
+            payloads.append(json.loads(script.text or ""))
+        except ValueError:
+            continue
+
+    for line in "".join(_flight_chunks(tree)).split("\n"):
+        match = FLIGHT_LINE.match(line)
+        if not match or not match.group(1)[:1] in "[{":
+            continue
+        try:
+            payloads.append(json.loads(match.group(1)))
+        except ValueError:
+            continue
+
+    return payloads
+
+
+def _first_key(item, keys):
+    for key in keys:
+        if key in item:
+            return key
+    return None
+
+
+def product_slug(url):
+    """Slug sản phẩm từ URL fptshop: phần cuối của path, chữ thường"""
+    return urlsplit(url or "").path.rstrip("/").rsplit("/", 1)[-1].lower()
+
+
+def _identities(node):
+    """Các slug định danh của một dict (giá trị của IDENTITY_KEYS rút về phần cuối path)"""
+    values = []
+    for key in IDENTITY_KEYS:
+        value = node.get(key)
+        if isinstance(value, str) and value.strip():
+            values.append(product_slug(value.strip()))
+    return values
+
+
+def _is_foreign(node, slug):
+    """Node là sản phẩm khác (có định danh nhưng không phải slug này hay biến thể của nó)"""
+    identities = _identities(node)
+    return bool(identities) and not any(identity == slug or identity.startswith(f"{slug}-") for identity in identities)
+
+
+def _color_of(item):
+    key = _first_key(item, COLOR_KEYS)
+    if key is None:
+        return None
+    value = item[key]
+    if isinstance(value, dict):
+        value = value.get("name") or value.get("displayName") or value.get("value")
+    return value.strip() if isinstance(value, str) and value.strip() else None
+
+
+def _price_of(item):
+    for key in PRICE_KEYS:
+        value = item.get(key)
+        if isinstance(value, (int, float)) and not isinstance(value, bool) and value > 0:
+            return int(value)
+    return None
+
+
+def _product_nodes(node, slug):
+    """Các dict có định danh trùng slug của trang (node dữ liệu của chính sản phẩm)"""
+    stack = [node]
+    while stack:
+        current = stack.pop()
+        if isinstance(current, dict):
+            if slug in _identities(current):
+                yield current
+            stack.extend(current.values())
+        elif isinstance(current, list):
+            stack.extend(current)
+
+
+def _variant_lists(node, slug):
+    """
+    Duyệt theo chiều rộng bên trong node sản phẩm, trả về các list dict mà mọi phần tử đều có màu và giá.
+    Không đi vào node của sản phẩm khác (sản phẩm liên quan, phụ kiện, ...).
+    """
+    queue = deque([node])
+    while queue:
+        current = queue.popleft()
+        if isinstance(current, dict):
+            queue.extend(value for value in current.values() if not (isinstance(value, dict) and _is_foreign(value, slug)))
+        elif isinstance(current, list):
+            items = [item for item in current if isinstance(item, dict)]
+            if items and len(items) == len(current) and not any(_is_foreign(item, slug) for item in items):
+                if all(_color_of(item) and _price_of(item) for item in items):
+                    yield current
+                    continue
+            queue.extend(item for item in current if not (isinstance(item, dict) and _is_foreign(item, slug)))
+
+
+def find_variant_prices(payloads, url):
+    """
+    Tìm list biến thể màu bên trong node dữ liệu của chính sản phẩm (khớp slug của url), gần node nhất trước.
+    Trả về [{"color", "price"}] hoặc [] nếu không chắc chắn (khi đó nơi gọi sẽ click từng nút màu).
+    """
+    slug = product_slug(url)
+    if not slug:
+        return []
+
+    best = None
+    for payload in payloads:
+        for product in _product_nodes(payload, slug):
+            best = next(_variant_lists(product, slug), None)
+            if best:
+                break
+        if best:
+            break
+
+    if not best:
+        return []
+
+    prices, seen = [], set()
+    for item in best:
+        entry = (_color_of(item), _price_of(item))
+        if entry not in seen:
+            seen.add(entry)
+            prices.append({"color": entry[0], "price": entry[1]})
+    return prices
+
+
+def extract_variant_prices(html, url):
+    return find_variant_prices(extract_next_payloads(html), url)
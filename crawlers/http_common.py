@@ -0,0 +1,12 @@
+# Hằng số dùng chung cho các module tải trang bằng HTTP. Module lá: không import crawler nào,
+# để listing_discovery / tgdd_http / ... dùng chung mà không tạo vòng import giữa các crawler.
+
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+
+HEADERS = {
+    "User-Agent": USER_AGENT,
+    "Accept-Language": "vi-VN,vi;q=0.9,en;q=0.8",
+}
+
+# Mã HTTP coi là bị chặn / quá tải
+BLOCK_STATUS_CODES = {403, 429, 503}
@@ -0,0 +1,291 @@
+import asyncio
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin, urlsplit, urlencode, parse_qsl, urlunsplit
+
+import httpx
+from bs4 import BeautifulSoup
+
+from my_logger import get_logger
+from .http_common import HEADERS, BLOCK_STATUS_CODES
+from .driver_pool import crawl_range
+from .page_archive import archive_page
+from .rate_limit import throttled_async
+
+REPORT_DIR = "data/discovery"
+
+# Tham số phân trang và selector thẻ sản phẩm của trang danh mục từng nguồn, dùng chung cho
+# phân trang HTTP (HTML server-render) và trích xuất trong trình duyệt sau vòng lặp "Xem thêm".
+# price / badge là tùy chọn: thẻ không có thì để None. container chỉ áp dụng trong trình duyệt.
+LISTING_SOURCES = {
+    "tgdd": {
+        "page_param": "page",
+        "item": "ul.listproduct li.item",
+        "link": "a.main-contain",
+        "name_attr": "data-name",
+        "price": "strong.price",
+        "badge": "p.result-label",
+    },
+    "cellphones": {
+        "page_param": "p",
+        "item": "div.product-info-container.product-item",
+        "link": "a",
+        "name": "div.product__name h3",
+        "price": "p.product__price--show",
+        "badge": "div.product__badge",
+    },
+    "fpt": {
+        "page_param": "page",
+        "container": "div.grid.grid-cols-2.gap-2.md\\:grid-cols-4",
+        "item": "div.group.flex.h-full.flex-col.justify-between.ProductCard_brandCard__VQQT8.ProductCard_cardDefault__km9c5",
+        "link": "a",
+        "name": "h3.ProductCard_cardTitle__HlwIo",
+        "price": "p.Price_currentPrice__PBYcv",
+        "badge": "span.ProductCard_badge__Vl0lE",
+    },
+}
+
+# Lấy toàn bộ thẻ sản phẩm của trang đang mở trong một lần execute_script
+LISTING_CARDS_JS = """
+const config = arguments[0], limit = arguments[1];
+const text = (root, selector) => {
+    const el = selector ? root.querySelector(selector) : null;
+    return el ? el.textContent.trim() || null : null;
+};
+const root = (config.container && document.querySelector(config.container)) || document;
+const cards = [];
+for (const item of root.querySelectorAll(config.item)) {
+    const link = item.querySelector(config.link);
+    if (!link || !link.href) continue;
+    const name = config.name_attr ? (link.getAttribute(config.name_attr) || "").trim() : (text(item, config.name) || "");
+    if (!name) continue;
+    cards.push({name: name, url: link.href, price: text(item, config.price), badge: text(item, config.badge)});
+    if (limit && cards.length >= limit) break;
+}
+return cards;
+"""
+
+
+def get_listing_mode():
+    """
+    Cách lấy danh sách sản phẩm, cấu hình qua CRAWL_LISTING_MODE:
+    'http' (mặc định, lỗi thì quay về click "Xem thêm"), 'click' (chỉ click) hoặc 'compare' (chạy cả hai, dùng kết quả click)
+    """
+    return os.getenv("CRAWL_LISTING_MODE", "http").lower()
+
+
+def get_concurrency(default=6):
+    try:
+        return max(1, int(os.getenv("CRAWL_LISTING_CONCURRENCY", default)))
+    except ValueError:
+        return default
+
+
+def page_url(category_url, page_param, page):
+    parts = urlsplit(category_url)
+    query = [(key, value) for key, value in parse_qsl(parts.query) if key != page_param]
+    if page > 1:
+        query.append((page_param, str(page)))
+    return urlunsplit((parts.scheme, parts.netloc, parts.path, urlencode(query), ""))
+
+
+def _select_text(item, selector):
+    elem = item.select_one(selector) if selector else None
+    return (elem.get_text(strip=True) or None) if elem else None
+
+
+def parse_listing_page(html, base_url, config):
+    """Các sản phẩm {"name", "url", "price", "badge"} trong một trang danh mục, cùng selector với extract_listing_cards"""
+    soup = BeautifulSoup(html, "html.parser")
+    products = []
+    for item in soup.select(config["item"]):
+        link = item.select_one(config["link"])
+        if not link or not link.get("href"):
+            continue
+        if "name_attr" in config:
+            name = (link.get(config["name_attr"]) or "").strip()
+        else:
+            name_elem = item.select_one(config["name"])
+            name = name_elem.get_text(strip=True) if name_elem else ""
+        if name:
+            products.append({
+                "name": name,
+                "url": urljoin(base_url, link["href"]),
+                "price": _select_text(item, config.get("price")),
+                "badge": _select_text(item, config.get("badge")),
+            })
+    return products
+
+
+def extract_listing_cards(driver, source, limit=None, item=None):
+    """
+    Mọi thẻ sản phẩm {"name", "url", "price", "badge"} của trang danh mục đang mở qua một lần execute_script
+    (thay cho find_element / get_attribute / .text trên từng thẻ). item thay selector thẻ mặc định của nguồn.
+    """
+    config = dict(LISTING_SOURCES[source])
+    if item:
+        config["item"] = item
+    return driver.execute_script(LISTING_CARDS_JS, config, limit or 0) or []
+
+
+def _is_not_found(error):
+    return isinstance(error, httpx.HTTPStatusError) and error.response.status_code == 404
+
+
+async def _fetch_page(client, url, attempts=3, backoff=1.0):
+    """Tải một trang danh mục, thử lại lỗi mạng / 5xx / bị chặn sau backoff, 2*backoff... giây (404 không thử lại)"""
+    for attempt in range(1, attempts + 1):
+        try:
+            async with throttled_async(url) as outcome:
+                response = await client.get(url)
+                outcome["blocked"] = response.status_code in BLOCK_STATUS_CODES
+                response.raise_for_status()
+            return response.text
+        except httpx.HTTPError as e:
+            if attempt == attempts or _is_not_found(e):
+                raise
+        await asyncio.sleep(backoff * attempt)
+
+
+async def fetch_listing_pages(source, category_url, config, logger, concurrency=6, max_pages=200, timeout=20):
+    """
+    Tải các trang 1, 2, 3... song song theo từng đợt `concurrency` trang.
+    Dừng khi một trang không có sản phẩm, trả về 404 hoặc cả đợt không thêm URL mới (trang vượt quá trang cuối
+    thường lặp lại trang cuối).
+    Trả về (products, số trang có sản phẩm mới); một trang vẫn lỗi sau khi thử lại thì danh sách bị cụt nên số trang
+    là 0 để nơi gọi quay về vòng lặp click.
+    """
+    products, seen = [], set()
+    pages_with_new = 0
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(headers=HEADERS, limits=limits, timeout=timeout, follow_redirects=True) as client:
+        for first_page in range(1, max_pages + 1, concurrency):
+            pages = list(range(first_page, min(first_page + concurrency, max_pages + 1)))
+            urls = [page_url(category_url, config["page_param"], page) for page in pages]
+            htmls = await asyncio.gather(*(_fetch_page(client, url) for url in urls), return_exceptions=True)
+
+            finished = False
+            new_in_wave = 0
+            for page, url, html in zip(pages, urls, htmls):
+                if isinstance(html, Exception):
+                    if page > 1 and _is_not_found(html):
+                        finished = True
+                        break
+                    logger.warning(f"Lỗi HTTP khi tải trang danh mục {url}, bỏ kết quả phân trang: {html}")
+                    return products, 0
+                archive_page(url, source, "listing", html, logger)
+                page_products = parse_listing_page(html, url, config)
+                new_products = [p for p in page_products if p["url"] not in seen]
+                if not new_products:
+                    finished = True
+                    break
+                seen.update(p["url"] for p in new_products)
+                products.extend(new_products)
+                pages_with_new += 1
+                new_in_wave += len(new_products)
+
+            if finished or not new_in_wave:
+                break
+
+    return products, pages_with_new
+
+
+def url_diff(http_products, click_products):
+    http_urls = {p["url"] for p in http_products}
+    click_urls = {p["url"] for p in click_products}
+    return {
+        "http": len(http_urls),
+        "click": len(click_urls),
+        "both": len(http_urls & click_urls),
+        "only_http": sorted(http_urls - click_urls),
+        "only_click": sorted(click_urls - http_urls),
+    }
+
+
+def report_diff(source, category_url, http_products, click_products, logger):
+    """Ghi lại chênh lệch URL giữa hai cách lấy danh sách vào data/discovery/"""
+    diff = url_diff(http_products, click_products)
+    logger.info(
+        f"[{source}] So sánh danh sách {category_url}: HTTP {diff['http']}, click {diff['click']}, "
+        f"chung {diff['both']}, chỉ HTTP {len(diff['only_http'])}, chỉ click {len(diff['only_click'])}"
+    )
+    os.makedirs(REPORT_DIR, exist_ok=True)
+    slug = urlsplit(category_url).path.strip("/").replace("/", "_").replace(".html", "") or "index"
+    with open(os.path.join(REPORT_DIR, f"{source}_{slug}.json"), "w", encoding="utf-8") as f:
+        json.dump({"category_url": category_url, **diff}, f, ensure_ascii=False, indent=2)
+    return diff
+
+
+def _fetch_http_listing(source, category_url, logger):
+    """(products, số trang có sản phẩm) qua phân trang HTTP; lỗi thì trả về ([], 0)"""
+    try:
+        http_products, pages = asyncio.run(
+            fetch_listing_pages(source, category_url, LISTING_SOURCES[source], logger, get_concurrency())
+        )
+    except Exception as e:
+        logger.warning(f"[{source}] Lỗi khi lấy danh sách qua HTTP: {e}")
+        http_products, pages = [], 0
+    logger.info(f"[{source}] HTTP: {len(http_products)} sản phẩm từ {pages} trang ({category_url})")
+    return http_products, pages
+
+
+def _http_accepted(mode, pages):
+    # Chỉ 1 trang có sản phẩm thì không phân biệt được danh mục nhỏ với tham số phân trang bị bỏ qua
+    return mode == "http" and pages > 1
+
+
+def discover_listing(source, category_url, click_discover, logger=None):
+    """
+    Lấy danh sách sản phẩm của một danh mục qua các trang phân trang (HTTP song song),
+    quay về click_discover() (vòng lặp "Xem thêm" trên Selenium) khi không xác nhận được phân trang.
+    """
+    logger = logger or get_logger()
+    mode = get_listing_mode()
+    if mode == "click" or source not in LISTING_SOURCES:
+        return click_discover()
+
+    http_products, pages = _fetch_http_listing(source, category_url, logger)
+    if _http_accepted(mode, pages):
+        return http_products
+
+    logger.info(f"[{source}] Dùng vòng lặp click 'Xem thêm' cho {category_url}")
+    click_products = click_discover()
+    if http_products:
+        report_diff(source, category_url, http_products, click_products, logger)
+    return click_products
+
+
+def discover_listings(source, urls, click_discover, driver, setup_driver=None, logger=None):
+    """
+    Như discover_listing cho nhiều trang danh sách cùng lúc: phân trang HTTP của mọi URL chạy song song,
+    các URL phải quay về click_discover(url, driver) thì chạy trên pool trình duyệt (CRAWL_WORKERS > 1) hoặc driver chính.
+    Trả về list products theo đúng thứ tự urls.
+    """
+    logger = logger or get_logger()
+    mode = get_listing_mode()
+    results = [None] * len(urls)
+    http_results = [([], 0)] * len(urls)
+
+    if mode != "click" and source in LISTING_SOURCES and urls:
+        with ThreadPoolExecutor(max_workers=min(len(urls), get_concurrency())) as executor:
+            http_results = list(executor.map(lambda url: _fetch_http_listing(source, url, logger), urls))
+        for i, (http_products, pages) in enumerate(http_results):
+            if _http_accepted(mode, pages):
+                results[i] = http_products
+
+    pending = [i for i, result in enumerate(results) if result is None]
+    if pending:
+        logger.info(f"[{source}] Dùng vòng lặp click 'Xem thêm' cho {len(pending)}/{len(urls)} trang")
+        clicked = crawl_range(
+            0, len(pending),
+            lambda start, end, worker_driver: [(i, click_discover(urls[i], worker_driver)) for i in pending[start:end]],
+            setup_driver, driver, logger, use_pool=setup_driver is not None
+        )
+        for i, click_products in clicked:
+            results[i] = click_products
+            if http_results[i][0]:
+                report_diff(source, urls[i], http_results[i][0], click_products, logger)
+
+    return [result or [] for result in results]
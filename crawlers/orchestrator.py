@@ -0,0 +1,101 @@
+import datetime
+import importlib
+import json
+import multiprocessing
+import os
+import queue
+import time
+import traceback
+
+from my_logger import init_logger, get_logger
+from .time_budget import get_deadline
+
+STATUS_OK = "ok"
+STATUS_FAILED = "failed"
+STATUS_CRASHED = "crashed"
+
+
+def _run_source(source, module_name, prices_only, resume, log_file, results):
+    """Chạy crawler của một nguồn trong tiến trình riêng, log ra file riêng và gửi trạng thái về tiến trình cha"""
+    init_logger(log_file, tag=source)
+    logger = get_logger()
+    started = time.perf_counter()
+    status = {"source": source, "status": STATUS_OK, "error": None, "log_file": log_file}
+    try:
+        crawler = importlib.import_module(module_name)
+        if prices_only:
+            crawler.crawl_prices()
+        else:
+            crawler.crawl(resume=resume)
+    except Exception as e:
+        logger.error(f"Crawler {source} dừng do lỗi: {e}\n{traceback.format_exc()}")
+        status.update(status=STATUS_FAILED, error=repr(e))
+    status["elapsed_s"] = round(time.perf_counter() - started, 1)
+    results.put(status)
+
+
+def crawl_concurrently(crawlers, sources, prices_only=False, resume=False, log_dir="logs", logger=None):
+    """
+    Chạy crawler của mỗi nguồn trong một tiến trình riêng (các site độc lập nhau nên tổng thời gian
+    chỉ còn xấp xỉ nguồn chậm nhất). Một nguồn lỗi hoặc tiến trình chết không ảnh hưởng các nguồn khác.
+    Trả về {source: trạng thái}.
+    """
+    logger = logger or get_logger()
+    os.makedirs(log_dir, exist_ok=True)
+    timestamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
+
+    # spawn: tiến trình con không thừa hưởng luồng / kết nối SQLite / trình duyệt của tiến trình cha
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    processes = {}
+    started = time.perf_counter()
+
+    for source in sources:
+        log_file = os.path.join(log_dir, f"{timestamp}_{source}.log")
+        process = context.Process(
+            target=_run_source,
+            args=(source, crawlers[source].__name__, prices_only, resume, log_file, results),
+            name=f"crawl-{source}",
+        )
+        process.start()
+        processes[source] = process
+        logger.info(f"Đã chạy crawler {source} (pid {process.pid}), log: {log_file}")
+
+    statuses = {}
+    while len(statuses) < len(processes):
+        try:
+            status = results.get(timeout=5)
+            statuses[status["source"]] = status
+            logger.info(f"Crawler {status['source']} kết thúc: {status['status']} sau {status['elapsed_s']}s")
+            continue
+        except queue.Empty:
+            pass
+        # Crawler tự dừng trước hạn chót (--time-budget); tiến trình nào vẫn chạy khi đã quá hạn thì bị dừng hẳn
+        deadline = get_deadline()
+        if deadline is not None and time.time() > deadline:
+            for source, process in processes.items():
+                if source not in statuses and process.is_alive():
+                    logger.error(f"Crawler {source} vẫn chạy khi đã hết thời gian, dừng tiến trình")
+                    process.terminate()
+        # Tiến trình thoát với exit code khác 0 thì không còn gửi trạng thái được nữa -> bị kill / crash
+        for source, process in processes.items():
+            if source not in statuses and process.exitcode not in (None, 0):
+                statuses[source] = {
+                    "source": source, "status": STATUS_CRASHED, "error": f"exit code {process.exitcode}",
+                    "log_file": os.path.join(log_dir, f"{timestamp}_{source}.log"), "elapsed_s": None,
+                }
+                logger.error(f"Crawler {source} dừng bất thường (exit code {process.exitcode})")
+
+    for process in processes.values():
+        process.join()
+
+    elapsed = time.perf_counter() - started
+    for source in sources:
+        status = statuses[source]
+        elapsed_s = "-" if status["elapsed_s"] is None else status["elapsed_s"]
+        logger.info(f"  {source:<12}{status['status']:<9}{elapsed_s:>8}s  {status['error'] or ''}")
+    logger.info(f"Tổng thời gian crawl song song: {elapsed:.1f}s")
+
+    with open(os.path.join(log_dir, f"{timestamp}_status.json"), "w", encoding="utf-8") as f:
+        json.dump(statuses, f, ensure_ascii=False, indent=2)
+    return statuses
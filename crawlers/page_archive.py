@@ -0,0 +1,139 @@
+import hashlib
+import os
+import sqlite3
+import threading
+
+import zstandard
+
+from .crawl_state import now_iso
+
+ARCHIVE_DIR = "data/archive"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS pages (
+    url TEXT NOT NULL,
+    fetched_at TEXT NOT NULL,
+    source TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    content_hash TEXT NOT NULL,
+    PRIMARY KEY (url, fetched_at)
+);
+CREATE INDEX IF NOT EXISTS idx_pages_source ON pages (source, kind);
+"""
+
+
+def get_archive_dir():
+    return os.getenv("CRAWL_ARCHIVE_DIR", ARCHIVE_DIR)
+
+
+def is_archive_enabled():
+    """Lưu lại HTML của mọi trang đã tải, tắt bằng CRAWL_ARCHIVE=false"""
+    return os.getenv("CRAWL_ARCHIVE", "true").lower() not in ("0", "false", "no")
+
+
+def get_compression_level():
+    try:
+        return int(os.getenv("CRAWL_ARCHIVE_LEVEL", "10"))
+    except ValueError:
+        return 10
+
+
+class PageArchive:
+    """
+    Kho HTML thô định danh theo nội dung: blob nén zstd ở blobs/<2 ký tự đầu>/<sha256>.zst,
+    chỉ mục SQLite (url, thời điểm tải) -> hash. Trang không đổi giữa các lần crawl chỉ lưu một blob.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or get_archive_dir()
+        os.makedirs(os.path.join(self.path, "blobs"), exist_ok=True)
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(os.path.join(self.path, "index.sqlite"), check_same_thread=False, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+    def blob_path(self, content_hash):
+        return os.path.join(self.path, "blobs", content_hash[:2], f"{content_hash}.zst")
+
+    def put(self, url, source, kind, html):
+        """Lưu HTML của url, trả về hash nội dung"""
+        data = html.encode("utf-8")
+        content_hash = hashlib.sha256(data).hexdigest()
+        blob_path = self.blob_path(content_hash)
+
+        if not os.path.exists(blob_path):
+            os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+            # ZstdCompressor không an toàn đa luồng nên tạo mới mỗi lần ghi
+            compressed = zstandard.ZstdCompressor(level=get_compression_level()).compress(data)
+            tmp_path = f"{blob_path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(compressed)
+            os.replace(tmp_path, blob_path)
+
+        with self._lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO pages (url, fetched_at, source, kind, content_hash) VALUES (?, ?, ?, ?, ?)",
+                (url, now_iso(), source, kind, content_hash)
+            )
+            self.conn.commit()
+        return content_hash
+
+    def read_blob(self, content_hash):
+        with open(self.blob_path(content_hash), "rb") as f:
+            return zstandard.ZstdDecompressor().decompress(f.read()).decode("utf-8")
+
+    def latest_hash(self, url):
+        row = self.conn.execute(
+            "SELECT content_hash FROM pages WHERE url = ? ORDER BY fetched_at DESC LIMIT 1", (url,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def latest(self, url):
+        """HTML mới nhất đã lưu của url, None nếu chưa có"""
+        content_hash = self.latest_hash(url)
+        return self.read_blob(content_hash) if content_hash else None
+
+    def history(self, url):
+        """[(fetched_at, content_hash)] của url theo thời gian"""
+        return self.conn.execute(
+            "SELECT fetched_at, content_hash FROM pages WHERE url = ? ORDER BY fetched_at", (url,)
+        ).fetchall()
+
+
+_archive = None
+_archive_lock = threading.Lock()
+
+
+def get_archive():
+    global _archive
+    with _archive_lock:
+        if _archive is None or _archive.path != get_archive_dir():
+            _archive = PageArchive()
+        return _archive
+
+
+def archive_page(url, source, kind, html, logger=None):
+    """Lưu trang vào kho nếu đang bật; lỗi khi lưu không được làm hỏng quá trình crawl"""
+    if not is_archive_enabled() or not html:
+        return None
+    try:
+        return get_archive().put(url, source, kind, html)
+    except Exception as e:
+        if logger:
+            logger.warning(f"Không lưu được trang {url} vào kho: {e}")
+        return None
+
+
+def archive_driver_page(driver, url, source, kind="product", logger=None):
+    """Như archive_page nhưng chỉ lấy driver.page_source khi kho đang bật"""
+    if not is_archive_enabled():
+        return None
+    try:
+        html = driver.page_source
+    except Exception:
+        return None
+    return archive_page(url, source, kind, html, logger)
@@ -0,0 +1,51 @@
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+
+def _env_int(name, default):
+    try:
+        return max(1, int(os.getenv(name, default)))
+    except ValueError:
+        return default
+
+
+def get_parse_workers(default=2):
+    """Số luồng parse HTML chạy song song với trình duyệt, cấu hình qua CRAWL_PARSE_WORKERS"""
+    return _env_int("CRAWL_PARSE_WORKERS", default)
+
+
+def get_pipeline_depth(default=4):
+    """Số trang đã tải xong nhưng chưa parse tối đa, cấu hình qua CRAWL_PIPELINE_DEPTH"""
+    return _env_int("CRAWL_PIPELINE_DEPTH", default)
+
+
+def pipelined(items, capture, parse, workers=None, depth=None):
+    """
+    Chồng lấp tải trang và parse: capture(item) chạy trên luồng gọi (điều khiển trình duyệt) và trả về
+    snapshot của trang (HTML, JSON, ...) hoặc None nếu lỗi; parse(item, snapshot) chạy trên pool luồng
+    trong lúc trình duyệt chuyển sang item kế tiếp. Khi đã có `depth` trang chờ parse thì capture dừng
+    lại chờ trang cũ nhất parse xong, nên bộ nhớ giữ snapshot có giới hạn.
+    Trả về list kết quả theo đúng thứ tự items (None với item capture lỗi).
+    """
+    workers = workers or get_parse_workers()
+    depth = depth or get_pipeline_depth()
+    results = [None] * len(items)
+    pending = deque()
+
+    def collect_oldest():
+        position, future = pending.popleft()
+        results[position] = future.result()
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="parse") as executor:
+        for position, item in enumerate(items):
+            snapshot = capture(item)
+            if snapshot is None:
+                continue
+            pending.append((position, executor.submit(parse, item, snapshot)))
+            while len(pending) >= depth:
+                collect_oldest()
+        while pending:
+            collect_oldest()
+
+    return results
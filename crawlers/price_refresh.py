@@ -0,0 +1,68 @@
+import ast
+import os
+
+import pandas as pd
+
+from .driver_pool import crawl_with_pool, get_pool_size
+
+
+def parse_prices_value(value):
+    if isinstance(value, str):
+        try:
+            return ast.literal_eval(value)
+        except (ValueError, SyntaxError):
+            return []
+    return value if isinstance(value, list) else []
+
+
+def patch_prices(output_path, updates, source, category, store, logger):
+    """
+    Vá cột prices của CSV có sẵn bằng giá mới; giữ nguyên các cột khác.
+    Sản phẩm có giá thay đổi được đánh dấu changed trong state store để bước xử lý chạy lại.
+    """
+    df = pd.read_csv(output_path, encoding="utf-8")
+    new_prices = {update["url"]: update["prices"] for update in updates if update.get("prices")}
+
+    changed_count = 0
+    for i, url in df["url"].items():
+        prices = new_prices.get(url)
+        if prices is None:
+            continue
+        if parse_prices_value(df.at[i, "prices"]) != prices:
+            # CSV lưu list dưới dạng repr giống khi to_csv một cột list
+            df.at[i, "prices"] = str(prices)
+            changed_count += 1
+            if store is not None:
+                store.mark_changed(url, source, category)
+
+    df.to_csv(output_path, index=False)
+    logger.info(
+        f"[{source}/{category}] Cập nhật giá: {len(new_prices)}/{len(df)} sản phẩm lấy được giá, "
+        f"{changed_count} sản phẩm đổi giá"
+    )
+    return changed_count
+
+
+def refresh_category_prices(source, category, output_path, fetch_range, setup_driver, driver, store, logger, use_pool=True):
+    """
+    Chế độ --prices-only cho một danh mục: chỉ lấy giá/biến thể cho các URL đã có trong CSV.
+    fetch_range(start, end, rows, driver) trả về list {"url", "prices"}.
+    """
+    if not os.path.exists(output_path):
+        logger.warning(f"Chưa có dữ liệu {output_path}, bỏ qua cập nhật giá")
+        return 0
+
+    rows = pd.read_csv(output_path, encoding="utf-8", usecols=["name", "url"]).to_dict("records")
+    logger.info(f"[{source}/{category}] Cập nhật giá cho {len(rows)} sản phẩm")
+
+    if use_pool and get_pool_size() > 1:
+        updates = crawl_with_pool(
+            len(rows),
+            lambda start, end, worker_driver: fetch_range(start, end, rows, worker_driver),
+            setup_driver,
+            logger=logger
+        )
+    else:
+        updates = fetch_range(0, len(rows), rows, driver)
+
+    return patch_prices(output_path, updates, source, category, store, logger)
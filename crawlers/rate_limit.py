@@ -0,0 +1,229 @@
+import asyncio
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager, asynccontextmanager
+from urllib.parse import urlsplit
+
+from my_logger import get_logger
+from .http_common import BLOCK_STATUS_CODES
+
+# Dấu hiệu trang chặn / captcha trong tiêu đề trang
+BLOCK_TITLE_PATTERN = re.compile(
+    r"access denied|forbidden|too many requests|captcha|attention required|just a moment|bị chặn|truy cập bị từ chối",
+    re.IGNORECASE,
+)
+
+
+def _env_float(name, default):
+    try:
+        return float(os.getenv(name, default))
+    except ValueError:
+        return default
+
+
+class CircuitOpenError(Exception):
+    """Site đang chặn và đã vượt số lần ngắt cho phép, không gửi thêm request trong lần chạy này"""
+
+
+class PageBlockedError(Exception):
+    """Trang trả về là trang chặn / captcha thay vì trang sản phẩm"""
+
+
+class DomainLimiter:
+    """
+    Giới hạn request tới một domain theo AIMD:
+    - concurrency (số request đồng thời) tăng cộng dần khi request nhanh và thành công, giảm một nửa khi lỗi / chậm;
+    - đã về 1 mà vẫn lỗi thì tăng khoảng nghỉ giữa các request (nhân đôi), thành công thì giảm dần.
+    Nhiều lần lỗi/chặn liên tiếp sẽ ngắt mạch (circuit breaker): dừng gửi request trong thời gian cooldown
+    (nhân đôi mỗi lần ngắt), sau đó cho một request thử; quá CRAWL_BREAKER_MAX_TRIPS lần thì bỏ hẳn domain.
+    """
+
+    def __init__(self, domain):
+        self.domain = domain
+        self.max_limit = _env_float("CRAWL_MAX_CONCURRENCY_PER_DOMAIN", 8)
+        self.limit = 1.0
+        self.delay = 0.0
+        self.max_delay = _env_float("CRAWL_MAX_DELAY_S", 30)
+        self.failure_threshold = int(_env_float("CRAWL_BREAKER_FAILURES", 5))
+        self.base_cooldown = _env_float("CRAWL_BREAKER_COOLDOWN_S", 60)
+        self.max_trips = int(_env_float("CRAWL_BREAKER_MAX_TRIPS", 5))
+
+        self.in_flight = 0
+        self.ewma_latency = None
+        self.samples = 0
+        self.last_start = 0.0
+        self.last_decrease = 0.0
+        self.consecutive_failures = 0
+        self.trips = 0
+        self.open_until = 0.0
+        self.probing = False
+        self.stats = {"requests": 0, "errors": 0, "blocked": 0, "slow": 0, "trips": 0}
+        self._cond = threading.Condition()
+
+    # ===== Cấp phát lượt request =====
+    def _wait_time(self, now):
+        """0 nếu được gửi ngay, None nếu phải chờ request khác trả lượt, > 0 là số giây cần chờ"""
+        # Đã ngắt đủ CRAWL_BREAKER_MAX_TRIPS lần thì bỏ hẳn domain cho tới hết lần chạy, kể cả khi đã hết cooldown
+        if self.trips >= self.max_trips:
+            raise CircuitOpenError(f"Domain {self.domain} đã bị ngắt {self.trips} lần, bỏ qua request")
+        if now < self.open_until:
+            return self.open_until - now
+        if self.open_until and self.consecutive_failures >= self.failure_threshold:
+            # Half-open: chỉ cho một request thử
+            if self.probing:
+                return None
+        if self.in_flight >= max(1, int(self.limit)):
+            return None
+        return max(0.0, self.last_start + self.delay - now)
+
+    def try_acquire(self):
+        """Lấy lượt không chặn: trả về 0 nếu lấy được, ngược lại số giây nên chờ trước khi thử lại"""
+        with self._cond:
+            now = time.monotonic()
+            wait = self._wait_time(now)
+            if wait == 0:
+                self._start(now)
+                return 0
+            return 0.05 if wait is None else wait
+
+    def acquire(self):
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                wait = self._wait_time(now)
+                if wait == 0:
+                    self._start(now)
+                    return
+                self._cond.wait(timeout=wait)
+
+    def _start(self, now):
+        self.in_flight += 1
+        self.last_start = now
+        self.stats["requests"] += 1
+        if self.open_until and self.consecutive_failures >= self.failure_threshold:
+            self.probing = True
+
+    # ===== Ghi nhận kết quả =====
+    def release(self, latency, ok=True, blocked=False):
+        with self._cond:
+            self.in_flight -= 1
+            self.probing = False
+            slow = ok and self.samples >= 5 and latency > 2 * self.ewma_latency
+            if ok:
+                self.samples += 1
+                self.ewma_latency = latency if self.ewma_latency is None else 0.8 * self.ewma_latency + 0.2 * latency
+
+            if ok and not slow:
+                self.consecutive_failures = 0
+                self.open_until = 0.0
+                if self.delay > 0:
+                    self.delay = max(0.0, self.delay - 0.5)
+                else:
+                    self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            else:
+                self.stats["blocked" if blocked else ("slow" if slow else "errors")] += 1
+                if not slow:
+                    self.consecutive_failures += 1
+                self._decrease(time.monotonic())
+                if self.consecutive_failures >= self.failure_threshold:
+                    self._trip()
+            self._cond.notify_all()
+
+    def _decrease(self, now):
+        # Giảm tối đa một lần mỗi khoảng latency trung bình để một loạt lỗi cùng lúc không kéo về 0
+        if now - self.last_decrease < (self.ewma_latency or 1.0):
+            return
+        self.last_decrease = now
+        if self.limit > 1:
+            self.limit = max(1.0, self.limit / 2)
+        else:
+            self.delay = min(self.max_delay, max(1.0, self.delay * 2))
+
+    def _trip(self):
+        self.trips += 1
+        self.stats["trips"] += 1
+        cooldown = self.base_cooldown * 2 ** (self.trips - 1)
+        self.open_until = time.monotonic() + cooldown
+        self.limit = 1.0
+        if self.trips >= self.max_trips:
+            get_logger().error(
+                f"[{self.domain}] {self.consecutive_failures} request lỗi/bị chặn liên tiếp, "
+                f"đã ngắt mạch {self.trips}/{self.max_trips} lần, bỏ domain cho tới hết lần chạy"
+            )
+            return
+        get_logger().warning(
+            f"[{self.domain}] {self.consecutive_failures} request lỗi/bị chặn liên tiếp, "
+            f"ngắt mạch {cooldown:.0f}s (lần {self.trips}/{self.max_trips})"
+        )
+
+    def summary(self):
+        with self._cond:
+            return (f"[{self.domain}] concurrency {self.limit:.1f}, nghỉ {self.delay:.1f}s, "
+                    f"latency TB {self.ewma_latency or 0:.2f}s, " + ", ".join(f"{k}: {v}" for k, v in self.stats.items()))
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(url):
+    domain = urlsplit(url).netloc or url
+    with _limiters_lock:
+        if domain not in _limiters:
+            _limiters[domain] = DomainLimiter(domain)
+        return _limiters[domain]
+
+
+def report_limits(logger):
+    with _limiters_lock:
+        limiters = list(_limiters.values())
+    for limiter in limiters:
+        logger.info(limiter.summary())
+
+
+def is_blocked_title(title):
+    return bool(title) and bool(BLOCK_TITLE_PATTERN.search(title))
+
+
+@contextmanager
+def throttled(url):
+    """Giữ một lượt request tới domain của url; lỗi trong khối with được tính là request lỗi"""
+    limiter = get_limiter(url)
+    limiter.acquire()
+    started = time.monotonic()
+    outcome = {"blocked": False}
+    try:
+        yield outcome
+    except Exception:
+        limiter.release(time.monotonic() - started, ok=False, blocked=outcome["blocked"])
+        raise
+    limiter.release(time.monotonic() - started, ok=not outcome["blocked"], blocked=outcome["blocked"])
+
+
+def throttled_get(driver, url):
+    """driver.get qua bộ giới hạn của domain; trang chặn / captcha được tính là bị chặn"""
+    with throttled(url) as outcome:
+        driver.get(url)
+        outcome["blocked"] = is_blocked_title(driver.title)
+    if outcome["blocked"]:
+        raise PageBlockedError(f"Trang bị chặn: {url} ({driver.title})")
+
+
+@asynccontextmanager
+async def throttled_async(url):
+    limiter = get_limiter(url)
+    while True:
+        wait = limiter.try_acquire()
+        if wait == 0:
+            break
+        await asyncio.sleep(min(wait, 1.0))
+    started = time.monotonic()
+    outcome = {"blocked": False}
+    try:
+        yield outcome
+    except Exception:
+        limiter.release(time.monotonic() - started, ok=False, blocked=outcome["blocked"])
+        raise
+    limiter.release(time.monotonic() - started, ok=not outcome["blocked"], blocked=outcome["blocked"])
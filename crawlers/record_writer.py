@@ -0,0 +1,200 @@
+import json
+import os
+import threading
+from contextlib import contextmanager
+
+from my_logger import get_logger
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+STREAM_DIR = "data/stream"
+
+
+def get_stream_format():
+    """
+    Định dạng ghi bản ghi ngay khi trích xuất xong, cấu hình qua CRAWL_STREAM_FORMAT:
+    'jsonl' (mặc định), 'parquet' (cần pyarrow) hoặc 'none' (không giữ file stream: vẫn ghi ra file JSONL tạm
+    để dựng CSV, xóa khi xong danh mục)
+    """
+    return os.getenv("CRAWL_STREAM_FORMAT", "jsonl").lower()
+
+
+def get_row_group_size(default=200):
+    try:
+        return max(1, int(os.getenv("CRAWL_STREAM_ROW_GROUP", default)))
+    except ValueError:
+        return default
+
+
+def _encode(value):
+    # Giá trị lồng nhau (specifications, prices, ...) được lưu dạng chuỗi JSON để schema Parquet cố định
+    if value is None or isinstance(value, str):
+        return value
+    return json.dumps(value, ensure_ascii=False, default=str)
+
+
+def _decode(value):
+    if isinstance(value, str) and value[:1] in ("[", "{"):
+        try:
+            return json.loads(value)
+        except ValueError:
+            return value
+    return value
+
+
+def iter_records(paths):
+    """Đọc lần lượt bản ghi từ các file JSONL / Parquet (theo thứ tự ghi), bỏ qua file chưa có"""
+    for path in paths:
+        if not os.path.exists(path):
+            continue
+        if path.endswith(".parquet"):
+            for batch in pq.ParquetFile(path).iter_batches():
+                for row in batch.to_pylist():
+                    yield {column: _decode(value) for column, value in row.items()}
+        else:
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        yield json.loads(line)
+
+
+class JsonlRecordWriter:
+    """Mỗi bản ghi một dòng JSON, flush ngay để bước sau đọc được khi crawl chưa xong"""
+
+    def __init__(self, path, append=False, temporary=False):
+        self.path = path
+        self.count = 0
+        self.temporary = temporary
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._file = open(path, "a" if append else "w", encoding="utf-8")
+        self._lock = threading.Lock()
+
+    def write(self, record):
+        line = json.dumps(record, ensure_ascii=False, default=str)
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+            self.count += 1
+
+    def close(self):
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
+
+
+class ParquetRecordWriter:
+    """
+    Ghi Parquet theo row group (CRAWL_STREAM_ROW_GROUP bản ghi), chỉ giữ trong bộ nhớ một row group.
+    Cột lấy theo row group đầu tiên, mọi cột kiểu chuỗi. File chỉ đọc được sau close().
+    """
+
+    def __init__(self, path, row_group_size=None):
+        self.path = path
+        self.count = 0
+        self.temporary = False
+        self.row_group_size = row_group_size or get_row_group_size()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._buffer = []
+        self._columns = None
+        self._writer = None
+        self._lock = threading.Lock()
+
+    def _flush(self):
+        if not self._buffer:
+            return
+        if self._writer is None:
+            self._columns = list(dict.fromkeys(key for record in self._buffer for key in record))
+            schema = pa.schema([(column, pa.string()) for column in self._columns])
+            self._writer = pq.ParquetWriter(self.path, schema)
+        table = pa.table(
+            {column: [_encode(record.get(column)) for record in self._buffer] for column in self._columns},
+            schema=self._writer.schema,
+        )
+        self._writer.write_table(table)
+        self._buffer = []
+
+    def write(self, record):
+        with self._lock:
+            self._buffer.append(record)
+            self.count += 1
+            if len(self._buffer) >= self.row_group_size:
+                self._flush()
+
+    def close(self):
+        with self._lock:
+            self._flush()
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+
+
+def stream_path(source, key, extension, append=False):
+    """data/stream/<source>/<key>.<ext>; Parquet không ghi nối được nên lần chạy resume ghi thành part mới"""
+    path = os.path.join(STREAM_DIR, source, f"{key}.{extension}")
+    part = 1
+    while append and extension == "parquet" and os.path.exists(path):
+        path = os.path.join(STREAM_DIR, source, f"{key}.part{part}.{extension}")
+        part += 1
+    return path
+
+
+def open_record_writer(source, key, append=False, fmt=None, logger=None):
+    """Writer theo CRAWL_STREAM_FORMAT ('none': file JSONL tạm); thiếu pyarrow thì quay về JSONL"""
+    logger = logger or get_logger()
+    fmt = fmt or get_stream_format()
+    if fmt in ("none", "off", "false", ""):
+        return JsonlRecordWriter(stream_path(source, key, "spool.jsonl"), append=append, temporary=True)
+    if fmt == "parquet":
+        if pq is not None:
+            return ParquetRecordWriter(stream_path(source, key, "parquet", append))
+        logger.warning("Chưa cài pyarrow, ghi bản ghi dạng JSONL thay cho Parquet")
+    return JsonlRecordWriter(stream_path(source, key, "jsonl"), append=append)
+
+
+_writers = {}
+_writers_lock = threading.Lock()
+
+
+@contextmanager
+def streaming(source, key, append=False, logger=None):
+    """
+    Trong khối with, stream_record(source, ...) ghi bản ghi vào data/stream/<source>/<key>.
+    Sản phẩm được crawl lại ở lượt retry có thể xuất hiện nhiều lần (crawl_state.write_category_output chọn bản ghi).
+    Gọi writer.close() trước khi đọc lại file trong khối with (Parquet chỉ đọc được sau close);
+    file tạm của CRAWL_STREAM_FORMAT=none bị xóa khi ra khỏi khối with.
+    """
+    logger = logger or get_logger()
+    writer = open_record_writer(source, key, append, logger=logger)
+    with _writers_lock:
+        _writers[source] = writer
+    try:
+        yield writer
+    finally:
+        with _writers_lock:
+            _writers.pop(source, None)
+        writer.close()
+        if writer.temporary:
+            if os.path.exists(writer.path):
+                os.remove(writer.path)
+        else:
+            logger.info(f"Đã ghi {writer.count} bản ghi vào {writer.path}")
+
+
+def record_summary(record):
+    """
+    Bản tóm tắt nhỏ thay cho bản ghi đầy đủ khi chỉ cần biết URL và trường nào có dữ liệu (retry, keep_unfinished):
+    bản ghi đầy đủ nằm trong file stream, không giữ trong bộ nhớ
+    """
+    return {"url": record["url"], **{field: True for field, value in record.items() if value and field != "url"}}
+
+
+def stream_record(source, record):
+    """Ghi bản ghi vừa trích xuất; không có writer đang mở (shard, benchmark, ...) thì bỏ qua"""
+    with _writers_lock:
+        writer = _writers.get(source)
+    if writer is not None:
+        writer.write(record)
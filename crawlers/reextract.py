@@ -0,0 +1,99 @@
+import importlib
+import os
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from my_logger import get_logger
+from .page_archive import PageArchive, get_archive_dir
+from .shards import categories_by_key
+
+# Mỗi tiến trình con mở kho riêng (kết nối SQLite không chia sẻ được giữa các tiến trình)
+_worker_archive = None
+
+
+def get_workers():
+    try:
+        return max(1, int(os.getenv("REEXTRACT_WORKERS", os.cpu_count() or 1)))
+    except ValueError:
+        return os.cpu_count() or 1
+
+
+def _init_worker(archive_dir):
+    global _worker_archive
+    _worker_archive = PageArchive(archive_dir)
+
+
+def _reextract_row(task):
+    """
+    Trả về (fields, lỗi). fields None và lỗi None: không có trang trong kho; lỗi khác None: hàm trích xuất
+    bị exception (traceback được gửi về tiến trình cha để ghi log kèm URL)
+    """
+    module_name, row, category = task
+    try:
+        return importlib.import_module(module_name).reextract(row, category, _worker_archive), None
+    except Exception:
+        return None, traceback.format_exc()
+
+
+def reextract_category(executor, crawler, source, category, store, logger):
+    """Chạy lại hàm trích xuất hiện tại trên HTML đã lưu và vá các cột thay đổi trong CSV của danh mục"""
+    key = crawler.category_key(category)
+    output_path = crawler.output_path(category)
+    if not os.path.exists(output_path):
+        logger.warning(f"Chưa có dữ liệu {output_path}, bỏ qua trích xuất lại")
+        return 0
+
+    # Kiểu object để ghi được chuỗi vào cột đang toàn NaN
+    df = pd.read_csv(output_path, encoding="utf-8").astype(object)
+    tasks = [(crawler.__name__, row, category) for row in df[["name", "url"]].to_dict("records")]
+    results = list(executor.map(_reextract_row, tasks, chunksize=16))
+
+    missing = 0
+    errors = 0
+    changed = 0
+    for i, (fields, error) in enumerate(results):
+        if error is not None:
+            # Lỗi trong hàm trích xuất (parser hỏng) khác với trang thiếu trong kho
+            errors += 1
+            logger.error(f"[{source}/{key}] Lỗi trích xuất lại {df.at[i, 'url']}:\n{error}")
+            continue
+        if fields is None:
+            missing += 1
+            continue
+        row_changed = False
+        for column, value in fields.items():
+            if value is None:
+                continue
+            if column not in df.columns:
+                df[column] = None
+            # CSV lưu dict/list dưới dạng repr giống khi to_csv
+            text = str(value)
+            if df.at[i, column] != text:
+                df.at[i, column] = text
+                row_changed = True
+        if row_changed:
+            changed += 1
+            if store is not None:
+                store.mark_changed(df.at[i, "url"], source, key)
+
+    df.to_csv(output_path, index=False)
+    logger.info(
+        f"[{source}/{key}] Trích xuất lại {len(df) - missing - errors}/{len(df)} sản phẩm từ kho, "
+        f"{changed} sản phẩm thay đổi, {missing} không có trang trong kho, {errors} lỗi trích xuất"
+    )
+    return changed
+
+
+def reextract(crawlers, sources, archive_dir=None, workers=None, store=None, logger=None):
+    logger = logger or get_logger()
+    archive_dir = archive_dir or get_archive_dir()
+    workers = workers or get_workers()
+    logger.info(f"Trích xuất lại dữ liệu từ {archive_dir} với {workers} tiến trình")
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(archive_dir,)) as executor:
+        for source in sources:
+            crawler = crawlers[source]
+            for category in categories_by_key(crawler).values():
+                reextract_category(executor, crawler, source, category, store, logger)
@@ -0,0 +1,91 @@
+import os
+import time
+
+from .rate_limit import CircuitOpenError
+from .record_writer import record_summary
+
+
+def get_retry_attempts(default=2):
+    """Số lượt crawl lại sản phẩm lỗi / thiếu dữ liệu, cấu hình qua CRAWL_RETRY_ATTEMPTS"""
+    try:
+        return max(0, int(os.getenv("CRAWL_RETRY_ATTEMPTS", default)))
+    except ValueError:
+        return default
+
+
+def get_retry_backoff(default=30.0):
+    """Thời gian chờ trước lượt retry đầu tiên (giây), nhân đôi ở mỗi lượt sau"""
+    try:
+        return max(0.0, float(os.getenv("CRAWL_RETRY_BACKOFF_S", default)))
+    except ValueError:
+        return default
+
+
+def missing_fields(record, required_fields):
+    return [field for field in required_fields if not record.get(field)]
+
+
+def retry_pending(df_to_crawl, records, required_fields, crawl_rows, logger, attempts=None, backoff=None, budget=None,
+                  on_records=None, chunk_size=50):
+    """
+    Lượt retry cuối danh mục: sản phẩm không có bản ghi (lỗi) hoặc thiếu trường bắt buộc được crawl lại
+    sau backoff, backoff*2, ... giây, từng đoạn chunk_size sản phẩm. crawl_rows(df_pending) trả về list bản ghi.
+    records chỉ cần "url" và các trường có dữ liệu (record_summary); bản ghi mới chỉ thay bản ghi cũ khi thiếu
+    ít trường hơn, khi đó on_records(df_rows, records) nhận bản ghi đầy đủ để ghi vào state store.
+    Có budget (TimeBudget) thì không retry khi đã hết thời gian hoặc không còn kịp chờ backoff.
+    Trả về list record_summary theo thứ tự df_to_crawl.
+    """
+    attempts = get_retry_attempts() if attempts is None else attempts
+    backoff = get_retry_backoff() if backoff is None else backoff
+    by_url = {record["url"]: record for record in records}
+
+    def is_pending(url):
+        return url not in by_url or bool(missing_fields(by_url[url], required_fields))
+
+    df_retried = df_to_crawl.iloc[0:0]
+    for attempt in range(1, attempts + 1):
+        df_pending = df_to_crawl[df_to_crawl["url"].map(is_pending)].reset_index(drop=True) if not df_to_crawl.empty else df_to_crawl
+        if df_pending.empty:
+            break
+        delay = backoff * 2 ** (attempt - 1)
+        if budget is not None and not budget.affordable(1, delay):
+            logger.info(f"Không đủ thời gian cho retry lượt {attempt}, bỏ qua {len(df_pending)} sản phẩm")
+            break
+        if attempt == 1:
+            df_retried = df_pending
+
+        failed_count = sum(url not in by_url for url in df_pending["url"])
+        logger.info(
+            f"Retry lượt {attempt}/{attempts}: {failed_count} sản phẩm lỗi, "
+            f"{len(df_pending) - failed_count} sản phẩm thiếu dữ liệu, chờ {delay:.0f}s"
+        )
+        time.sleep(delay)
+
+        try:
+            for start in range(0, len(df_pending), chunk_size):
+                df_chunk = df_pending.iloc[start:start + chunk_size].reset_index(drop=True)
+                if budget is not None:
+                    df_done, retried = budget.crawl_rows(df_chunk, crawl_rows, logger)
+                else:
+                    df_done, retried = df_chunk, crawl_rows(df_chunk)
+
+                improved = []
+                for record in retried:
+                    previous = by_url.get(record["url"])
+                    if previous is None or len(missing_fields(record, required_fields)) < len(missing_fields(previous, required_fields)):
+                        by_url[record["url"]] = record_summary(record)
+                        improved.append(record)
+                if on_records and improved:
+                    improved_urls = {record["url"] for record in improved}
+                    on_records(df_chunk[df_chunk["url"].isin(improved_urls)].reset_index(drop=True), improved)
+                if len(df_done) < len(df_chunk):
+                    break
+        except CircuitOpenError as e:
+            logger.warning(f"Dừng retry: {e}")
+            break
+
+    if not df_retried.empty:
+        still_pending = sum(is_pending(url) for url in df_retried["url"])
+        logger.info(f"Sau retry còn {still_pending}/{len(df_retried)} sản phẩm lỗi hoặc thiếu dữ liệu")
+
+    return [by_url[url] for url in df_to_crawl["url"] if url in by_url] if not df_to_crawl.empty else list(records)
@@ -0,0 +1,195 @@
+import json
+import os
+from collections import defaultdict
+
+import pandas as pd
+
+from my_logger import get_logger
+from .checkpoint import write_jsonl, read_jsonl
+from .crawl_state import record_crawl_results, write_category_output
+from .driver_pool import crawl_range
+from .time_budget import keep_unfinished
+
+SHARD_DIR = "data/shards"
+
+
+def get_unit_size(default=50):
+    """Số sản phẩm mỗi work unit, cấu hình qua CRAWL_SHARD_UNIT_SIZE"""
+    try:
+        return max(1, int(os.getenv("CRAWL_SHARD_UNIT_SIZE", default)))
+    except ValueError:
+        return default
+
+
+def parse_shard(text):
+    """'k/N' -> (k, N) với 1 <= k <= N"""
+    try:
+        shard, num_shards = (int(part) for part in text.split("/"))
+    except ValueError:
+        raise ValueError(f"Shard không hợp lệ: {text!r}, cần dạng k/N (vd: 1/4)")
+    if not 1 <= shard <= num_shards:
+        raise ValueError(f"Shard không hợp lệ: {text!r}, cần 1 <= k <= N")
+    return shard, num_shards
+
+
+def plan_path(shard_dir=SHARD_DIR):
+    return os.path.join(shard_dir, "plan.json")
+
+
+def part_path(unit, shard_dir=SHARD_DIR):
+    """Artifact của một work unit: parts/<source>/<category>/<start>_<end>.jsonl"""
+    return os.path.join(
+        shard_dir, "parts", unit["source"], unit["category"], f"{unit['start']:06d}_{unit['end']:06d}.jsonl"
+    )
+
+
+def categories_by_key(crawler):
+    return {crawler.category_key(category): category for category in crawler.categories if category.get("url")}
+
+
+def build_plan(crawlers, sources, shard_dir=SHARD_DIR, unit_size=None, logger=None):
+    """
+    Duyệt danh sách sản phẩm của mọi danh mục rồi chia thành các work unit (source, category, start, end).
+    Plan được ghi ra plan.json để các runner dùng chung cùng một danh sách/thứ tự sản phẩm.
+    """
+    logger = logger or get_logger()
+    unit_size = unit_size or get_unit_size()
+    listings = defaultdict(dict)
+    units = []
+
+    for source in sources:
+        crawler = crawlers[source]
+        driver = crawler.setup_driver()
+        crawler.wait_policy.start()
+        try:
+            for key, category in categories_by_key(crawler).items():
+                df_products, extra = crawler.discover_products(category, driver, logger)
+                listings[source][key] = {
+                    "columns": list(df_products.columns),
+                    "listing": df_products.to_dict("records"),
+                    "extra": extra,
+                }
+                for start in range(0, len(df_products), unit_size):
+                    units.append({"source": source, "category": key, "start": start,
+                                  "end": min(start + unit_size, len(df_products))})
+                logger.info(f"[{source}/{key}] {len(df_products)} sản phẩm")
+        finally:
+            driver.quit()
+            crawler.wait_policy.report(logger)
+
+    os.makedirs(shard_dir, exist_ok=True)
+    plan = {"unit_size": unit_size, "listings": listings, "units": units}
+    with open(plan_path(shard_dir), "w", encoding="utf-8") as f:
+        json.dump(plan, f, ensure_ascii=False, default=str)
+    logger.info(f"Đã tạo plan gồm {len(units)} work unit tại {plan_path(shard_dir)}")
+    return plan
+
+
+def load_plan(shard_dir=SHARD_DIR):
+    with open(plan_path(shard_dir), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def listing_frame(plan, source, key):
+    listing = plan["listings"][source][key]
+    return pd.DataFrame(listing["listing"], columns=listing["columns"])
+
+
+def assigned_units(plan, shard, num_shards):
+    # Chia xen kẽ để mỗi shard nhận phần việc của nhiều danh mục/nguồn, tải đều hơn chia theo khối liền
+    return plan["units"][shard - 1::num_shards]
+
+
+def run_shard(crawlers, shard, num_shards, shard_dir=SHARD_DIR, logger=None):
+    """
+    Crawl chi tiết các work unit của shard k/N, mỗi unit ghi ra một file JSONL riêng.
+    Unit có đoạn mà pool trình duyệt vẫn không crawl được thì không ghi file, chạy lại shard sẽ crawl lại unit đó.
+    """
+    logger = logger or get_logger()
+    plan = load_plan(shard_dir)
+    units = assigned_units(plan, shard, num_shards)
+    logger.info(f"Shard {shard}/{num_shards}: {len(units)}/{len(plan['units'])} work unit")
+
+    drivers = {}
+    frames = {}
+    try:
+        for unit in units:
+            path = part_path(unit, shard_dir)
+            if os.path.exists(path):
+                logger.info(f"Bỏ qua work unit đã có kết quả: {path}")
+                continue
+
+            source, key = unit["source"], unit["category"]
+            crawler = crawlers[source]
+            if source not in drivers:
+                drivers[source] = crawler.setup_driver()
+                crawler.wait_policy.start()
+            if (source, key) not in frames:
+                frames[(source, key)] = listing_frame(plan, source, key)
+            df_products = frames[(source, key)]
+            category = categories_by_key(crawler)[key]
+
+            logger.info(f"[{source}/{key}] Crawl sản phẩm {unit['start']}-{unit['end']}")
+            failed = []
+            records = crawl_range(
+                unit["start"], unit["end"],
+                lambda s, e, worker_driver: crawler.crawl_details(s, e, df_products, category, worker_driver, logger),
+                crawler.setup_driver, drivers[source], logger, use_pool=crawler.uses_driver_pool(),
+                on_failed=lambda s, e: failed.append((s, e))
+            )
+            if failed:
+                # Không ghi artifact: work unit được crawl lại ở lần chạy shard sau, merge_shards giữ bản ghi cũ
+                logger.warning(f"[{source}/{key}] Work unit {unit['start']}-{unit['end']} có đoạn lỗi {failed}, để lần chạy sau")
+                continue
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            write_jsonl(path, records)
+    finally:
+        for source, driver in drivers.items():
+            driver.quit()
+            crawlers[source].wait_policy.report(logger)
+
+
+def merge_shards(crawlers, shard_dir=SHARD_DIR, store=None, logger=None):
+    """
+    Gộp artifact của mọi shard thành data/raw/<source>/<category>.csv theo thứ tự trong plan.
+    Sản phẩm thuộc work unit chưa có kết quả giữ bản ghi trong CSV cũ (như keep_unfinished khi hết thời gian)
+    thay vì biến mất khỏi data/raw.
+    """
+    logger = logger or get_logger()
+    plan = load_plan(shard_dir)
+    units_by_category = defaultdict(list)
+    for unit in plan["units"]:
+        units_by_category[(unit["source"], unit["category"])].append(unit)
+
+    for source, listings in plan["listings"].items():
+        crawler = crawlers[source]
+        categories = categories_by_key(crawler)
+        for key, listing in listings.items():
+            df_products = listing_frame(plan, source, key)
+            part_paths = []
+            missing = []
+            for unit in units_by_category[(source, key)]:
+                path = part_path(unit, shard_dir)
+                if not os.path.exists(path):
+                    missing.append(unit)
+                    continue
+                part_paths.append(path)
+                if store is not None:
+                    # Đọc từng work unit một; sản phẩm của work unit thiếu chưa được crawl nên không bị đánh dấu failed
+                    record_crawl_results(
+                        store, source, key, df_products.iloc[unit["start"]:unit["end"]], read_jsonl(path),
+                        crawler.REQUIRED_FIELDS, logger
+                    )
+
+            output_path = crawler.output_path(categories[key])
+            kept = []
+            if missing:
+                ranges = ", ".join(f"{unit['start']}-{unit['end']}" for unit in missing)
+                logger.warning(f"[{source}/{key}] Thiếu kết quả của {len(missing)} work unit: {ranges}")
+                missing_positions = [i for unit in missing for i in range(unit["start"], unit["end"])]
+                kept = keep_unfinished(df_products.iloc[missing_positions], [], [], output_path, logger)
+
+            write_category_output(
+                output_path, df_products, kept, part_paths, crawler.build_output, listing["extra"],
+                crawler.REQUIRED_FIELDS, logger
+            )
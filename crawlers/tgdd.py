@@ -11,10 +11,31 @@ from selenium.webdriver.chrome.service import Service
 from webdriver_manager.chrome import ChromeDriverManager
 from bs4 import BeautifulSoup
 import json
+from functools import partial
 from my_logger import get_logger
-
-
-def setup_driver():
+from .driver_pool import crawl_range
+from .tgdd_http import (
+    crawl_selected_range_http, crawl_prices_range_http, get_fetch_mode, parse_json_product_gtm, parse_color_links,
+    variant_prices_from_pages, parse_brand, parse_specs, parse_variant_price,
+)
+from .wait_policy import get_wait_policy
+from .browser_profile import apply_profile
+from .crawl_state import CrawlStateStore, split_fresh_products, record_crawl_results, write_category_output
+from .price_refresh import refresh_category_prices
+from .checkpoint import SourceCheckpoint, prepare_category, crawl_with_checkpoint
+from .listing_discovery import discover_listing, extract_listing_cards
+from .page_archive import archive_driver_page, archive_page
+from .rate_limit import throttled_get, report_limits
+from .driver_lifecycle import ManagedDriver, report_lifecycle
+from .record_writer import streaming, stream_record
+from .variant_groups import crawl_with_variant_groups
+from .retry_queue import retry_pending
+from .time_budget import TimeBudget, prioritize, keep_unfinished
+
+wait_policy = get_wait_policy("tgdd")
+
+
+def launch_driver():
     options = Options()
     options.add_argument('--headless')
     options.add_argument('--no-sandbox')
@@ -26,18 +47,22 @@ def setup_driver():
 
     driver = webdriver.Chrome(options=options)
 
-    return driver
+    return apply_profile(driver, "tgdd")
+
+
+def setup_driver():
+    """Trình duyệt tự tạo lại sau CRAWL_RECYCLE_PAGES trang hoặc khi vượt ngưỡng RSS"""
+    return ManagedDriver(launch_driver, "tgdd")
 
 def crawl_product_list(driver, logger, category_url): 
     driver.get(category_url)
     while True:
         try:
             # Click nút "Xem thêm"
-            view_more_button = WebDriverWait(driver, 5).until(
-                EC.element_to_be_clickable((By.CSS_SELECTOR, "div.view-more a"))
-            )
+            view_more_button = wait_policy.until(driver, EC.element_to_be_clickable((By.CSS_SELECTOR, "div.view-more a")), 5)
+            previous_count = len(driver.find_elements(By.CSS_SELECTOR, "ul.listproduct li.item"))
             driver.execute_script("arguments[0].click();", view_more_button)  # Click using JavaScript
-            time.sleep(2)  
+            wait_policy.after_load_more(driver, "ul.listproduct li.item", previous_count)
 
             show_more_btn_text = view_more_button.text.strip()
             if show_more_btn_text: 
@@ -46,20 +71,7 @@ def crawl_product_list(driver, logger, category_url):
             break 
 
     # Lấy danh sách tất cả sản phẩm sau khi đã load hết
-    product_items = driver.find_elements(By.CSS_SELECTOR, "ul.listproduct li.item")
-    products = []
-    i = 1
-    for i, item in enumerate(product_items, 1):
-        a_tags = item.find_elements(By.CSS_SELECTOR, "a.main-contain")
-        if not a_tags:
-            continue
-
-        a_tag = a_tags[0]
-        product_url = a_tag.get_attribute("href")
-        product_name = a_tag.get_attribute("data-name")
-
-        if product_name and product_url:
-            products.append({"name": product_name, "url": product_url})
+    products = extract_listing_cards(driver, "tgdd")
     logger.info(f"Tổng sản phẩm thu thập được: {len(products)}")
     return products
 
@@ -73,40 +85,14 @@ def extract_json_product_gtm(driver):
         return {}
     
 def get_brand(driver):
-    data = extract_json_product_gtm(driver)
-    brand_info = data.get("brand", {})
-    brand_name = ""
-
-    if isinstance(brand_info, dict):
-        brand_name = brand_info.get("name", "")
-        if isinstance(brand_name, list):
-            brand_name = ", ".join(brand_name)
-
-    return brand_name.strip() if brand_name else None
-
-def clean_html_value(value):
-    """Loại bỏ thẻ HTML và chỉ lấy text"""
-    if not value:
-        return ""
-    soup = BeautifulSoup(value, "html.parser")
-    return soup.get_text(separator=" ", strip=True)
+    return parse_brand(extract_json_product_gtm(driver))
 
 def get_specs(driver):
-    data = extract_json_product_gtm(driver)
-    specs_list = data.get("additionalProperty", [])
-    specs = {}
-
-    for spec in specs_list:
-        name = spec.get("name")
-        value = clean_html_value(spec.get("value", ""))
-        if name and value:
-            specs[name] = value
-
-    return specs
+    return parse_specs(extract_json_product_gtm(driver))
 
 def get_prices(driver):
     try:
-        time.sleep(2)
+        wait_policy.settle(driver, fixed=2)
         # Tìm tất cả thẻ <a> màu sắc
         color_elements = driver.find_elements(By.CSS_SELECTOR, 'div.box03.color.group.desk a')
 
@@ -116,23 +102,21 @@ def get_prices(driver):
             color_links = [(a.text.strip(), a.get_attribute('href')) for a in color_elements]
 
             for color_name, href in color_links:
-                driver.get(href)
-                time.sleep(2)
+                throttled_get(driver, href)
+                wait_policy.after_navigation(driver, fixed=2)
 
                 # Dùng regex trên page source để lấy giá
                 html = driver.page_source
-                match = re.search(r'window\.gtmViewItemV2\s*=\s*function\s*\(obj\)\s*{(.*?)};', html, re.DOTALL)
-                if match:
-                    item_match = re.search(r'item_variant:\s*"([^"]+)",\s*price:\s*([\d.]+)', match.group(1))
-                    if item_match:
-                        variant = item_match.group(1)
-                        price = float(item_match.group(2))
-                        if price != 0.0: 
-                            result.append({"color": variant, "price": price})
-                        else:
-                            json_data = extract_json_product_gtm(driver)
-                            price_from_gtm = json_data.get("offers", {}).get("price", 0.0)
-                            result.append({"color": variant, "price": price_from_gtm})
+                archive_page(href, "tgdd", "product", html)
+                variant_price = parse_variant_price(html)
+                if variant_price:
+                    variant, price = variant_price
+                    if price != 0.0: 
+                        result.append({"color": variant, "price": price})
+                    else:
+                        json_data = extract_json_product_gtm(driver)
+                        price_from_gtm = json_data.get("offers", {}).get("price", 0.0)
+                        result.append({"color": variant, "price": price_from_gtm})
             return result
         
         gtm_data = driver.execute_script("return window.gtmViewItemV2 || window.gtmAddToCartAll;")
@@ -154,46 +138,57 @@ def get_prices(driver):
         print(f"Lỗi khi lấy giá sản phẩm: {e}")
         return [{'color': 'default', 'price': 0.0}]
 
-def crawl_selected_range(start_index, end_index, df_input, category, driver, logger, df_results=None):
-    rows_to_crawl = df_input.iloc[start_index:end_index].copy()
+def crawl_selected_range(start_index, end_index, df_input, category, driver, logger):
+    """Crawl chi tiết các dòng [start_index, end_index) của df_input, mỗi bản ghi được ghi stream ngay khi xong"""
+    rows_to_crawl = df_input.iloc[start_index:end_index]
     new_results = []
 
     for index, row in rows_to_crawl.iterrows():
         logger.info(f"Thu thập dữ liệu ({index}/{len(df_input)}): {row['name']}")
         
         try:
-            driver.get(row["url"])
-            WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.TAG_NAME, "body")))
+            throttled_get(driver, row["url"])
+            wait_policy.until(driver, EC.presence_of_element_located((By.TAG_NAME, "body")), 10)
         except Exception:
             logger.warning(f"Timeout khi tải trang: {row['url']}")
             continue
 
+        archive_driver_page(driver, row["url"], "tgdd", logger=logger)
         brand_name = get_brand(driver)
         specifications = get_specs(driver)
         prices = get_prices(driver)
 
-        new_results.append({
+        record = {
             "name": row["name"],
             "url": row["url"],
             "category": category,
             "brand": brand_name,
             "specifications": specifications,
             "prices": prices,
-        })
+        }
+        new_results.append(record)
+        stream_record("tgdd", record)
 
-    new_df = pd.DataFrame(new_results)
+    logger.info(f"Đã thu thập {len(new_results)}/{len(rows_to_crawl)} sản phẩm")
+    return new_results
 
-    if df_results is None or df_results.empty:
-        df_results = new_df
-    else:
-        df_results = pd.concat([df_results, new_df]) \
-                       .drop_duplicates(subset=["url"], keep="last") \
-                       .reset_index(drop=True)
-
-    logger.info(f"Đã cập nhật {len(new_results)} dòng vào DataFrame. Tổng số dòng: {len(df_results)}")
-    return df_results
+def crawl_prices_range(start, end, rows, driver, logger):
+    """Chế độ --prices-only: chỉ lấy payload GTM giá theo màu cho các sản phẩm đã có"""
+    updates = []
+    for row in rows[start:end]:
+        try:
+            throttled_get(driver, row["url"])
+            wait_policy.until(driver, EC.presence_of_element_located((By.TAG_NAME, "body")), 10)
+        except Exception:
+            logger.warning(f"Timeout khi tải trang: {row['url']}")
+            continue
+        archive_driver_page(driver, row["url"], "tgdd", logger=logger)
+        updates.append({"url": row["url"], "prices": get_prices(driver)})
+    return updates
 
 # ======= main =======
+REQUIRED_FIELDS = ["brand", "specifications", "prices"]
+
 categories = [
     {"name": "điện thoại", "url": "https://www.thegioididong.com/dtdd", "name_file": "phone"},
     {"name": "máy tính bảng", "url": "https://www.thegioididong.com/may-tinh-bang", "name_file": "tablet"},
@@ -202,18 +197,153 @@ categories = [
     {"name": "pc", "url": "https://www.thegioididong.com/may-tinh-de-ban", "name_file": "pc"}
 ]
 
-def crawl():
+def category_key(category):
+    return category["name_file"]
+
+def output_path(category):
+    return f"data/raw/tgdd/{category['name_file']}.csv"
+
+def discover_products(category, driver, logger):
+    """Danh sách sản phẩm (name, url) của một danh mục, trả về (df_products, dữ liệu phụ)"""
+    logger.info(f"Đang lấy danh sách sản phẩm cho: {category ['name']}")
+    products = discover_listing("tgdd", category["url"], lambda: crawl_product_list(driver, logger, category["url"]), logger)
+    df_products = pd.DataFrame(products).drop_duplicates(subset=["url"], keep="last").reset_index(drop=True)
+    return df_products, {}
+
+def uses_driver_pool():
+    # Chế độ HTTP tự chạy song song bằng asyncio, không cần pool trình duyệt
+    return get_fetch_mode() != "http"
+
+def crawl_details(start, end, df_to_crawl, category, driver, logger):
+    """Crawl chi tiết các sản phẩm [start, end) của df_to_crawl, trả về list bản ghi"""
+    if get_fetch_mode() == "http":
+        return crawl_selected_range_http(start, end, df_to_crawl, category["name"], driver, logger, fallback=crawl_selected_range)
+    return crawl_selected_range(start, end, df_to_crawl, category["name"], driver, logger)
+
+def build_output(df_products, records, extra):
+    return pd.DataFrame(records)
+
+def reextract(row, category, archive):
+    """Trích xuất lại brand/specifications/prices từ HTML đã lưu trong kho, None nếu thiếu trang"""
+    html = archive.latest(row["url"])
+    json_data = parse_json_product_gtm(html) if html else None
+    if json_data is None:
+        return None
+
+    result = {"brand": parse_brand(json_data), "specifications": parse_specs(json_data)}
+    color_pages = [archive.latest(href) for _, href in parse_color_links(html, row["url"])]
+    if all(page is not None for page in color_pages):
+        result["prices"] = variant_prices_from_pages(html, json_data, color_pages)
+    return result
+
+def crawl(resume=False):
     logger = get_logger()
     logger.info("Khởi tạo trình duyệt và bắt đầu quá trình crawl")
     driver = setup_driver()
+    wait_policy.start()
+    store = CrawlStateStore()
+    run_checkpoint = SourceCheckpoint("tgdd")
+    budget = TimeBudget("tgdd")
+    run_checkpoint.start(resume)
 
     for category in categories:
-        logger.info(f"Đang lấy danh sách sản phẩm cho: {category ['name']}")
-        products = crawl_product_list(driver, logger, category ["url"])
-        df_products = pd.DataFrame(products).drop_duplicates(subset=["url"], keep="last").reset_index(drop=True)
-        detailed = crawl_selected_range(0, len(df_products), df_products, category ["name"], driver, logger)
-        output_path = f"data/raw/tgdd/{category ['name_file']}.csv"
-        detailed.to_csv(output_path, index=False)
+        key = category_key(category)
+        if resume and run_checkpoint.is_completed(key):
+            logger.info(f"Danh mục {category['name']} đã hoàn thành ở lần chạy trước, bỏ qua")
+            continue
+
+        path = output_path(category)
+        if not budget.start_category():
+            logger.info(f"Hết thời gian crawl, bỏ qua danh mục {category['name']}, giữ dữ liệu cũ")
+            continue
+
+        category_checkpoint = run_checkpoint.category(key)
+
+        def discover():
+            df_products, extra = discover_products(category, driver, logger)
+            df_to_crawl, reused = split_fresh_products(store, df_products, path, logger)
+            if budget.active:
+                # Có hạn chót: URL mới trước, rồi giá cũ nhất, cuối cùng sản phẩm lỗi / thiếu trường lần trước
+                df_to_crawl = prioritize(store, df_to_crawl)
+            return df_products, df_to_crawl, reused, extra
+
+        df_products, df_to_crawl, reused, extra = prepare_category(category_checkpoint, resume, discover, logger)
+
+        with streaming("tgdd", key, append=resume, logger=logger) as writer:
+            def crawl_rows(df_rows):
+                return crawl_range(
+                    0, len(df_rows),
+                    lambda s, e, worker_driver: crawl_details(s, e, df_rows, category, worker_driver, logger),
+                    setup_driver, driver, logger, use_pool=uses_driver_pool()
+                )
+
+            def on_records(df_rows, rows_records):
+                record_crawl_results(store, "tgdd", key, df_rows, rows_records, REQUIRED_FIELDS, logger)
+
+            # Mỗi nhóm biến thể màu / dung lượng chỉ crawl một trang đại diện (có checkpoint), sau đó nhân bản ghi.
+            # Bản ghi đầy đủ nằm trong chunk checkpoint và file stream, ở đây chỉ giữ bản tóm tắt
+            summaries = crawl_with_variant_groups(
+                "tgdd", df_to_crawl,
+                lambda df_representatives: crawl_with_checkpoint(
+                    category_checkpoint,
+                    len(df_representatives),
+                    lambda start, end: crawl_range(
+                        start, end,
+                        lambda s, e, worker_driver: crawl_details(s, e, df_representatives, category, worker_driver, logger),
+                        setup_driver, driver, logger, use_pool=uses_driver_pool()
+                    ),
+                    logger,
+                    on_chunk=lambda start, end, chunk_records: record_crawl_results(
+                        store, "tgdd", key, df_representatives.iloc[start:end], chunk_records, REQUIRED_FIELDS, logger
+                    ),
+                    budget=budget
+                ),
+                crawl_rows,
+                on_records,
+                logger,
+                budget=budget
+            )
+            summaries = retry_pending(df_to_crawl, summaries, REQUIRED_FIELDS, crawl_rows, logger, budget=budget, on_records=on_records)
+
+            if budget.exhausted:
+                reused = keep_unfinished(df_products, reused, summaries, path, logger)
+            writer.close()
+            write_category_output(
+                path, df_products, reused, category_checkpoint.chunk_paths() + [writer.path],
+                build_output, extra, REQUIRED_FIELDS, logger
+            )
+
+        # Hết thời gian giữa chừng thì giữ checkpoint để --resume crawl tiếp phần còn lại
+        if not budget.exhausted:
+            run_checkpoint.mark_completed(key)
         logger.info(f"Hoàn thành crawl dữ liệu cho danh mục {category ['name']}")
 
-    driver.quit()
\ No newline at end of file
+    driver.quit()
+    store.close()
+    wait_policy.report(logger)
+    report_limits(logger)
+    report_lifecycle(logger)
+    budget.report(logger)
+
+def crawl_prices():
+    logger = get_logger()
+    logger.info("Khởi tạo trình duyệt và bắt đầu cập nhật giá Thế Giới Di Động")
+    driver = setup_driver()
+    wait_policy.start()
+    store = CrawlStateStore()
+    use_http = get_fetch_mode() == "http"
+    fetch_range = partial(crawl_prices_range_http, fallback=crawl_prices_range) if use_http else crawl_prices_range
+
+    for category in categories:
+        refresh_category_prices(
+            "tgdd", category["name_file"], f"data/raw/tgdd/{category['name_file']}.csv",
+            lambda start, end, rows, worker_driver: fetch_range(start, end, rows, worker_driver, logger),
+            setup_driver, driver, store, logger, use_pool=not use_http
+        )
+
+    driver.quit()
+    store.close()
+    wait_policy.report(logger)
+    report_limits(logger)
+    report_lifecycle(logger)
+    logger.info("Hoàn tất cập nhật giá Thế Giới Di Động")
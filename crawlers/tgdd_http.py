@@ -0,0 +1,246 @@
+import asyncio
+import json
+import os
+import re
+from urllib.parse import urljoin
+
+import httpx
+from bs4 import BeautifulSoup
+
+from my_logger import get_logger
+from .page_archive import archive_page
+from .http_common import HEADERS, BLOCK_STATUS_CODES
+from .rate_limit import throttled_async
+from .record_writer import stream_record
+
+
+def get_fetch_mode():
+    """Chế độ lấy trang chi tiết tgdd: 'http' (mặc định) hoặc 'selenium'"""
+    return os.getenv("TGDD_FETCH_MODE", "http").lower()
+
+
+def parse_json_product_gtm(html):
+    """Đọc value của <input id="jsonProductGTM"> trực tiếp từ HTML thô"""
+    soup = BeautifulSoup(html, "html.parser")
+    input_elem = soup.find("input", id="jsonProductGTM")
+    if not input_elem or not input_elem.get("value"):
+        return None
+    try:
+        return json.loads(input_elem["value"])
+    except ValueError:
+        return None
+
+
+def parse_brand(data):
+    brand_info = data.get("brand", {})
+    brand_name = ""
+
+    if isinstance(brand_info, dict):
+        brand_name = brand_info.get("name", "")
+        if isinstance(brand_name, list):
+            brand_name = ", ".join(brand_name)
+
+    return brand_name.strip() if brand_name else None
+
+
+def clean_html_value(value):
+    """Loại bỏ thẻ HTML và chỉ lấy text"""
+    if not value:
+        return ""
+    soup = BeautifulSoup(value, "html.parser")
+    return soup.get_text(separator=" ", strip=True)
+
+
+def parse_specs(data):
+    specs_list = data.get("additionalProperty", [])
+    specs = {}
+
+    for spec in specs_list:
+        name = spec.get("name")
+        value = clean_html_value(spec.get("value", ""))
+        if name and value:
+            specs[name] = value
+
+    return specs
+
+
+def parse_variant_price(html):
+    """Lấy (item_variant, price) từ script window.gtmViewItemV2 trong HTML"""
+    match = re.search(r'window\.gtmViewItemV2\s*=\s*function\s*\(obj\)\s*{(.*?)};', html, re.DOTALL)
+    if match:
+        item_match = re.search(r'item_variant:\s*"([^"]+)",\s*price:\s*([\d.]+)', match.group(1))
+        if item_match:
+            return item_match.group(1), float(item_match.group(2))
+    return None
+
+
+def parse_color_links(html, base_url):
+    soup = BeautifulSoup(html, "html.parser")
+    return [
+        (a.get_text(strip=True), urljoin(base_url, a["href"]))
+        for a in soup.select("div.box03.color.group.desk a")
+        if a.get("href")
+    ]
+
+
+def _price_from_page(html, json_data):
+    """Giống nhánh màu sắc trong tgdd.get_prices: ưu tiên gtmViewItemV2, giá 0 thì lấy offers.price"""
+    variant_price = parse_variant_price(html)
+    if not variant_price:
+        return None
+    variant, price = variant_price
+    if price == 0.0:
+        price = (json_data or {}).get("offers", {}).get("price", 0.0)
+    return {"color": variant, "price": price}
+
+
+async def fetch_html(client, url):
+    async with throttled_async(url) as outcome:
+        response = await client.get(url)
+        outcome["blocked"] = response.status_code in BLOCK_STATUS_CODES
+        response.raise_for_status()
+    archive_page(url, "tgdd", "product", response.text)
+    return response.text
+
+
+def variant_prices_from_pages(html, json_data, color_pages):
+    """Giá theo màu từ HTML trang chính và HTML các trang màu (color_pages rỗng nếu sản phẩm không có màu)"""
+    if not color_pages:
+        price = _price_from_page(html, json_data)
+        if price is None:
+            price = {"color": "default", "price": float(json_data.get("offers", {}).get("price", 0.0))}
+        return [price]
+
+    prices = []
+    for page in color_pages:
+        price = _price_from_page(page, parse_json_product_gtm(page))
+        if price:
+            prices.append(price)
+    return prices
+
+
+async def fetch_variant_prices(client, url, html, json_data, logger):
+    """Giá theo từng màu (tải song song các trang màu), None nếu một trang màu lỗi"""
+    color_links = parse_color_links(html, url)
+    if not color_links:
+        return variant_prices_from_pages(html, json_data, [])
+
+    # Tải song song các trang màu sắc trên cùng connection pool
+    pages = await asyncio.gather(
+        *(fetch_html(client, href) for _, href in color_links),
+        return_exceptions=True
+    )
+    for (color_name, href), page in zip(color_links, pages):
+        if isinstance(page, Exception):
+            logger.warning(f"Lỗi HTTP khi tải màu {color_name} ({href}): {page}")
+            return None
+    return variant_prices_from_pages(html, json_data, pages)
+
+
+async def fetch_prices_only(client, row, logger):
+    url = row["url"]
+    try:
+        html = await fetch_html(client, url)
+    except Exception as e:
+        logger.warning(f"Lỗi HTTP khi tải trang {url}: {e}")
+        return None
+
+    json_data = parse_json_product_gtm(html)
+    if json_data is None:
+        return None
+    prices = await fetch_variant_prices(client, url, html, json_data, logger)
+    return {"url": url, "prices": prices} if prices is not None else None
+
+
+async def fetch_product(client, row, category, logger):
+    """Trả về bản ghi sản phẩm, hoặc None nếu thiếu payload cần fallback sang Selenium"""
+    url = row["url"]
+    try:
+        html = await fetch_html(client, url)
+    except Exception as e:
+        logger.warning(f"Lỗi HTTP khi tải trang {url}: {e}")
+        return None
+
+    json_data = parse_json_product_gtm(html)
+    if json_data is None:
+        logger.info(f"Không thấy jsonProductGTM trong HTML, chuyển sang Selenium: {url}")
+        return None
+
+    prices = await fetch_variant_prices(client, url, html, json_data, logger)
+    if prices is None:
+        return None
+
+    return {
+        "name": row["name"],
+        "url": url,
+        "category": category,
+        "brand": parse_brand(json_data),
+        "specifications": parse_specs(json_data),
+        "prices": prices,
+    }
+
+
+async def fetch_all(rows, fetch_one, concurrency=8, timeout=20):
+    """Chạy fetch_one(client, row) cho mọi dòng trên một AsyncClient dùng chung, giữ thứ tự"""
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async with httpx.AsyncClient(headers=HEADERS, limits=limits, timeout=timeout, follow_redirects=True) as client:
+        async def bounded(row):
+            async with semaphore:
+                return await fetch_one(client, row)
+
+        return await asyncio.gather(*(bounded(row) for row in rows))
+
+
+async def fetch_products(rows, category, logger, concurrency=8, timeout=20):
+    async def fetch_and_stream(client, row):
+        record = await fetch_product(client, row, category, logger)
+        if record is not None:
+            stream_record("tgdd", record)
+        return record
+
+    return await fetch_all(rows, fetch_and_stream, concurrency, timeout)
+
+
+def crawl_selected_range_http(start_index, end_index, df_input, category, driver, logger=None, concurrency=8, fallback=None):
+    """
+    Giống tgdd.crawl_selected_range nhưng lấy trang bằng HTTP thuần (không render Chrome).
+    Những sản phẩm thiếu payload được crawl lại bằng Selenium trên driver truyền vào qua
+    fallback(start, end, df_input, category, driver, logger) (tgdd truyền crawl_selected_range).
+    """
+    logger = logger or get_logger()
+    rows_to_crawl = df_input.iloc[start_index:end_index]
+    rows = rows_to_crawl.to_dict("records")
+
+    logger.info(f"Tải {len(rows)} sản phẩm tgdd danh mục {category} qua HTTP (concurrency={concurrency})")
+    records = asyncio.run(fetch_products(rows, category, logger, concurrency))
+
+    fallback_positions = [i for i, record in enumerate(records) if record is None]
+    if fallback_positions and fallback is not None:
+        logger.info(f"Fallback Selenium cho {len(fallback_positions)}/{len(rows)} sản phẩm")
+        for i in fallback_positions:
+            position = start_index + i
+            fallback_records = fallback(position, position + 1, df_input, category, driver, logger)
+            if fallback_records:
+                records[i] = fallback_records[0]
+
+    return [record for record in records if record is not None]
+
+
+def crawl_prices_range_http(start, end, rows, driver, logger=None, concurrency=8, fallback=None):
+    """
+    Chế độ --prices-only cho tgdd: lấy giá qua HTTP, thiếu payload thì lấy lại trên Selenium qua
+    fallback(start, end, rows, driver, logger) (tgdd truyền crawl_prices_range)
+    """
+    logger = logger or get_logger()
+    rows = rows[start:end]
+    updates = asyncio.run(fetch_all(rows, lambda client, row: fetch_prices_only(client, row, logger), concurrency))
+
+    fallback_rows = [row for row, update in zip(rows, updates) if update is None]
+    if fallback_rows and fallback is not None:
+        logger.info(f"Fallback Selenium để lấy giá cho {len(fallback_rows)}/{len(rows)} sản phẩm")
+        fallback_updates = {u["url"]: u for u in fallback(0, len(fallback_rows), fallback_rows, driver, logger)}
+        updates = [update or fallback_updates.get(row["url"]) for row, update in zip(rows, updates)]
+
+    return [update for update in updates if update is not None]
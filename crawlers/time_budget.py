@@ -0,0 +1,183 @@
+import json
+import os
+import threading
+import time
+
+import pandas as pd
+
+from my_logger import get_logger
+from .crawl_state import STATUS_OK
+
+STATE_DIR = "data/state"
+# Hệ số EWMA khi cập nhật chi phí mỗi trang từ một lượt crawl vừa xong
+COST_ALPHA = 0.3
+
+
+def _env_float(name, default):
+    try:
+        return max(0.0, float(os.getenv(name, default)))
+    except ValueError:
+        return default
+
+
+def get_deadline():
+    """Thời điểm (epoch giây) phải dừng crawl, đặt qua CRAWL_DEADLINE (main.py crawl --time-budget); None nếu không giới hạn"""
+    try:
+        return float(os.environ["CRAWL_DEADLINE"])
+    except (KeyError, ValueError):
+        return None
+
+
+def set_deadline(minutes):
+    """Đặt hạn chót vào biến môi trường để tiến trình crawl con (spawn) của từng nguồn cũng đọc được"""
+    deadline = time.time() + minutes * 60
+    os.environ["CRAWL_DEADLINE"] = str(deadline)
+    return deadline
+
+
+def get_safety_margin(default=120.0):
+    """Số giây chừa lại trước hạn chót để ghi CSV, đóng trình duyệt, cấu hình qua CRAWL_BUDGET_MARGIN_S"""
+    return _env_float("CRAWL_BUDGET_MARGIN_S", default)
+
+
+def get_default_page_cost(default=10.0):
+    """Chi phí mỗi trang (giây) khi chưa có số liệu từ lần chạy trước, cấu hình qua CRAWL_DEFAULT_PAGE_COST_S"""
+    return _env_float("CRAWL_DEFAULT_PAGE_COST_S", default)
+
+
+class TimeBudget:
+    """
+    Ngân sách thời gian crawl của một nguồn: ước lượng số giây mỗi trang chi tiết (EWMA theo các lần chạy,
+    lưu ở data/state/page_cost_<source>.json) để chỉ bắt đầu số trang còn kịp xong trước hạn chót.
+    Không có CRAWL_DEADLINE thì mọi phương thức cho qua toàn bộ.
+    """
+
+    def __init__(self, source, deadline=None, path=None):
+        self.source = source
+        self.deadline = get_deadline() if deadline is None else deadline
+        self.path = path or os.path.join(STATE_DIR, f"page_cost_{source}.json")
+        self.seconds_per_page = None
+        self.pages = 0
+        # exhausted: danh mục hiện tại đã phải bỏ bớt sản phẩm; ran_out: đã xảy ra ở bất kỳ danh mục nào
+        self.exhausted = False
+        self.ran_out = False
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, encoding="utf-8") as f:
+                    self.seconds_per_page = json.load(f).get("seconds_per_page")
+            except (OSError, ValueError, AttributeError):
+                self.seconds_per_page = None
+        self._lock = threading.Lock()
+
+    @property
+    def active(self):
+        return self.deadline is not None
+
+    def remaining(self):
+        return None if not self.active else self.deadline - time.time()
+
+    def page_cost(self):
+        return self.seconds_per_page or get_default_page_cost()
+
+    def affordable(self, pages, extra_seconds=0.0):
+        """
+        Số trang (tối đa `pages`) còn kịp crawl xong trước hạn chót sau khi chờ thêm extra_seconds, tính lại
+        theo thời gian còn lại ở mỗi lần gọi. Chỉ đánh dấu exhausted khi thực sự phải bỏ bớt trang; lần kiểm tra
+        có thời gian chờ thêm (backoff của retry) không làm các bước sau mất lượt.
+        """
+        if not self.active:
+            return pages
+        available = self.remaining() - get_safety_margin() - extra_seconds
+        count = min(pages, max(0, int(available // self.page_cost())))
+        if count < pages and not extra_seconds:
+            self.exhausted = self.ran_out = True
+        return count
+
+    def start_category(self):
+        """Gọi đầu mỗi danh mục: xóa cờ exhausted của danh mục trước, False nếu không còn kịp crawl trang nào"""
+        self.exhausted = False
+        return self.affordable(1) > 0
+
+    def observe(self, pages, seconds):
+        if pages <= 0:
+            return
+        with self._lock:
+            cost = seconds / pages
+            previous = self.seconds_per_page
+            self.seconds_per_page = cost if previous is None else previous + COST_ALPHA * (cost - previous)
+            self.pages += pages
+
+    def timed(self, pages, crawl_fn):
+        """Chạy crawl_fn() cho `pages` trang và cập nhật chi phí mỗi trang theo thời gian thực tế"""
+        started = time.perf_counter()
+        result = crawl_fn()
+        self.observe(pages, time.perf_counter() - started)
+        return result
+
+    def crawl_rows(self, df_rows, crawl_rows, logger=None):
+        """Crawl phần đầu df_rows còn kịp trong ngân sách; trả về (df các dòng đã crawl, list bản ghi)"""
+        logger = logger or get_logger()
+        count = self.affordable(len(df_rows))
+        if count < len(df_rows):
+            logger.info(f"[{self.source}] Sắp hết thời gian, chỉ crawl {count}/{len(df_rows)} sản phẩm")
+        df_rows = df_rows.iloc[:count].reset_index(drop=True)
+        if df_rows.empty:
+            return df_rows, []
+        return df_rows, self.timed(len(df_rows), lambda: crawl_rows(df_rows))
+
+    def save(self):
+        if self.seconds_per_page is None:
+            return
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"seconds_per_page": self.seconds_per_page}, f)
+        os.replace(tmp_path, self.path)
+
+    def report(self, logger):
+        """Ghi log chi phí mỗi trang / số sản phẩm bị bỏ qua và lưu ước lượng cho lần chạy sau"""
+        if self.pages:
+            logger.info(f"[{self.source}] Chi phí trung bình {self.page_cost():.1f}s/trang (EWMA)")
+        if self.ran_out:
+            logger.warning(f"[{self.source}] Hết thời gian crawl, sản phẩm còn lại để dành cho lần chạy sau")
+        try:
+            self.save()
+        except OSError as e:
+            logger.warning(f"Không lưu được chi phí mỗi trang {self.source}: {e}")
+
+
+def prioritize(store, df_to_crawl):
+    """
+    Sắp xếp sản phẩm cần crawl theo ưu tiên: URL mới (chưa có trong state store), giá cũ (crawl thành công
+    lâu nhất trước), rồi sản phẩm lỗi / thiếu trường ở lần chạy trước. Cùng mức giữ thứ tự danh sách.
+    """
+    if df_to_crawl.empty:
+        return df_to_crawl
+
+    def priority(position):
+        state = store.get(df_to_crawl["url"].iloc[position])
+        if state is None:
+            return 0, ""
+        return (1 if state["status"] == STATUS_OK else 2), state["last_fetched_at"] or ""
+
+    order = sorted(range(len(df_to_crawl)), key=priority)
+    return df_to_crawl.iloc[order].reset_index(drop=True)
+
+
+def keep_unfinished(df_products, reused, records, output_path, logger):
+    """
+    Sản phẩm chưa kịp crawl vì hết thời gian giữ bản ghi trong CSV cũ thay vì biến mất khỏi data/raw.
+    Trả về reused đã bổ sung các bản ghi đó.
+    """
+    if df_products.empty or not os.path.exists(output_path):
+        return reused
+    df_previous = pd.read_csv(output_path, encoding="utf-8")
+    if "url" not in df_previous.columns:
+        return reused
+
+    done = {record["url"] for record in list(reused) + list(records)}
+    wanted = set(df_products["url"]) - done
+    kept = list({row["url"]: row for row in df_previous.to_dict("records") if row["url"] in wanted}.values())
+    if kept:
+        logger.info(f"Giữ {len(kept)} sản phẩm chưa kịp crawl từ {output_path}")
+    return list(reused) + kept
@@ -0,0 +1,172 @@
+import os
+import re
+import unicodedata
+from urllib.parse import urlsplit
+
+from my_logger import get_logger
+from .record_writer import record_summary, stream_record
+
+STORAGE_PATTERN = re.compile(r"(\d+)\s*(gb|tb)\b")
+# "Pro+" / "13+" / "A9+" là model khác "Pro" / "13" / "A9": giữ dấu "+" thành token "plus" như slug URL
+PLUS_PATTERN = re.compile(r"\+")
+
+# Từ chỉ màu (đã bỏ dấu) thường gặp trong tên / slug sản phẩm của các nguồn
+COLOR_WORDS = {
+    "den", "trang", "xanh", "duong", "la", "ngoc", "bich", "do", "vang", "tim", "hong", "bac", "xam",
+    "nau", "cam", "kem", "titan", "nhien", "black", "white", "blue", "green", "red", "gold", "silver",
+    "gray", "grey", "pink", "purple", "yellow", "graphite", "midnight", "starlight", "natural",
+}
+
+
+def is_enabled():
+    """Gom URL biến thể (màu / dung lượng) trước khi crawl chi tiết, tắt bằng CRAWL_GROUP_VARIANTS=false"""
+    return os.getenv("CRAWL_GROUP_VARIANTS", "true").lower() not in ("0", "false", "no")
+
+
+def normalize_tokens(text):
+    """
+    Chữ thường, bỏ dấu, gộp '256 GB' thành '256gb', '+' thành token 'plus', tách theo ký tự không phải chữ/số.
+    Hậu tố như 'v2', '5g' vẫn là token riêng nên thuộc khóa họ sản phẩm.
+    """
+    text = unicodedata.normalize("NFD", str(text or "").lower().replace("đ", "d"))
+    text = "".join(ch for ch in text if unicodedata.category(ch) != "Mn")
+    text = STORAGE_PATTERN.sub(r"\1\2", text)
+    text = PLUS_PATTERN.sub(" plus ", text)
+    return [token for token in re.split(r"[^a-z0-9]+", text) if token]
+
+
+def is_variant_token(token):
+    return token in COLOR_WORDS or bool(STORAGE_PATTERN.fullmatch(token))
+
+
+def url_slug(url):
+    path = urlsplit(url).path.rstrip("/")
+    return re.sub(r"\.html?$", "", path.rsplit("/", 1)[-1])
+
+
+def family_keys(name, url):
+    """Khóa họ sản phẩm theo tên và theo slug URL sau khi bỏ các token màu / dung lượng"""
+    keys = []
+    for kind, text in (("name", name), ("slug", url_slug(url))):
+        family = " ".join(token for token in normalize_tokens(text) if not is_variant_token(token))
+        if family:
+            keys.append((kind, family))
+    return keys
+
+
+def variant_tokens(name, url):
+    return {token for token in normalize_tokens(f"{name} {url_slug(url)}") if is_variant_token(token)}
+
+
+def storage_tokens(name, url):
+    return {token for token in variant_tokens(name, url) if STORAGE_PATTERN.fullmatch(token)}
+
+
+def group_variants(df_to_crawl):
+    """
+    Gom các dòng cùng họ sản phẩm (trùng khóa tên hoặc khóa slug). Trả về list nhóm, mỗi nhóm là list
+    vị trí trong df_to_crawl theo thứ tự danh sách; phần tử đầu là đại diện được crawl.
+    """
+    parent = list(range(len(df_to_crawl)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    owner = {}
+    for i, row in enumerate(df_to_crawl[["name", "url"]].itertuples(index=False)):
+        for key in family_keys(row.name, row.url):
+            if key in owner:
+                parent[find(i)] = find(owner[key])
+            else:
+                owner[key] = i
+
+    groups = {}
+    for i in range(len(df_to_crawl)):
+        groups.setdefault(find(i), []).append(i)
+    return sorted(groups.values(), key=lambda members: members[0])
+
+
+def covers(record, member_name, member_url, representative_name, representative_url):
+    """
+    Bản ghi của đại diện (cả specifications) chỉ dùng được cho thành viên mà trang đại diện chứng minh là
+    biến thể màu của chính nó: cùng token dung lượng (RAM / bộ nhớ quyết định specifications), thành viên có
+    token màu riêng và mọi token đó nằm trong nhãn biến thể của bảng giá đại diện (giá theo màu lấy từ cùng
+    một trang). Dung lượng khác, hoặc trùng tên mà không có token phân biệt (SKU khác), đều crawl riêng.
+    """
+    if storage_tokens(member_name, member_url) != storage_tokens(representative_name, representative_url):
+        return False
+    own_tokens = variant_tokens(member_name, member_url) - variant_tokens(representative_name, representative_url)
+    prices = record.get("prices")
+    labels = " ".join(str(price.get("color", "")) for price in prices if isinstance(price, dict)) \
+        if isinstance(prices, list) else ""
+    return bool(own_tokens) and own_tokens <= set(normalize_tokens(labels))
+
+
+def crawl_with_variant_groups(source, df_to_crawl, crawl_representatives, crawl_rows, on_records, logger=None, budget=None,
+                              chunk_size=50):
+    """
+    Crawl một đại diện cho mỗi nhóm biến thể rồi nhân bản ghi ra các thành viên được bao phủ.
+    - crawl_representatives(df_representatives) -> iterable bản ghi (bước crawl chính, có checkpoint);
+    - crawl_rows(df_rows) -> list bản ghi, dùng cho thành viên không được bao phủ hoặc đại diện lỗi;
+    - on_records(df_rows, records) ghi nhận bản ghi nhân bản / crawl thêm vào state store;
+    - budget (TimeBudget): chỉ crawl số thành viên không được bao phủ còn kịp trước hạn chót.
+    Bản ghi đầy đủ chỉ đi qua từng đoạn chunk_size (và được ghi vào stream); trả về list record_summary
+    theo thứ tự df_to_crawl.
+    """
+    logger = logger or get_logger()
+    if not is_enabled() or df_to_crawl.empty:
+        return [record_summary(record) for record in crawl_representatives(df_to_crawl)]
+
+    groups = group_variants(df_to_crawl)
+    group_of = {df_to_crawl["url"].iloc[members[0]]: members for members in groups}
+    df_representatives = df_to_crawl.iloc[[members[0] for members in groups]].reset_index(drop=True)
+    logger.info(f"Gom {len(df_to_crawl)} sản phẩm thành {len(groups)} nhóm biến thể, crawl {len(groups)} trang đại diện")
+
+    by_url = {}
+    expanded_count = 0
+    pending_positions, pending_records = [], []
+
+    def flush_expanded():
+        nonlocal pending_positions, pending_records
+        if pending_positions:
+            on_records(df_to_crawl.iloc[pending_positions].reset_index(drop=True), pending_records)
+        pending_positions, pending_records = [], []
+
+    for record in crawl_representatives(df_representatives):
+        by_url[record["url"]] = record_summary(record)
+        members = group_of.get(record["url"], [])
+        representative = df_to_crawl.iloc[members[0]] if members else None
+        for position in members[1:]:
+            member = df_to_crawl.iloc[position]
+            if not covers(record, member["name"], member["url"], representative["name"], representative["url"]):
+                continue
+            expanded = {**record, "name": member["name"], "url": member["url"]}
+            stream_record(source, expanded)
+            by_url[expanded["url"]] = record_summary(expanded)
+            pending_positions.append(position)
+            pending_records.append(expanded)
+            expanded_count += 1
+        if len(pending_positions) >= chunk_size:
+            flush_expanded()
+    flush_expanded()
+
+    uncovered = [position for members in groups for position in members[1:] if df_to_crawl["url"].iloc[position] not in by_url]
+    if uncovered:
+        logger.info(f"{len(uncovered)} biến thể không được trang đại diện bao phủ, crawl riêng")
+        df_uncovered = df_to_crawl.iloc[uncovered].reset_index(drop=True)
+        for start in range(0, len(df_uncovered), chunk_size):
+            df_chunk = df_uncovered.iloc[start:start + chunk_size].reset_index(drop=True)
+            if budget is not None:
+                df_done, chunk_records = budget.crawl_rows(df_chunk, crawl_rows, logger)
+            else:
+                df_done, chunk_records = df_chunk, crawl_rows(df_chunk)
+            on_records(df_done, chunk_records)
+            by_url.update((record["url"], record_summary(record)) for record in chunk_records)
+            if len(df_done) < len(df_chunk):
+                break
+
+    logger.info(f"Nhân bản ghi cho {expanded_count} biến thể, tiết kiệm {expanded_count}/{len(df_to_crawl)} lượt tải trang")
+    return [by_url[url] for url in df_to_crawl["url"] if url in by_url]
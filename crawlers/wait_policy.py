@@ -0,0 +1,213 @@
+import os
+import threading
+import time
+
+from selenium.common.exceptions import TimeoutException
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support.ui import WebDriverWait
+
+# Ghi nhận thời điểm DOM thay đổi lần cuối bằng MutationObserver, trả về số ms đã yên lặng
+DOM_QUIET_JS = """
+if (!window.__crawlWaitObserver) {
+    window.__crawlLastMutation = performance.now();
+    window.__crawlWaitObserver = new MutationObserver(function () {
+        window.__crawlLastMutation = performance.now();
+    });
+    window.__crawlWaitObserver.observe(document, {childList: true, subtree: true, attributes: true, characterData: true});
+}
+return performance.now() - window.__crawlLastMutation;
+"""
+
+RESOURCE_COUNT_JS = "return performance.getEntriesByType('resource').length;"
+
+# Nút biến thể (màu, dung lượng) đang ở trạng thái được chọn: thuộc tính aria hoặc class *active / *selected
+SELECTED_JS = r"""
+var el = arguments[0];
+return ['aria-pressed', 'aria-selected', 'aria-checked'].some(function (name) { return el.getAttribute(name) === 'true'; })
+    || /(^|[\s_-])(active|selected|checked)/i.test(el.className || '');
+"""
+
+
+class WaitPolicy:
+    """
+    Chính sách chờ dùng chung cho các crawler, thay cho time.sleep cố định.
+    strategy: 'dom' (DOM yên lặng), 'network' (không còn request mới) hoặc 'fixed' (sleep như cũ).
+    Đồng thời cộng dồn thời gian chờ để báo cáo; một nguồn dùng chung policy cho mọi luồng của pool
+    nên thời gian chờ là tổng của các luồng, có thể lớn hơn thời gian thực.
+    """
+
+    def __init__(self, source, strategy=None, quiet_ms=None, timeout=None):
+        self.source = source
+        self.strategy = (strategy or os.getenv("CRAWL_WAIT_STRATEGY", "dom")).lower()
+        self.quiet_ms = quiet_ms if quiet_ms is not None else int(os.getenv("CRAWL_WAIT_QUIET_MS", "500"))
+        self.timeout = timeout if timeout is not None else float(os.getenv("CRAWL_WAIT_TIMEOUT", "10"))
+        self.wait_seconds = 0.0
+        self.wait_count = 0
+        self.started_at = None
+        self.threads = set()
+        self._lock = threading.Lock()
+
+    def _record(self, started):
+        with self._lock:
+            if self.started_at is None:
+                self.started_at = started
+            self.wait_seconds += time.perf_counter() - started
+            self.wait_count += 1
+            self.threads.add(threading.get_ident())
+
+    def start(self):
+        with self._lock:
+            self.started_at = time.perf_counter()
+            self.wait_seconds = 0.0
+            self.wait_count = 0
+            self.threads = set()
+
+    # ===== Các chiến lược chờ cơ bản =====
+    def sleep(self, seconds):
+        started = time.perf_counter()
+        time.sleep(seconds)
+        self._record(started)
+
+    def until(self, driver, condition, timeout=None):
+        """Bọc WebDriverWait(...).until để tính thời gian chờ; vẫn ném TimeoutException như cũ"""
+        started = time.perf_counter()
+        try:
+            return WebDriverWait(driver, timeout or self.timeout).until(condition)
+        finally:
+            self._record(started)
+
+    def dom_quiet(self, driver, quiet_ms=None, timeout=None):
+        quiet_ms = quiet_ms or self.quiet_ms
+        started = time.perf_counter()
+        try:
+            WebDriverWait(driver, timeout or self.timeout, poll_frequency=0.1).until(
+                lambda d: d.execute_script(DOM_QUIET_JS) >= quiet_ms
+            )
+        except TimeoutException:
+            pass
+        finally:
+            self._record(started)
+
+    def network_idle(self, driver, idle_ms=None, timeout=None):
+        idle_seconds = (idle_ms or self.quiet_ms) / 1000
+        started = time.perf_counter()
+        deadline = started + (timeout or self.timeout)
+        last_count, last_change = -1, started
+        try:
+            while time.perf_counter() < deadline:
+                count = driver.execute_script(RESOURCE_COUNT_JS)
+                now = time.perf_counter()
+                if count != last_count:
+                    last_count, last_change = count, now
+                elif now - last_change >= idle_seconds:
+                    break
+                time.sleep(0.1)
+        finally:
+            self._record(started)
+
+    def count_changed(self, driver, css_selector, previous_count, timeout=None):
+        """Chờ số phần tử khớp css_selector khác previous_count, trả về số lượng mới"""
+        def changed(d):
+            count = len(d.find_elements(By.CSS_SELECTOR, css_selector))
+            return count if count != previous_count else False
+
+        started = time.perf_counter()
+        try:
+            return WebDriverWait(driver, timeout or self.timeout, poll_frequency=0.2).until(changed)
+        except TimeoutException:
+            return previous_count
+        finally:
+            self._record(started)
+
+    def text_changed_or_selected(self, driver, element, css_selector, previous_text, timeout=None):
+        """
+        Chờ text phần tử đầu tiên khớp css_selector khác previous_text ('changed') hoặc element được đánh dấu
+        đã chọn ('selected'); hết timeout thì trả về None
+        """
+        def ready(d):
+            elements = d.find_elements(By.CSS_SELECTOR, css_selector)
+            text = elements[0].text.strip() if elements else ""
+            if text and text != previous_text:
+                return "changed"
+            return "selected" if d.execute_script(SELECTED_JS, element) else False
+
+        started = time.perf_counter()
+        try:
+            return WebDriverWait(driver, timeout or self.timeout, poll_frequency=0.2).until(ready)
+        except TimeoutException:
+            return None
+        finally:
+            self._record(started)
+
+    # ===== Các điểm chờ dùng trong crawler =====
+    def settle(self, driver, fixed=2):
+        """
+        Chờ trang ổn định sau một thao tác (click, đổi màu, ...) theo chiến lược đã cấu hình.
+        Không chờ lâu hơn fixed giây (mức sleep cố định cũ): trang có banner / đồng hồ đếm ngược làm DOM
+        không bao giờ yên lặng thì dừng ở mức cũ thay vì chờ hết timeout.
+        """
+        if self.strategy == "fixed":
+            self.sleep(fixed)
+        elif self.strategy == "network":
+            self.network_idle(driver, timeout=min(fixed, self.timeout))
+        else:
+            self.dom_quiet(driver, timeout=min(fixed, self.timeout))
+
+    def after_navigation(self, driver, fixed=3):
+        """Thay cho time.sleep sau driver.get: chờ readyState rồi chờ trang ổn định"""
+        if self.strategy == "fixed":
+            self.sleep(fixed)
+            return
+        try:
+            self.until(driver, lambda d: d.execute_script("return document.readyState") == "complete")
+        except TimeoutException:
+            pass
+        self.settle(driver, fixed)
+
+    def after_load_more(self, driver, css_selector, previous_count, fixed=2):
+        """Sau khi bấm 'Xem thêm': chờ số sản phẩm thay đổi thay vì ngủ cố định"""
+        if self.strategy == "fixed":
+            self.sleep(fixed)
+            return len(driver.find_elements(By.CSS_SELECTOR, css_selector))
+        return self.count_changed(driver, css_selector, previous_count)
+
+    def after_select(self, driver, element, css_selector, previous_text, fixed=5):
+        """
+        Sau khi click chọn biến thể: chờ giá (css_selector) khác giá trước khi click, giống after_load_more chờ
+        số sản phẩm đổi. Hai biến thể cùng giá thì text không đổi: chờ nút được chọn rồi chờ DOM yên lặng.
+        """
+        if self.strategy == "fixed":
+            self.sleep(fixed)
+            return
+        if self.text_changed_or_selected(driver, element, css_selector, previous_text) != "changed":
+            self.dom_quiet(driver, timeout=min(fixed, self.timeout))
+
+    def report(self, logger):
+        if self.started_at is None:
+            return
+        elapsed = time.perf_counter() - self.started_at
+        with self._lock:
+            wait_seconds, wait_count, thread_count = self.wait_seconds, self.wait_count, len(self.threads)
+        if thread_count <= 1:
+            logger.info(
+                f"[{self.source}] Thời gian chờ: {wait_seconds:.1f}s ({wait_count} lần), "
+                f"làm việc: {max(elapsed - wait_seconds, 0.0):.1f}s, tổng: {elapsed:.1f}s, chiến lược: {self.strategy}"
+            )
+        else:
+            # Nhiều luồng chờ song song: tổng thời gian chờ không trừ được khỏi thời gian thực
+            logger.info(
+                f"[{self.source}] Thời gian chờ cộng {thread_count} luồng: {wait_seconds:.1f}s ({wait_count} lần), "
+                f"thời gian thực: {elapsed:.1f}s, chiến lược: {self.strategy}"
+            )
+
+
+_policies = {}
+_policies_lock = threading.Lock()
+
+
+def get_wait_policy(source):
+    """Mỗi nguồn dùng chung một WaitPolicy để thống kê chờ / làm việc theo nguồn"""
+    with _policies_lock:
+        if source not in _policies:
+            _policies[source] = WaitPolicy(source)
+        return _policies[source]
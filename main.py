@@ -1,5 +1,7 @@
 import os
 import ast
+import argparse
+import sys
 import datetime
 import re
 import json
@@ -10,16 +12,35 @@ from firebase_admin import credentials, firestore
 
 from my_logger import init_logger, get_logger
 from crawlers import cellphoneS, fpt, tgdd
+from crawlers.crawl_state import CrawlStateStore
+from crawlers import shards
+from crawlers.reextract import reextract
+from crawlers.orchestrator import crawl_concurrently
+from crawlers.time_budget import set_deadline
 from preprocess import clean_data, merge_data, generate_features
 
-# Đường dẫn đến file key JSON bạn tải về
-cred = credentials.Certificate('data-chatbot-products-firebase.json')
+CRAWLERS = {
+    "tgdd": tgdd,
+    "fpt": fpt,
+    "cellphones": cellphoneS,
+}
 
-# Khởi tạo app Firebase
-firebase_admin.initialize_app(cred)
+db = None
 
-# Khởi tạo client Firestore
-db = firestore.client()
+def init_firestore():
+    global db
+    if db is not None:
+        return db
+
+    # Đường dẫn đến file key JSON bạn tải về
+    cred = credentials.Certificate('data-chatbot-products-firebase.json')
+
+    # Khởi tạo app Firebase
+    firebase_admin.initialize_app(cred)
+
+    # Khởi tạo client Firestore
+    db = firestore.client()
+    return db
 
 def load_raw_data(source_dir: str):
     """Đọc toàn bộ csv trong thư mục theo cấu trúc `data/raw/<source>/<category>.csv`"""
@@ -41,20 +62,29 @@ def is_value_na(v):
     else:
         return pd.isna(v)
 
-def upload_df_to_firestore(df: pd.DataFrame, collection_name: str, logger=None):
+def upload_df_to_firestore(df: pd.DataFrame, collection_name: str, logger=None, store=None):
+    skipped = 0
     for idx, row in df.iterrows():
         data_dict = row.to_dict()
         for k, v in data_dict.items():
             if is_value_na(v):
                 data_dict[k] = None
+        # Bỏ qua document có nội dung giống hệt lần upload trước
+        if store is not None and not store.upload_changed(collection_name, str(idx), data_dict):
+            skipped += 1
+            continue
         try:
             doc_ref = db.collection(collection_name).document(str(idx))
             doc_ref.set(data_dict)
+            if store is not None:
+                store.mark_uploaded(collection_name, str(idx), data_dict)
             if logger:
                 logger.info(f"Uploaded doc {idx} to collection '{collection_name}'")
         except Exception as e:
             if logger:
                 logger.error(f"Error uploading doc {idx} to Firestore: {e}")
+    if logger and skipped:
+        logger.info(f"Bỏ qua {skipped} doc không thay đổi trong collection '{collection_name}'")
 
 # Cột cần convert (ví dụ: "features")
 list_like_columns = ["features", "image_links", "needs"]
@@ -78,7 +108,7 @@ def parse_prices_column(prices_dict):
         print("Lỗi khi parse:", e)
         return None
     
-def main():
+def setup_logging():
     log_dir = 'logs'
     os.makedirs(log_dir, exist_ok=True)
 
@@ -86,7 +116,32 @@ def main():
     log_file = os.path.join(log_dir, f'{now}.log')
 
     init_logger(log_file)
+    return get_logger()
+
+def run_crawl(sources, prices_only=False, resume=False, sequential=False):
+    """Crawl các nguồn; mặc định mỗi nguồn một tiến trình song song. Trả về True nếu mọi nguồn thành công"""
     logger = get_logger()
+    mode = "CẬP NHẬT GIÁ" if prices_only else "CRAWL"
+    logger.info(f"== BẮT ĐẦU {mode} CÁC NGUỒN: {', '.join(sources)} ==")
+
+    if not sequential and len(sources) > 1:
+        statuses = crawl_concurrently(CRAWLERS, sources, prices_only=prices_only, resume=resume)
+        logger.info(f"== HOÀN TẤT {mode} ==")
+        return all(status["status"] == "ok" for status in statuses.values())
+
+    for source in sources:
+        crawler = CRAWLERS[source]
+        logger.info(f">>> Bắt đầu {'cập nhật giá' if prices_only else 'crawl'} từ {source}")
+        if prices_only:
+            crawler.crawl_prices()
+        else:
+            crawler.crawl(resume=resume)
+    logger.info(f"== HOÀN TẤT {mode} ==")
+    return True
+
+def process():
+    logger = get_logger()
+    init_firestore()
 
     logger.info("== BẮT ĐẦU TOÀN BỘ QUÁ TRÌNH CRAWL ==")
 
@@ -107,6 +162,14 @@ def main():
     sources = ["cellphones", "fpt", "tgdd"]
     categories = ["phone", "laptop", "tablet", "monitor", "pc"]
 
+    # Chỉ xử lý các danh mục có sản phẩm thay đổi kể từ lần xử lý trước
+    store = CrawlStateStore()
+    if os.getenv("FORCE_PROCESS", "false").lower() != "true":
+        unchanged = [cat for cat in categories if not store.category_changed(cat)]
+        for cat in unchanged:
+            logger.info(f"Danh mục {cat} không có sản phẩm thay đổi, bỏ qua làm sạch/gộp/upload")
+        categories = [cat for cat in categories if cat not in unchanged]
+
     # Load raw data
     raw_data = {}
     for source in sources:
@@ -170,10 +233,81 @@ def main():
     os.makedirs(output_dir, exist_ok=True)
     for cat in categories:
         output_path = f"{output_dir}/{cat}.csv"
-        upload_df_to_firestore(generated_data[cat], cat, logger)
+        upload_df_to_firestore(generated_data[cat], cat, logger, store)
         merged_data[cat].to_csv(output_path, index=False, encoding="utf-8")
+        store.mark_processed(cat)
+    store.close()
     logger.info("== HOÀN THÀNH QUÁ TRÌNH XỬ LÝ DỮ LIỆU ==")
 
 
+def shard_arg(text):
+    try:
+        return shards.parse_shard(text)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Crawl và xử lý dữ liệu sản phẩm")
+    subparsers = parser.add_subparsers(dest="command")
+
+    subparsers.add_parser("process", help="Làm sạch, gộp, sinh features và upload (mặc định)")
+
+    crawl_parser = subparsers.add_parser("crawl", help="Crawl dữ liệu từ các nguồn")
+    crawl_parser.add_argument("--source", nargs="+", choices=list(CRAWLERS), default=list(CRAWLERS))
+    crawl_parser.add_argument("--prices-only", action="store_true",
+                              help="Chỉ cập nhật giá/biến thể cho sản phẩm đã có trong data/raw")
+    crawl_parser.add_argument("--resume", action="store_true",
+                              help="Tiếp tục lần crawl bị ngắt từ checkpoint trong data/checkpoints")
+    crawl_parser.add_argument("--sequential", action="store_true",
+                              help="Crawl lần lượt từng nguồn thay vì mỗi nguồn một tiến trình song song")
+    crawl_parser.add_argument("--plan", action="store_true",
+                              help="Chỉ duyệt danh sách sản phẩm và chia work unit vào data/shards/plan.json")
+    crawl_parser.add_argument("--shard", type=shard_arg, metavar="k/N",
+                              help="Chỉ crawl các work unit của shard k trên tổng N shard (cần plan.json)")
+    crawl_parser.add_argument("--time-budget", type=float, metavar="MINUTES",
+                              help="Dừng crawl trước MINUTES phút (ưu tiên URL mới, giá cũ, sản phẩm thiếu trường) "
+                                   "rồi chạy luôn bước xử lý và upload với dữ liệu đã có")
+
+    subparsers.add_parser("merge-shards", help="Gộp kết quả các shard thành data/raw/<source>/<category>.csv")
+
+    reextract_parser = subparsers.add_parser("reextract", help="Trích xuất lại data/raw từ kho HTML trong data/archive")
+    reextract_parser.add_argument("--source", nargs="+", choices=list(CRAWLERS), default=list(CRAWLERS))
+    reextract_parser.add_argument("--workers", type=int, help="Số tiến trình (mặc định: REEXTRACT_WORKERS hoặc số CPU)")
+
+    args = parser.parse_args()
+    setup_logging()
+
+    if args.command == "crawl" and args.plan:
+        shards.build_plan(CRAWLERS, args.source)
+    elif args.command == "crawl" and args.shard:
+        shards.run_shard(CRAWLERS, *args.shard)
+    elif args.command == "crawl" and args.time_budget:
+        deadline = set_deadline(args.time_budget)
+        get_logger().info(f"Giới hạn thời gian crawl {args.time_budget:g} phút, hạn chót {datetime.datetime.fromtimestamp(deadline):%H:%M:%S}")
+        crawled = run_crawl(args.source, prices_only=args.prices_only, resume=args.resume, sequential=args.sequential)
+        # Phần đã crawl xong đều đã ghi vào data/raw, vẫn xử lý / upload kể cả khi có nguồn lỗi
+        process()
+        if not crawled:
+            sys.exit(1)
+    elif args.command == "crawl":
+        if not run_crawl(args.source, prices_only=args.prices_only, resume=args.resume, sequential=args.sequential):
+            sys.exit(1)
+    elif args.command == "merge-shards":
+        store = CrawlStateStore()
+        try:
+            shards.merge_shards(CRAWLERS, store=store)
+        finally:
+            store.close()
+    elif args.command == "reextract":
+        store = CrawlStateStore()
+        try:
+            reextract(CRAWLERS, args.source, workers=args.workers, store=store)
+        finally:
+            store.close()
+    else:
+        process()
+
+
 if __name__ == '__main__':
     main()
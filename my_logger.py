@@ -2,12 +2,17 @@ import logging
 
 _logger = None
 
-def init_logger(log_file_path=None):
+def init_logger(log_file_path=None, tag=None):
     global _logger
     _logger = logging.getLogger("crawler")
     _logger.setLevel(logging.INFO)
+    # Gọi lại (vd: trong tiến trình con) thì thay handler cũ thay vì ghi trùng
+    for handler in list(_logger.handlers):
+        _logger.removeHandler(handler)
+        handler.close()
 
-    formatter = logging.Formatter('[%(asctime)s] [%(levelname)s] %(message)s')
+    prefix = f'[{tag}] ' if tag else ''
+    formatter = logging.Formatter(f'[%(asctime)s] [%(levelname)s] {prefix}%(message)s')
 
     handlers = [logging.StreamHandler()]
     if log_file_path:
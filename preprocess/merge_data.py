@@ -1,6 +1,8 @@
 import pandas as pd
 import ast
 import re
+import time
+from collections import defaultdict, deque
 from my_logger import get_logger
 
 def clean_name_for_extract(name): 
@@ -324,11 +326,93 @@ def create_merged_record(cp_row, fpt_row=None, tgdd_row=None):
 def get_embedding(text, model):
     return model.encode([text])[0]
 
-def merge_product_df(cellphones, fpt, tgdd, category):
-    logger = get_logger()
-    merged_data = []
+def _match_name(row):
+    return row['name'].strip().lower()
+
+def _match_key(row):
+    info = row['info']
+    return (str(row['brand']).lower(), info['model'], info['ram'], info['storage'])
+
+def match_legacy(cellphones, fpt, tgdd):
+    """Ghép cặp kiểu cũ: duyệt toàn bộ fpt/tgdd cho từng dòng CellphoneS (O(n·m))"""
     used_fpt_ids = set()
     used_tgdd_ids = set()
+    matches = []
+
+    def find(df, used_ids, cp_name, cp_key):
+        # Match theo tên hoàn toàn trùng khớp
+        for idx, row in df.iterrows():
+            if idx in used_ids:
+                continue
+            if _match_name(row) == cp_name:
+                used_ids.add(idx)
+                return idx
+
+        # Nếu chưa match tên thì dùng model, ram, storage
+        for idx, row in df.iterrows():
+            if idx in used_ids:
+                continue
+            if _match_key(row) == cp_key:
+                used_ids.add(idx)
+                return idx
+        return None
+
+    for _, cp_row in cellphones.iterrows():
+        cp_name = _match_name(cp_row)
+        cp_key = _match_key(cp_row)
+        fpt_idx = find(fpt, used_fpt_ids, cp_name, cp_key)
+        tgdd_idx = find(tgdd, used_tgdd_ids, cp_name, cp_key)
+        matches.append((fpt_idx, tgdd_idx))
+
+    return matches
+
+class MatchIndex:
+    """Chỉ mục băm theo tên chuẩn hóa và (brand, model, ram, storage) của một nguồn"""
+
+    def __init__(self, df):
+        self.used_ids = set()
+        self.by_name = defaultdict(deque)
+        self.by_key = defaultdict(deque)
+        # Giữ đúng thứ tự dòng trong df để kết quả giống hệt cách duyệt tuần tự
+        for idx, row in df.iterrows():
+            self.by_name[_match_name(row)].append(idx)
+            self.by_key[_match_key(row)].append(idx)
+
+    def _take(self, buckets, key):
+        bucket = buckets.get(key)
+        if not bucket:
+            return None
+        # Bỏ các id đã được dùng (qua tên hoặc qua key) ở đầu hàng đợi
+        while bucket and bucket[0] in self.used_ids:
+            bucket.popleft()
+        if not bucket:
+            return None
+        idx = bucket.popleft()
+        self.used_ids.add(idx)
+        return idx
+
+    def take(self, name, key):
+        idx = self._take(self.by_name, name)
+        if idx is None:
+            idx = self._take(self.by_key, key)
+        return idx
+
+def match_indexed(cellphones, fpt, tgdd):
+    """Ghép cặp tham lam một-một giống match_legacy nhưng dùng chỉ mục băm (gần tuyến tính)"""
+    fpt_index = MatchIndex(fpt)
+    tgdd_index = MatchIndex(tgdd)
+    matches = []
+
+    for _, cp_row in cellphones.iterrows():
+        cp_name = _match_name(cp_row)
+        cp_key = _match_key(cp_row)
+        matches.append((fpt_index.take(cp_name, cp_key), tgdd_index.take(cp_name, cp_key)))
+
+    return matches
+
+def merge_product_df(cellphones, fpt, tgdd, category, use_index=True, verify_legacy=False):
+    logger = get_logger()
+    merged_data = []
 
     def preprocess(df):
         df = df.copy()
@@ -351,62 +435,28 @@ def merge_product_df(cellphones, fpt, tgdd, category):
     print("-------------------------------------Extract CellphoneS-------------------------------------")
     cellphones = preprocess(cellphones)
 
-    for i, cp_row in cellphones.iterrows():
-        cp_info = cp_row['info']
-        cp_brand = cp_row['brand'].lower()
-        cp_name = cp_row['name'].strip().lower()
+    start_time = time.perf_counter()
+    matches = match_indexed(cellphones, fpt, tgdd) if use_index else match_legacy(cellphones, fpt, tgdd)
+    logger.info(f"Ghép cặp {len(cellphones)} sản phẩm danh mục {category} ({'index' if use_index else 'legacy'}) mất {time.perf_counter() - start_time:.2f}s")
 
-        fpt_match, tgdd_match = None, None
-
-        # === FPT: Match theo tên hoàn toàn trùng khớp ===
-        for idx, row in fpt.iterrows():
-            if idx in used_fpt_ids:
-                continue
-            if row['name'].strip().lower() == cp_name:
-                fpt_match = row
-                used_fpt_ids.add(idx)
-                break
-
-        # Nếu chưa match tên thì dùng model, ram, storage
-        if fpt_match is None:
-            for idx, row in fpt.iterrows():
-                if idx in used_fpt_ids:
-                    continue
-                row_info = row['info']
-                if (
-                    row['brand'].lower() == cp_brand and
-                    row_info['model'] == cp_info['model'] and
-                    row_info['ram'] == cp_info['ram'] and
-                    row_info['storage'] == cp_info['storage']
-                ):
-                    fpt_match = row
-                    used_fpt_ids.add(idx)
-                    break
-
-        # === TGDD: Match theo tên hoàn toàn trùng khớp ===
-        for idx, row in tgdd.iterrows():
-            if idx in used_tgdd_ids:
-                continue
-            if row['name'].strip().lower() == cp_name:
-                tgdd_match = row
-                used_tgdd_ids.add(idx)
-                break
+    # So sánh kết quả với cách ghép cũ để kiểm chứng
+    if verify_legacy:
+        other = match_legacy(cellphones, fpt, tgdd) if use_index else match_indexed(cellphones, fpt, tgdd)
+        diff_count = sum(1 for a, b in zip(matches, other) if a != b)
+        if diff_count:
+            logger.warning(f"Kết quả ghép cặp index và legacy lệch nhau ở {diff_count} sản phẩm danh mục {category}")
+        else:
+            logger.info(f"Kết quả ghép cặp index và legacy trùng khớp cho danh mục {category}")
 
-        # Nếu chưa match tên thì dùng model, ram, storage
-        if tgdd_match is None:
-            for idx, row in tgdd.iterrows():
-                if idx in used_tgdd_ids:
-                    continue
-                row_info = row['info']
-                if (
-                    row['brand'].lower() == cp_brand and
-                    row_info['model'] == cp_info['model'] and
-                    row_info['ram'] == cp_info['ram'] and
-                    row_info['storage'] == cp_info['storage']
-                ):
-                    tgdd_match = row
-                    used_tgdd_ids.add(idx)
-                    break
+    used_fpt_ids = set()
+    used_tgdd_ids = set()
+    for (_, cp_row), (fpt_idx, tgdd_idx) in zip(cellphones.iterrows(), matches):
+        fpt_match = fpt.loc[fpt_idx] if fpt_idx is not None else None
+        tgdd_match = tgdd.loc[tgdd_idx] if tgdd_idx is not None else None
+        if fpt_idx is not None:
+            used_fpt_ids.add(fpt_idx)
+        if tgdd_idx is not None:
+            used_tgdd_ids.add(tgdd_idx)
 
         logger.info(f"CellphoneS: {cp_row['name']} --- {cp_row['info']}")
         logger.info(f"Matched FPT {fpt_match['name']}  --- {cp_row['info']}" if fpt_match is not None else "Unmatched FPT")
@@ -0,0 +1,28 @@
+import time
+
+from lxml import html as lxml_html
+
+from crawlers.cellphoneS_html import extract_product_from_html, parse_nuxt_state
+
+
+def page(script):
+    return f"<html><body><script>window.__NUXT__={script};</script></body></html>"
+
+
+def test_nuxt_iife_is_evaluated():
+    tree = lxml_html.fromstring(page("(function(a){return {state: {sku: a}}}('X1'))"))
+    assert parse_nuxt_state(tree) == {"state": {"sku": "X1"}}
+
+
+def test_nuxt_script_over_time_limit_falls_back(monkeypatch):
+    monkeypatch.setenv("CELLPHONES_NUXT_JS_TIME_LIMIT_S", "0.2")
+    started = time.monotonic()
+    # None: cellphoneS chuyển trang này sang fallback Selenium
+    assert extract_product_from_html(page("(function(){while(true){}}())")) is None
+    assert time.monotonic() - started < 5
+
+
+def test_nuxt_script_over_memory_limit_falls_back(monkeypatch):
+    monkeypatch.setenv("CELLPHONES_NUXT_JS_MEMORY_MB", "8")
+    script = "(function(){var a=[]; while(true){a.push(new Array(10000).fill(1))}}())"
+    assert parse_nuxt_state(lxml_html.fromstring(page(script))) is None
@@ -0,0 +1,46 @@
+import logging
+
+import pandas as pd
+
+from crawlers.checkpoint import CategoryCheckpoint, prepare_category
+
+logger = logging.getLogger(__name__)
+
+
+def make_discover(urls, calls):
+    def discover():
+        calls.append(1)
+        df = pd.DataFrame({"name": [url.rsplit("/", 1)[-1] for url in urls], "url": urls})
+        return df, df, [], {}
+    return discover
+
+
+def test_resume_reuses_checkpoint_with_same_grouping(tmp_path, monkeypatch):
+    monkeypatch.setenv("CRAWL_GROUP_VARIANTS", "true")
+    checkpoint = CategoryCheckpoint("tgdd", "phone", base_dir=str(tmp_path))
+    calls = []
+    prepare_category(checkpoint, True, make_discover(["https://a/1", "https://a/2"], calls), logger)
+    checkpoint.append_chunk(0, 1, [{"url": "https://a/1"}])
+
+    _, df_to_crawl, _, _ = prepare_category(checkpoint, True, make_discover(["https://a/3"], calls), logger)
+
+    assert len(calls) == 1
+    assert list(df_to_crawl["url"]) == ["https://a/1", "https://a/2"]
+    assert checkpoint.cursor == 1
+
+
+def test_resume_rebuilds_checkpoint_when_grouping_changes(tmp_path, monkeypatch):
+    monkeypatch.setenv("CRAWL_GROUP_VARIANTS", "true")
+    checkpoint = CategoryCheckpoint("tgdd", "phone", base_dir=str(tmp_path))
+    calls = []
+    prepare_category(checkpoint, True, make_discover(["https://a/1", "https://a/2"], calls), logger)
+    checkpoint.append_chunk(0, 1, [{"url": "https://a/1"}])
+
+    # Cursor đánh số trên trang đại diện, không dùng được khi tắt gom biến thể
+    monkeypatch.setenv("CRAWL_GROUP_VARIANTS", "false")
+    _, df_to_crawl, _, _ = prepare_category(checkpoint, True, make_discover(["https://a/3"], calls), logger)
+
+    assert len(calls) == 2
+    assert list(df_to_crawl["url"]) == ["https://a/3"]
+    assert checkpoint.cursor == 0
+    assert list(checkpoint.iter_completed_records()) == []
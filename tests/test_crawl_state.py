@@ -0,0 +1,74 @@
+import logging
+
+import pandas as pd
+
+from crawlers.crawl_state import CrawlStateStore, STATUS_INCOMPLETE, STATUS_OK, split_fresh_products, write_category_output
+
+logger = logging.getLogger(__name__)
+
+
+def make_store(tmp_path):
+    return CrawlStateStore(str(tmp_path / "state.sqlite"))
+
+
+def write_previous(path, urls):
+    pd.DataFrame([{"name": url.rsplit("/", 1)[-1], "url": url, "prices": "[]"} for url in urls]).to_csv(path, index=False)
+
+
+def test_fresh_products_are_reused(tmp_path, monkeypatch):
+    monkeypatch.setenv("CRAWL_STATE_TTL_HOURS", "24")
+    store = make_store(tmp_path)
+    output_path = tmp_path / "phone.csv"
+    write_previous(output_path, ["https://a/1", "https://a/2"])
+    store.record("https://a/1", "tgdd", "phone", STATUS_OK, {"url": "https://a/1"})
+    store.record("https://a/2", "tgdd", "phone", STATUS_INCOMPLETE, {"url": "https://a/2"})
+
+    df_products = pd.DataFrame({"name": ["1", "2", "3"], "url": ["https://a/1", "https://a/2", "https://a/3"]})
+    df_to_crawl, reused = split_fresh_products(store, df_products, str(output_path), logger)
+
+    # Chỉ sản phẩm ok, còn trong TTL và có trong CSV cũ mới được dùng lại
+    assert [row["url"] for row in reused] == ["https://a/1"]
+    assert list(df_to_crawl["url"]) == ["https://a/2", "https://a/3"]
+    store.close()
+
+
+def test_ttl_zero_crawls_everything(tmp_path, monkeypatch):
+    monkeypatch.setenv("CRAWL_STATE_TTL_HOURS", "0")
+    store = make_store(tmp_path)
+    output_path = tmp_path / "phone.csv"
+    write_previous(output_path, ["https://a/1"])
+    store.record("https://a/1", "tgdd", "phone", STATUS_OK, {"url": "https://a/1"})
+
+    df_products = pd.DataFrame({"name": ["1"], "url": ["https://a/1"]})
+    df_to_crawl, reused = split_fresh_products(store, df_products, str(output_path), logger)
+
+    assert reused == []
+    assert list(df_to_crawl["url"]) == ["https://a/1"]
+    store.close()
+
+
+def test_output_built_from_record_files_in_listing_order(tmp_path):
+    first, second = tmp_path / "chunk.jsonl", tmp_path / "stream.jsonl"
+    first.write_text(
+        '{"name": "1", "url": "https://a/1", "prices": [1]}\n'
+        '{"name": "3", "url": "https://a/3", "prices": []}\n', encoding="utf-8"
+    )
+    # Retry: a/3 có giá (thay bản cũ), a/1 thiếu giá (không thay bản đầy đủ hơn)
+    second.write_text(
+        '{"name": "3", "url": "https://a/3", "prices": [3]}\n'
+        '{"name": "1", "url": "https://a/1", "prices": []}\n'
+        '{"name": "x", "url": "https://a/x", "prices": [9]}\n', encoding="utf-8"
+    )
+    df_products = pd.DataFrame({"name": ["3", "2", "1"], "url": ["https://a/3", "https://a/2", "https://a/1"]})
+    reused = [{"name": "2", "url": "https://a/2", "prices": "[2]"}]
+    output_path = tmp_path / "phone.csv"
+
+    written = write_category_output(
+        str(output_path), df_products, reused, [str(first), str(second)],
+        lambda df, records, extra: pd.DataFrame(records), {}, ["prices"], logger, chunk_size=2
+    )
+
+    df = pd.read_csv(output_path)
+    assert written == 3
+    assert list(df["url"]) == ["https://a/3", "https://a/2", "https://a/1"]
+    assert list(df["prices"]) == ["[3]", "[2]", "[1]"]
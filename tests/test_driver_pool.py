@@ -0,0 +1,117 @@
+import logging
+import re
+import threading
+from urllib.request import urlopen
+
+import pandas as pd
+import pytest
+
+from benchmarks.replay import ReplayServer, local_url
+from crawlers.driver_pool import crawl_with_pool
+from crawlers.page_archive import PageArchive
+from crawlers.retry_queue import retry_pending
+
+logger = logging.getLogger(__name__)
+TITLE = re.compile(r"<h1>(.*?)</h1>")
+broken_lock = threading.Lock()
+
+
+class HttpDriver:
+    """Driver giả: get() tải trang qua HTTP như trình duyệt, page_source là HTML vừa tải"""
+
+    def __init__(self, broken_urls=None):
+        self.broken_urls = broken_urls if broken_urls is not None else {}
+        self.page_source = ""
+        self.quit_count = 0
+
+    def get(self, url):
+        with broken_lock:
+            if self.broken_urls.get(url, 0) > 0:
+                self.broken_urls[url] -= 1
+                raise RuntimeError(f"tab crashed: {url}")
+        with urlopen(url, timeout=10) as response:
+            self.page_source = response.read().decode("utf-8")
+
+    def quit(self):
+        self.quit_count += 1
+
+
+@pytest.fixture
+def product_site(tmp_path):
+    """ReplayServer phát lại 12 trang sản phẩm fixture; trả về (URL local theo thứ tự, tên tương ứng)"""
+    archive = PageArchive(str(tmp_path / "archive"))
+    urls = [f"https://shop.example/sp-{i}" for i in range(12)]
+    for i, url in enumerate(urls):
+        archive.put(url, "test", "product", f"<html><body><h1>SP {i}</h1></body></html>")
+    server = ReplayServer(archive, "shop.example")
+    base_url = server.start()
+    yield [local_url(base_url, url) for url in urls], [f"SP {i}" for i in range(12)]
+    server.stop()
+    archive.close()
+
+
+def crawl_pages(urls):
+    def crawl(start, end, driver):
+        records = []
+        for url in urls[start:end]:
+            driver.get(url)
+            records.append({"url": url, "name": TITLE.search(driver.page_source).group(1)})
+        return records
+    return crawl
+
+
+def test_pool_keeps_order_and_completeness(product_site):
+    urls, names = product_site
+    drivers = []
+
+    def setup_driver():
+        drivers.append(HttpDriver())
+        return drivers[-1]
+
+    records = crawl_with_pool(len(urls), crawl_pages(urls), setup_driver, num_workers=3, chunk_size=2, logger=logger)
+
+    assert [record["url"] for record in records] == urls
+    assert [record["name"] for record in records] == names
+    assert 1 < len(drivers) <= 3
+    assert all(driver.quit_count == 1 for driver in drivers)
+
+
+def test_failed_chunk_is_requeued_on_new_driver(product_site):
+    urls, names = product_site
+    broken = {urls[5]: 1}
+    drivers = []
+
+    def setup_driver():
+        drivers.append(HttpDriver(broken))
+        return drivers[-1]
+
+    failed = []
+    records = crawl_with_pool(len(urls), crawl_pages(urls), setup_driver, num_workers=3, chunk_size=2, logger=logger,
+                              on_failed=lambda start, end: failed.append((start, end)))
+
+    assert [record["name"] for record in records] == names
+    assert failed == []
+    assert len(drivers) >= 2
+
+
+def test_chunk_still_failing_goes_to_retry_pass(product_site):
+    urls, names = product_site
+    broken = {urls[5]: 2}
+    failed = []
+    records = crawl_with_pool(len(urls), crawl_pages(urls), lambda: HttpDriver(broken), num_workers=3, chunk_size=2,
+                              logger=logger, on_failed=lambda start, end: failed.append((start, end)))
+
+    assert failed == [(4, 6)]
+    assert [record["url"] for record in records] == urls[:4] + urls[6:]
+
+    # Sản phẩm của đoạn lỗi không có bản ghi nên lượt retry cuối danh mục crawl lại
+    df_to_crawl = pd.DataFrame({"name": names, "url": urls})
+    retried = []
+
+    def crawl_rows(df_rows):
+        retried.extend(df_rows["url"])
+        return crawl_pages(list(df_rows["url"]))(0, len(df_rows), HttpDriver(broken))
+
+    summaries = retry_pending(df_to_crawl, records, ["name"], crawl_rows, logger, attempts=1, backoff=0)
+    assert retried == urls[4:6]
+    assert [summary["url"] for summary in summaries] == urls
@@ -0,0 +1,21 @@
+from crawlers.extraction_paths import PathStats
+
+
+def test_hit_rate_does_not_create_entries(tmp_path):
+    stats = PathStats("tgdd", path=str(tmp_path / "stats.json"))
+    assert stats.hit_rate("phone", "prices", "variants") == (None, 0.0)
+    assert stats.stats == {}
+
+
+def test_run_paths_keeps_given_order(tmp_path):
+    stats = PathStats("tgdd", path=str(tmp_path / "stats.json"))
+    # "nuxt" luôn trúng, "variants" hiếm khi trúng: vẫn thử "variants" trước
+    for _ in range(20):
+        stats.record("phone", "prices", "variants", False)
+        stats.record("phone", "prices", "nuxt", True)
+    tried = []
+    result, name = stats.run_paths("phone", "prices", [
+        ("variants", 5, lambda timeout: tried.append("variants") or ["biến thể"]),
+        ("nuxt", 0, lambda timeout: tried.append("nuxt") or ["mặc định"]),
+    ])
+    assert (result, name, tried) == (["biến thể"], "variants", ["variants"])
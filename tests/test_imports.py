@@ -0,0 +1,32 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Mỗi module được import trong một tiến trình mới: vòng import giữa các crawler chỉ lộ ra
+# khi module đó là module được import đầu tiên (như main.py hay tiến trình con của orchestrator)
+MODULES = [
+    "main",
+    "crawlers.cellphoneS",
+    "crawlers.cellphoneS_html",
+    "crawlers.filter_cellphoneS",
+    "crawlers.fpt",
+    "crawlers.fpt_nextdata",
+    "crawlers.tgdd",
+    "crawlers.tgdd_http",
+    "crawlers.listing_discovery",
+    "crawlers.orchestrator",
+    "crawlers.shards",
+    "crawlers.reextract",
+]
+
+
+@pytest.mark.parametrize("module", MODULES)
+def test_import(module):
+    result = subprocess.run(
+        [sys.executable, "-c", f"import {module}"], cwd=ROOT, capture_output=True, text=True
+    )
+    assert result.returncode == 0, result.stderr
@@ -0,0 +1,71 @@
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from my_logger import init_logger, get_logger
+from crawlers.listing_discovery import LISTING_SOURCES, fetch_listing_pages
+
+
+def listing_html(page):
+    items = "".join(
+        f'<li class="item"><a class="main-contain" href="/dtdd/p{page}-{i}" data-name="SP {page}-{i}"></a></li>'
+        for i in range(2)
+    )
+    return f'<ul class="listproduct">{items}</ul>'
+
+
+@pytest.fixture
+def listing_site(tmp_path, monkeypatch):
+    """Server local phục vụ trang danh mục tgdd 1..3; failures[page] = số lần trả 500 trước khi trả trang"""
+    init_logger(str(tmp_path / "test.log"))
+    monkeypatch.setenv("CRAWL_ARCHIVE", "false")
+    monkeypatch.setenv("CRAWL_MAX_DELAY_S", "0.05")
+    failures = {}
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            page = int(self.path.rsplit("page=", 1)[-1]) if "page=" in self.path else 1
+            if failures.get(page, 0) > 0:
+                failures[page] -= 1
+                self.send_error(500)
+                return
+            if page > 3:
+                self.send_error(404)
+                return
+            body = listing_html(page).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/dtdd", failures
+    server.shutdown()
+    server.server_close()
+
+
+def fetch(url):
+    return asyncio.run(fetch_listing_pages("tgdd", url, LISTING_SOURCES["tgdd"], get_logger(), concurrency=2))
+
+
+def test_transient_page_error_is_retried(listing_site):
+    url, failures = listing_site
+    failures[2] = 1
+    products, pages = fetch(url)
+    assert pages == 3
+    assert [p["name"] for p in products] == [f"SP {page}-{i}" for page in (1, 2, 3) for i in range(2)]
+
+
+def test_failed_page_makes_listing_unacceptable(listing_site):
+    url, failures = listing_site
+    failures[2] = 10
+    _, pages = fetch(url)
+    # Trang 2 lỗi hẳn: danh sách bị cụt nên không được dùng, nơi gọi quay về vòng lặp click
+    assert pages == 0
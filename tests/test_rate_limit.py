@@ -0,0 +1,25 @@
+import time
+
+import pytest
+
+from my_logger import init_logger
+from crawlers.rate_limit import CircuitOpenError, DomainLimiter
+
+
+def test_domain_dropped_after_max_trips(tmp_path, monkeypatch):
+    init_logger(str(tmp_path / "test.log"))
+    monkeypatch.setenv("CRAWL_BREAKER_FAILURES", "1")
+    monkeypatch.setenv("CRAWL_BREAKER_COOLDOWN_S", "0")
+    monkeypatch.setenv("CRAWL_BREAKER_MAX_TRIPS", "2")
+    limiter = DomainLimiter("example.com")
+
+    for _ in range(2):
+        limiter.acquire()
+        limiter.release(1.0, ok=False, blocked=True)
+
+    # Cooldown đã hết nhưng domain vẫn bị bỏ vì đã ngắt đủ số lần tối đa
+    assert limiter.open_until <= time.monotonic()
+    with pytest.raises(CircuitOpenError):
+        limiter.acquire()
+    with pytest.raises(CircuitOpenError):
+        limiter.try_acquire()
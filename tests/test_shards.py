@@ -0,0 +1,47 @@
+import json
+import logging
+import os
+from types import SimpleNamespace
+
+import pandas as pd
+
+from crawlers.checkpoint import write_jsonl
+from crawlers.shards import merge_shards, part_path, plan_path
+
+logger = logging.getLogger(__name__)
+
+
+def make_crawler(output_path):
+    return SimpleNamespace(
+        categories=[{"url": "https://a/phone", "name_file": "phone"}],
+        category_key=lambda category: category["name_file"],
+        output_path=lambda category: str(output_path),
+        build_output=lambda df_products, records, extra: pd.DataFrame(records, columns=["name", "url", "prices"]),
+        REQUIRED_FIELDS=["prices"],
+    )
+
+
+def test_missing_unit_keeps_previous_rows(tmp_path):
+    urls = [f"https://a/{i}" for i in range(4)]
+    units = [{"source": "tgdd", "category": "phone", "start": 0, "end": 2},
+             {"source": "tgdd", "category": "phone", "start": 2, "end": 4}]
+    plan = {"unit_size": 2, "units": units, "listings": {"tgdd": {"phone": {
+        "columns": ["name", "url"], "listing": [{"name": url, "url": url} for url in urls], "extra": {},
+    }}}}
+    shard_dir = str(tmp_path / "shards")
+    os.makedirs(shard_dir)
+    with open(plan_path(shard_dir), "w", encoding="utf-8") as f:
+        json.dump(plan, f)
+
+    output_path = tmp_path / "phone.csv"
+    pd.DataFrame([{"name": url, "url": url, "prices": "cũ"} for url in urls]).to_csv(output_path, index=False)
+
+    # Chỉ work unit đầu có kết quả
+    os.makedirs(os.path.dirname(part_path(units[0], shard_dir)))
+    write_jsonl(part_path(units[0], shard_dir), [{"name": url, "url": url, "prices": "mới"} for url in urls[:2]])
+
+    merge_shards({"tgdd": make_crawler(output_path)}, shard_dir=shard_dir, logger=logger)
+
+    df = pd.read_csv(output_path)
+    assert list(df["url"]) == urls
+    assert list(df["prices"]) == ["mới", "mới", "cũ", "cũ"]
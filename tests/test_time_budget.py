@@ -0,0 +1,35 @@
+import time
+
+from crawlers.time_budget import TimeBudget
+
+
+def make_budget(tmp_path, monkeypatch, seconds_left, seconds_per_page=1.0):
+    monkeypatch.setenv("CRAWL_BUDGET_MARGIN_S", "0")
+    budget = TimeBudget("test", deadline=time.time() + seconds_left, path=str(tmp_path / "cost.json"))
+    budget.seconds_per_page = seconds_per_page
+    return budget
+
+
+def test_retry_backoff_probe_does_not_exhaust_budget(tmp_path, monkeypatch):
+    budget = make_budget(tmp_path, monkeypatch, 100)
+    assert budget.start_category()
+    # Không đủ thời gian chờ backoff 500s, nhưng vẫn còn ~100s cho danh mục sau
+    assert budget.affordable(1, 500) == 0
+    assert not budget.exhausted
+    assert budget.start_category()
+    assert budget.affordable(50) == 50
+
+
+def test_trimmed_category_does_not_block_next_category(tmp_path, monkeypatch):
+    budget = make_budget(tmp_path, monkeypatch, 100)
+    assert budget.start_category()
+    assert budget.affordable(200) < 200
+    assert budget.exhausted
+    assert budget.start_category()
+    assert not budget.exhausted and budget.ran_out
+
+
+def test_no_deadline_allows_everything(tmp_path, monkeypatch):
+    monkeypatch.delenv("CRAWL_DEADLINE", raising=False)
+    budget = TimeBudget("test", path=str(tmp_path / "cost.json"))
+    assert budget.affordable(1000) == 1000 and not budget.exhausted
@@ -0,0 +1,59 @@
+import logging
+
+import pandas as pd
+
+from crawlers.variant_groups import covers, crawl_with_variant_groups, family_keys, group_variants
+
+
+def test_plus_models_are_separate_families():
+    assert family_keys("Redmi Note 14 Pro+ 5G", "https://a/redmi-note-14-pro-plus-5g") != \
+        family_keys("Redmi Note 14 Pro 5G", "https://a/redmi-note-14-pro-5g")
+    assert family_keys("Galaxy Tab A9+", "https://a/galaxy-tab-a9-plus") != family_keys("Galaxy Tab A9", "https://a/galaxy-tab-a9")
+
+    df = pd.DataFrame({
+        "name": ["realme 13 5G", "realme 13+ 5G", "realme 13 5G Xanh"],
+        "url": ["https://a/realme-13-5g", "https://a/realme-13-plus-5g", "https://a/realme-13-5g-xanh"],
+    })
+    assert group_variants(df) == [[0, 2], [1]]
+
+
+def test_colour_listed_on_representative_page_is_covered():
+    record = {"name": "iPhone 16 128GB", "prices": [{"color": "Đen", "price": 1}, {"color": "Xanh", "price": 2}]}
+    assert covers(record, "iPhone 16 128GB Xanh", "https://a/iphone-16-xanh", "iPhone 16 128GB", "https://a/iphone-16")
+
+
+def test_storage_and_unproven_members_are_not_covered():
+    record = {"name": "iPhone 16 128GB", "prices": [{"color": "256GB", "price": 1}, {"color": "Xanh", "price": 2}]}
+    # Dung lượng khác thì specifications khác, dù bảng giá có nhãn dung lượng đó
+    assert not covers(record, "iPhone 16 256GB", "https://a/iphone-16-256gb", "iPhone 16 128GB", "https://a/iphone-16")
+    # Trùng tên, khác URL: không có gì chứng minh hai trang là cùng một sản phẩm
+    assert not covers(record, "iPhone 16 128GB", "https://a/iphone-16-vn", "iPhone 16 128GB", "https://a/iphone-16")
+    # Màu không có trong bảng giá của đại diện
+    assert not covers(record, "iPhone 16 128GB Hồng", "https://a/iphone-16-hong", "iPhone 16 128GB", "https://a/iphone-16")
+
+
+def test_crawl_with_variant_groups_keeps_only_summaries(monkeypatch):
+    monkeypatch.setenv("CRAWL_GROUP_VARIANTS", "true")
+    df = pd.DataFrame({
+        "name": ["iPhone 16 128GB", "iPhone 16 128GB Xanh", "iPhone 16 256GB"],
+        "url": ["https://a/iphone-16", "https://a/iphone-16-xanh", "https://a/iphone-16-256gb"],
+    })
+    representative = {"name": "iPhone 16 128GB", "url": "https://a/iphone-16", "brand": "Apple",
+                      "prices": [{"color": "Xanh", "price": 1}], "specifications": {}}
+    recorded = []
+
+    summaries = crawl_with_variant_groups(
+        "tgdd", df,
+        lambda df_representatives: iter([representative]),
+        lambda df_rows: [{"name": row["name"], "url": row["url"], "brand": "Apple"} for row in df_rows.to_dict("records")],
+        lambda df_rows, records: recorded.extend(record["url"] for record in records),
+        logging.getLogger(__name__),
+    )
+
+    # Bản màu Xanh được nhân từ đại diện, bản 256GB crawl riêng; kết quả chỉ còn URL và trường có dữ liệu
+    assert recorded == ["https://a/iphone-16-xanh", "https://a/iphone-16-256gb"]
+    assert summaries == [
+        {"url": "https://a/iphone-16", "name": True, "brand": True, "prices": True},
+        {"url": "https://a/iphone-16-xanh", "name": True, "brand": True, "prices": True},
+        {"url": "https://a/iphone-16-256gb", "name": True, "brand": True},
+    ]
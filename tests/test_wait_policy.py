@@ -0,0 +1,18 @@
+import time
+
+from crawlers.wait_policy import WaitPolicy
+
+
+class BusyDriver:
+    """DOM thay đổi liên tục (banner, đồng hồ đếm ngược): số ms yên lặng luôn là 0"""
+
+    def execute_script(self, script, *args):
+        return 0
+
+
+def test_settle_never_waits_longer_than_fixed_delay():
+    policy = WaitPolicy("test", strategy="dom", quiet_ms=500, timeout=10)
+    started = time.perf_counter()
+    policy.settle(BusyDriver(), fixed=0.5)
+    assert time.perf_counter() - started < 2
+    assert policy.wait_count == 1